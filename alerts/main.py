@@ -1,11 +1,50 @@
+import asyncio
+from contextlib import asynccontextmanager, suppress
+
 from fastapi import FastAPI
-from alerts.services.weaviate_client import create_schema
+from alerts.services.weaviate_client import DEDUP_WINDOW_HOURS, create_schema
+from alerts.services.postgres_service import close_pool, ensure_schema
+from alerts.services.async_postgres_service import close_async_pool
+from alerts.services.readiness import STARTUP_WAIT_FOR_BACKENDS, warm_up
+from alerts.services.thresholds import dedup_thresholds
+from alerts.services.vector_service import run_vector_expiry, warm_embedding_model, warm_vector_index
+from alerts.services.write_behind import write_buffer
 from alerts.routes import alerts
 
-app = FastAPI()
+# Run in order by the lifespan handler; /ready reports each one
+STARTUP_STEPS = [
+    # Ensure Postgres columns/indexes and the Weaviate schema exist
+    ("postgres_schema", ensure_schema),
+    ("weaviate_schema", create_schema),
+    # Per-partition/per-service similarity thresholds (re-read periodically after this)
+    ("dedup_thresholds", dedup_thresholds.load),
+    # Load the in-process vector index (no-op unless VECTOR_BACKEND=numpy)
+    ("vector_index", warm_vector_index),
+    ("embedding_model", warm_embedding_model),
+]
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nothing touches the network at import time; backends are warmed here,
+    # in the background unless STARTUP_WAIT_FOR_BACKENDS is set
+    warm = asyncio.create_task(warm_up(STARTUP_STEPS))
+    if STARTUP_WAIT_FOR_BACKENDS:
+        await warm
+    # Keep the searched vector set bounded to the dedup window
+    expiry = asyncio.create_task(run_vector_expiry()) if DEDUP_WINDOW_HOURS > 0 else None
+    yield
+    for task in (warm, expiry):
+        if task is None:
+            continue
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    # Flush buffered vector writes, then release pooled Postgres connections
+    write_buffer.close()
+    close_pool()
+    await close_async_pool()
 
-# Ensure Weaviate schema exists at startup
-create_schema()
+app = FastAPI(lifespan=lifespan)
 
 #alert to check de duplication
-app.include_router(alerts.router)
\ No newline at end of file
+app.include_router(alerts.router)
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Extra
-from typing import Optional, Dict, Any
+from pydantic import BaseModel, Extra, Field
+from typing import Optional, Dict, Any, Literal
 
 class AlertRequest(BaseModel):
     incident_id: str
@@ -14,3 +14,8 @@ class AlertRequest(BaseModel):
 
     class Config:
         extra = "allow"
+
+class ThresholdRequest(BaseModel):
+    scope: Literal["partition", "service"]
+    value: str
+    threshold: float = Field(ge=0.0, le=1.0)
@@ -10,4 +10,5 @@ class ChatResponse(BaseModel):
     incident_id: str
     query: str 
     response: str
-    timestamp: datetime
\ No newline at end of file
+    timestamp: datetime
+    cached: bool = False
@@ -1,39 +1,108 @@
-from fastapi import APIRouter, HTTPException
-from alerts.pydantic_files.alerts import AlertRequest
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from alerts.pydantic_files.alerts import AlertRequest, ThresholdRequest
 from alerts.pydantic_files.chat_service import ChatRequest, ChatResponse
-from alerts.services.alert_service import process_alert
-from typing import List, Dict
+from alerts.services.alert_service import process_alert_async, process_alerts_batch
+from typing import List, Dict, Literal, Optional
+from datetime import datetime
 from alerts.services.postgres_service import (
+    decode_cursor,
     fetch_alerts,
-    fetch_grouped_alerts,
+    stream_grouped_alerts,
     get_alert_counts,
+    get_daily_counts,
     get_alert_summary,
     fetch_alert_by_id,
+    get_pool_stats,
+    set_threshold,
+    delete_threshold,
 )
-from alerts.services.chat_service import add_chat_message, get_chat_messages
+from alerts.services.chat_context import context_metrics
+from alerts.services.chat_service import add_chat_message, chat_answer_cache, get_chat_messages, stream_chat_message
+from alerts.services.embedding_cache import get_embedding_cache
+from alerts.services.fingerprint import recent_fingerprints
+from alerts.services.metrics import StatsGauges, register, render
+from alerts.services.readiness import readiness
+from alerts.services.single_flight import single_flight
+from alerts.services.thresholds import dedup_thresholds
+from alerts.services.vector_service import VECTOR_BACKEND, get_vector_expiry_stats
+from alerts.services.write_behind import write_buffer
 
 router = APIRouter(tags=["Alerts"])
 
 @router.post("/deduplicate_alert")
-def deduplicate_alert(alert: AlertRequest):
+async def deduplicate_alert(alert: AlertRequest):
     """Endpoint for Flow Designer (or external services) to send alerts."""
-    return process_alert(alert.model_dump())
+    return await process_alert_async(alert.model_dump())
 
-@router.get("/alerts", response_model=List[Dict])
-def list_alerts():
-    """List all deduplicated alerts (from cleaned_alerts)."""
-    return fetch_alerts()
+@router.post("/deduplicate_alerts/batch", response_model=List[Dict])
+def deduplicate_alerts_batch(alerts: List[AlertRequest]):
+    """Deduplicate a buffered batch of alerts; results are returned in input order."""
+    return process_alerts_batch([alert.model_dump() for alert in alerts])
+
+@router.get("/alerts")
+def list_alerts(
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    severity: Optional[str] = None,
+    policy_name: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    include_payload: bool = True,
+):
+    """List deduplicated alerts (from cleaned_alerts), latest first.
+
+    Returns {"alerts": [...], "next_cursor": ...}, paginated by keyset; pass
+    next_cursor (also sent as the X-Next-Cursor header) back as `cursor` to get
+    the next page. It is null on the last page. Set include_payload=false to omit log_data.
+    """
+    try:
+        rows, next_cursor = fetch_alerts(
+            limit=limit, cursor=cursor, severity=severity, policy_name=policy_name,
+            since=since, until=until, include_payload=include_payload,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return {"alerts": rows, "next_cursor": next_cursor}
 
 @router.get("/alerts/grouped")
-def get_grouped_alerts():
-    """Return alerts grouped by incident_id including duplicates."""
-    return fetch_grouped_alerts()
+def get_grouped_alerts(
+    format: Literal["json", "ndjson"] = "json",
+    limit: Optional[int] = Query(None, ge=1, le=10000),
+    cursor: Optional[str] = None,
+    max_duplicates: Optional[int] = Query(None, ge=0),
+):
+    """Return alerts grouped by incident_id including duplicates.
+
+    Groups are built in Postgres and streamed. format=ndjson emits one group
+    per line with its total duplicate_count, followed by a next_cursor line
+    when `limit` cut the page short; pass it back as `cursor` to continue.
+    max_duplicates caps the duplicate entries returned per group.
+    """
+    if cursor:
+        try:
+            decode_cursor(cursor, 2)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    media_type = "application/x-ndjson" if format == "ndjson" else "application/json"
+    return StreamingResponse(
+        stream_grouped_alerts(format, limit=limit, cursor=cursor, max_duplicates=max_duplicates),
+        media_type=media_type,
+    )
 
 @router.get("/alerts/counts")
 def alert_counts():
     """Return counts of total alerts, deduplicated alerts, and severity distribution."""
     return get_alert_counts()
 
+@router.get("/alerts/counts/daily", response_model=List[Dict])
+def alert_counts_daily(days: int = Query(30, ge=1, le=366)):
+    """Return per-day alert, duplicate and severity counts, newest day first."""
+    return get_daily_counts(days)
+
 @router.get("/alerts/summary")
 def alerts_summary():
     """Return aggregated summary for dashboards."""
@@ -44,11 +113,113 @@ def create_chat_message(chat_req: ChatRequest):
     """Attach a chat message to a grouped alert thread."""
     return add_chat_message(chat_req)
 
+@router.post("/alerts/grouped/chat/stream")
+def create_chat_message_stream(chat_req: ChatRequest):
+    """Streaming variant of POST /alerts/grouped/chat (NDJSON token lines, then the saved message)."""
+    return StreamingResponse(stream_chat_message(chat_req), media_type="application/x-ndjson")
+
 @router.get("/alerts/grouped/chat/{incident_id}", response_model=List[ChatResponse])
 def fetch_chat_messages(incident_id: str):
     """Fetch all chat messages for a given incident_id."""
     return get_chat_messages(incident_id)
 
+@router.get("/ready")
+def ready():
+    """Readiness probe: 200 once schemas, vector index and embedding model are warm, else 503."""
+    snapshot = readiness.snapshot()
+    return JSONResponse(snapshot, status_code=200 if snapshot["ready"] else 503)
+
+@router.get("/stats/db_pool")
+def db_pool_stats():
+    """Return Postgres connection pool utilization."""
+    return get_pool_stats()
+
+@router.get("/stats/embedding_cache")
+def embedding_cache_stats():
+    """Return embedding cache hit/miss/eviction counters."""
+    return get_embedding_cache().stats()
+
+@router.get("/stats/fingerprints")
+def fingerprint_stats():
+    """Return in-memory recent-fingerprint set counters."""
+    return recent_fingerprints.stats()
+
+@router.get("/stats/vector_index")
+def vector_index_stats():
+    """Return the active vector backend and, for the in-process index, its size."""
+    if VECTOR_BACKEND != "numpy":
+        return {"backend": VECTOR_BACKEND}
+    from alerts.services.numpy_index import index
+    return {"backend": VECTOR_BACKEND, **index.stats()}
+
+@router.get("/stats/vector_expiry")
+def vector_expiry_stats():
+    """Return the dedup window and background vector expiry counters."""
+    return get_vector_expiry_stats()
+
+@router.get("/stats/vector_writes")
+def vector_write_stats():
+    """Return write-behind buffer counters (pending, flushed, failures)."""
+    return write_buffer.stats()
+
+@router.get("/stats/chat_cache")
+def chat_cache_stats():
+    """Return chat answer cache hit/miss counters."""
+    return chat_answer_cache.stats()
+
+@router.get("/stats/chat_context")
+def chat_context_stats():
+    """Return prompt-size statistics for chat context building."""
+    return context_metrics.stats()
+
+@router.get("/stats/single_flight")
+def single_flight_stats():
+    """Return counters for concurrent identical alerts coalesced into one embed/search/store."""
+    return single_flight.stats()
+
+@router.get("/stats/dedup_thresholds")
+def dedup_threshold_stats():
+    """Return threshold override counters (overrides loaded, reloads, seconds since the last one)."""
+    return dedup_thresholds.stats()
+
+@router.get("/dedup/thresholds")
+def get_dedup_thresholds():
+    """Return the default similarity threshold and the per-partition/per-service overrides in effect."""
+    return dedup_thresholds.snapshot()
+
+@router.put("/dedup/thresholds")
+def put_dedup_threshold(req: ThresholdRequest):
+    """Set the similarity threshold of one partition or service; other workers pick it up within the refresh interval."""
+    set_threshold(req.scope, req.value, req.threshold)
+    return dedup_thresholds.reload()
+
+@router.delete("/dedup/thresholds")
+def delete_dedup_threshold(scope: Literal["partition", "service"] = Query(...), value: str = Query(...)):
+    """Remove a threshold override so the default applies again."""
+    if not delete_threshold(scope, value):
+        raise HTTPException(status_code=404, detail="Threshold override not found")
+    return dedup_thresholds.reload()
+
+@router.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint: stage latencies, dedup outcomes and the /stats counters."""
+    return Response(render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# /stats counters are also exported as gauges, read at scrape time
+for prefix, help_text, source in [
+    ("aiops_db_pool", "Postgres connection pool", db_pool_stats),
+    ("aiops_embedding_cache", "Embedding cache", embedding_cache_stats),
+    ("aiops_fingerprints", "Recent-fingerprint set", fingerprint_stats),
+    ("aiops_vector_index", "In-process vector index", vector_index_stats),
+    ("aiops_vector_writes", "Vector write-behind buffer", vector_write_stats),
+    ("aiops_vector_expiry", "Dedup window vector expiry", vector_expiry_stats),
+    ("aiops_chat_cache", "Chat answer cache", chat_cache_stats),
+    ("aiops_chat_context", "Chat context builder", chat_context_stats),
+    ("aiops_single_flight", "Single-flight alert coalescing", single_flight_stats),
+    ("aiops_dedup_thresholds", "Dedup threshold overrides", dedup_threshold_stats),
+]:
+    register(StatsGauges(prefix, help_text, source))
+
 @router.get("/alerts/{incident_id}", response_model=Dict)
 def get_alert_detail(incident_id: str):
     """Get full alert details by incident_id."""
@@ -0,0 +1,497 @@
+# Offline throughput/latency benchmark for the alert dedup pipeline.
+# Runs the real alert_service code against local stand-ins, so no Postgres,
+# Ollama or Weaviate is needed:
+#   - a deterministic hashing embedder with configurable latency
+#   - the in-process NumpyVectorIndex as the vector store
+#   - an in-memory SQLite database in place of Postgres
+#
+# python -m alerts.scripts.benchmark_dedup [--mode sync|async|batch] [--alerts 2000]
+#     [--duplicate-ratio 0.6] [--embed-latency-ms 15] [--json out.json]
+#     [--compare baseline.json --max-regression 0.2]
+
+import argparse, asyncio, hashlib, json, math, random, re, sqlite3, sys, threading, time
+from collections import defaultdict
+
+import numpy as np
+
+from alerts.services import alert_service
+from alerts.services import async_postgres_service as apg
+from alerts.services.fingerprint import RecentFingerprints, compute_fingerprint
+from alerts.services.numpy_index import NumpyVectorIndex
+from alerts.services.postgres_service import counter_deltas, embedding_values
+from alerts.services.thresholds import DedupThresholds
+from alerts.services.weaviate_client import partition_key
+
+WORDS = (
+    "cpu memory disk latency error timeout queue pod node cluster api gateway database replica "
+    "cache kafka consumer lag throughput saturation restart crash oom network packet loss dns tls "
+    "certificate expiry storage volume quota budget burn rate ingress egress scheduler job batch "
+    "worker thread pool connection refused unavailable degraded spike drop leak retry backoff"
+).split()
+SEVERITIES = ["critical", "high", "medium", "low"]
+
+
+# --------------------------------------------------------------------------- #
+# Synthetic alerts
+# --------------------------------------------------------------------------- #
+def _phrase(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+def generate_alerts(count: int, duplicate_ratio: float, exact_share: float = 0.5, seed: int = 7):
+    """Raw alerts plus the expected kind of each ("new", "exact" or "near").
+
+    A duplicate repeats an earlier new alert under a fresh incident_id: an
+    exact repeat keeps every other field, a near duplicate only changes the
+    observed value (so it must be caught by the semantic check).
+    """
+    rng = random.Random(seed)
+    originals, alerts, kinds = [], [], []
+    for n in range(count):
+        incident_id = f"bench-{seed}-{n}"
+        if originals and rng.random() < duplicate_ratio:
+            alert = dict(rng.choice(originals), incident_id=incident_id)
+            if rng.random() < exact_share:
+                kinds.append("exact")
+            else:
+                alert["observed_value"] = str(rng.randint(50, 99))
+                kinds.append("near")
+        else:
+            alert = {
+                "incident_id": incident_id,
+                "observed_value": str(rng.randint(50, 99)),
+                "policy_name": _phrase(rng, 3),
+                "condition_name": _phrase(rng, 3),
+                "documentation": {"subject": _phrase(rng, 4)},
+                "metric": {"displayName": _phrase(rng, 2)},
+                "severity": rng.choice(SEVERITIES),
+                "summary": _phrase(rng, 6),
+            }
+            originals.append(alert)
+            kinds.append("new")
+        alerts.append(alert)
+    return alerts, kinds
+
+
+# --------------------------------------------------------------------------- #
+# Stand-ins
+# --------------------------------------------------------------------------- #
+class FakeEmbedder:
+    """Deterministic feature-hashing embedder: texts sharing most tokens get close vectors."""
+
+    def __init__(self, dim: int = 768, latency_ms: float = 0.0, batch_item_ms: float = 0.0):
+        self.dim = dim
+        self.latency = latency_ms / 1000
+        self.batch_item = batch_item_ms / 1000
+        self._tokens = {}
+
+    def _token_vector(self, token: str) -> np.ndarray:
+        vec = self._tokens.get(token)
+        if vec is None:
+            seed = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "big")
+            vec = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+            self._tokens[token] = vec
+        return vec
+
+    def _vector(self, text: str) -> list[float]:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for token in re.findall(r"[a-z0-9-]+", text.lower()):
+            vec += self._token_vector(token)
+        norm = np.linalg.norm(vec)
+        return (vec / norm if norm else vec).tolist()
+
+    def embed(self, text: str) -> list[float]:
+        time.sleep(self.latency)
+        return self._vector(text)
+
+    def embed_many(self, texts: list[str]) -> list[list[float]]:
+        time.sleep(self.latency + self.batch_item * len(texts))
+        return [self._vector(text) for text in texts]
+
+    async def embed_async(self, text: str) -> list[float]:
+        await asyncio.sleep(self.latency)
+        return self._vector(text)
+
+
+class VectorStore:
+    """In-memory vector store with the vector_service call shapes and optional network latency."""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.index = NumpyVectorIndex()
+        self.latency = latency_ms / 1000
+
+    def search(self, vector, limit: int = 1, partition=None) -> dict | None:
+        time.sleep(self.latency)
+        matches = self.index.search(vector, limit=limit, partition=partition)
+        return matches[0] if matches else None
+
+    def search_many(self, vectors, limit: int = 1, partitions=None) -> list[dict | None]:
+        time.sleep(self.latency)
+        return [m[0] if m else None for m in self.index.search_many(vectors, limit=limit, partitions=partitions)]
+
+    def store(self, vector, **fields) -> None:
+        time.sleep(self.latency)
+        self.index.add(vector, {"incident_id": fields["incident_id"]}, partition=partition_key(fields))
+
+    def store_many(self, objects) -> None:
+        if not objects:
+            return
+        time.sleep(self.latency)
+        self.index.add_many(
+            [v for v, _, _ in objects],
+            [{"incident_id": i} for _, i, _ in objects],
+            partitions=[partition_key(fields) for _, _, fields in objects],
+        )
+
+    async def search_async(self, vector, limit: int = 1, partition=None) -> dict | None:
+        await asyncio.sleep(self.latency)
+        matches = self.index.search(vector, limit=limit, partition=partition)
+        return matches[0] if matches else None
+
+    async def store_async(self, vector, **fields) -> None:
+        await asyncio.sleep(self.latency)
+        self.index.add(vector, {"incident_id": fields["incident_id"]}, partition=partition_key(fields))
+
+
+class SqliteStore:
+    """In-memory SQLite stand-in for the postgres_service / async_postgres_service functions used by dedup."""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(":memory:", check_same_thread=False)
+        self.db.executescript(
+            """
+            CREATE TABLE cleaned_alerts (
+                incident_id TEXT PRIMARY KEY, severity TEXT, payload TEXT, fingerprint TEXT, embedding BLOB,
+                created_at REAL DEFAULT (julianday('now')));
+            CREATE TABLE duplicate_alerts (
+                id INTEGER PRIMARY KEY, incident_id TEXT, payload TEXT, fingerprint TEXT,
+                created_at REAL DEFAULT (julianday('now')));
+            CREATE TABLE alert_counters (
+                metric TEXT, dimension TEXT, bucket TEXT, count INTEGER,
+                PRIMARY KEY (metric, dimension, bucket));
+            CREATE INDEX idx_cleaned_fp ON cleaned_alerts (fingerprint);
+            CREATE INDEX idx_duplicate_fp ON duplicate_alerts (fingerprint);
+            CREATE INDEX idx_duplicate_incident ON duplicate_alerts (incident_id, created_at);
+            """
+        )
+
+    @staticmethod
+    def _payload(alert: dict) -> str:
+        return json.dumps(alert.get("log_data"), default=str)
+
+    def _write(self, cleaned: list[tuple[dict, str]], duplicates: list[tuple[str, dict, str]], vectors=None) -> set[str]:
+        """Same outcome as the Postgres writers: new rows whose incident_id exists become its duplicates."""
+        time.sleep(self.latency)
+        with self._lock, self.db:
+            existing = {
+                row[0] for row in self.db.execute(
+                    f"SELECT incident_id FROM cleaned_alerts WHERE incident_id IN ({','.join('?' * len(cleaned))})",
+                    [a["incident_id"] for a, _ in cleaned],
+                )
+            } if cleaned else set()
+            duplicates = duplicates + [(a["incident_id"], a, fp) for a, fp in cleaned if a["incident_id"] in existing]
+            cleaned = [(a, fp) for a, fp in cleaned if a["incident_id"] not in existing]
+            vectors = vectors or {}
+            self.db.executemany(
+                "INSERT INTO cleaned_alerts (incident_id, severity, payload, fingerprint, embedding) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (a["incident_id"], a.get("severity"), self._payload(a), fp, embedding_values(vectors.get(a["incident_id"]))[0])
+                    for a, fp in cleaned
+                ],
+            )
+            self.db.executemany(
+                "INSERT INTO duplicate_alerts (incident_id, payload, fingerprint) VALUES (?, ?, ?)",
+                [(original, self._payload(a), fp) for original, a, fp in duplicates],
+            )
+            self.db.executemany(
+                "INSERT INTO alert_counters VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (metric, dimension, bucket) DO UPDATE SET count = count + excluded.count",
+                counter_deltas([a.get("severity") for a, _ in cleaned], len(duplicates)),
+            )
+        return existing
+
+    def insert_cleaned_alert(self, alert: dict, fingerprint: str | None = None, vector=None) -> bool:
+        return not self._write([(alert, fingerprint)], [], {alert["incident_id"]: vector})
+
+    def insert_duplicate_alert(self, original_incident_id: str, alert: dict, fingerprint: str | None = None) -> None:
+        self._write([], [(original_incident_id, alert, fingerprint)])
+
+    def insert_alert_batch(self, cleaned, duplicates, vectors=None) -> set[str]:
+        return self._write(cleaned, duplicates, vectors)
+
+    def fetch_exact_match(self, incident_id: str, fingerprint: str) -> tuple[str, str] | None:
+        time.sleep(self.latency)
+        with self._lock:
+            row = self.db.execute(
+                """
+                SELECT incident_id, tier FROM (
+                    SELECT incident_id, 'incident_id' AS tier, 0 AS priority
+                    FROM cleaned_alerts WHERE incident_id = ?
+                    UNION ALL
+                    SELECT * FROM (SELECT incident_id, 'fingerprint_db', 1
+                                   FROM cleaned_alerts WHERE fingerprint = ? LIMIT 1)
+                    UNION ALL
+                    SELECT * FROM (SELECT incident_id, 'fingerprint_db', 2
+                                   FROM duplicate_alerts WHERE fingerprint = ? LIMIT 1)
+                ) ORDER BY priority LIMIT 1
+                """,
+                (incident_id, fingerprint, fingerprint),
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def fetch_exact_matches(self, incident_ids, fingerprints):
+        time.sleep(self.latency)
+        with self._lock:
+            ids = list(incident_ids)
+            existing = {
+                r[0] for r in self.db.execute(
+                    f"SELECT incident_id FROM cleaned_alerts WHERE incident_id IN ({','.join('?' * len(ids))})", ids
+                )
+            } if ids else set()
+            fps = list(fingerprints)
+            by_fingerprint = {}
+            if fps:
+                marks = ",".join("?" * len(fps))
+                rows = self.db.execute(
+                    f"""
+                    SELECT fingerprint, incident_id, 0 FROM cleaned_alerts WHERE fingerprint IN ({marks})
+                    UNION ALL
+                    SELECT fingerprint, incident_id, 1 FROM duplicate_alerts WHERE fingerprint IN ({marks})
+                    ORDER BY 3 DESC
+                    """,
+                    fps + fps,
+                ).fetchall()
+                by_fingerprint = {fp: incident_id for fp, incident_id, _ in rows}
+        return existing, by_fingerprint
+
+    async def insert_cleaned_alert_async(self, alert, fingerprint=None, vector=None) -> bool:
+        await asyncio.sleep(self.latency)
+        return not self._write([(alert, fingerprint)], [], {alert["incident_id"]: vector})
+
+    async def insert_duplicate_alert_async(self, original_incident_id, alert, fingerprint=None):
+        await asyncio.sleep(self.latency)
+        self._write([], [(original_incident_id, alert, fingerprint)])
+
+    async def fetch_exact_match_async(self, incident_id, fingerprint):
+        await asyncio.sleep(self.latency)
+        return self.fetch_exact_match(incident_id, fingerprint)
+
+
+# --------------------------------------------------------------------------- #
+# Timing
+# --------------------------------------------------------------------------- #
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))]
+
+
+class StageTimer:
+    """Wraps pipeline seams and records the wall time of every call per stage."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def wrap(self, stage: str, fn):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.samples[stage].append(time.perf_counter() - start)
+        return timed
+
+    def wrap_async(self, stage: str, fn):
+        async def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                self.samples[stage].append(time.perf_counter() - start)
+        return timed
+
+    def report(self) -> dict:
+        return {
+            stage: {
+                "calls": len(values),
+                "total_ms": round(sum(values) * 1000, 2),
+                "mean_ms": round(sum(values) / len(values) * 1000, 4),
+                "p50_ms": round(percentile(values, 50) * 1000, 4),
+                "p95_ms": round(percentile(values, 95) * 1000, 4),
+                "p99_ms": round(percentile(values, 99) * 1000, 4),
+            }
+            for stage, values in self.samples.items()
+        }
+
+
+def install_stand_ins(embedder: FakeEmbedder, store: VectorStore, db: SqliteStore, timer: StageTimer) -> None:
+    """Point alert_service at the stand-ins (each wrapped in a stage timer)."""
+    svc = alert_service
+    svc.recent_fingerprints = RecentFingerprints(max_entries=50000)
+    svc.compute_fingerprint = timer.wrap("fingerprint", compute_fingerprint)
+    svc.dedup_thresholds = DedupThresholds(lambda: [])  # default threshold, no overrides
+    # sync / batch
+    svc.fetch_exact_match = timer.wrap("exact_match", db.fetch_exact_match)
+    svc.fetch_exact_matches = timer.wrap("exact_match", db.fetch_exact_matches)
+    svc.insert_cleaned_alert = timer.wrap("insert", db.insert_cleaned_alert)
+    svc.insert_duplicate_alert = timer.wrap("insert", db.insert_duplicate_alert)
+    svc.insert_alert_batch = timer.wrap("insert", db.insert_alert_batch)
+    svc.get_embedding = timer.wrap("embed", embedder.embed)
+    svc.get_embeddings = timer.wrap("embed", embedder.embed_many)
+    svc.search_vector_store = timer.wrap("search", store.search)
+    svc.search_vector_store_many = timer.wrap("search", store.search_many)
+    svc.store_vector = timer.wrap("store_vector", store.store)
+    svc.store_vectors = timer.wrap("store_vector", store.store_many)
+    # async
+    apg.fetch_exact_match = timer.wrap_async("exact_match", db.fetch_exact_match_async)
+    apg.insert_cleaned_alert = timer.wrap_async("insert", db.insert_cleaned_alert_async)
+    apg.insert_duplicate_alert = timer.wrap_async("insert", db.insert_duplicate_alert_async)
+    svc.get_embedding_async = timer.wrap_async("embed", embedder.embed_async)
+    svc.search_vector_store_async = timer.wrap_async("search", store.search_async)
+    svc.store_vector_async = timer.wrap_async("store_vector", store.store_async)
+
+
+# --------------------------------------------------------------------------- #
+# Runs
+# --------------------------------------------------------------------------- #
+def run_sync(alerts):
+    latencies, results = [], []
+    for alert in alerts:
+        start = time.perf_counter()
+        results.append(alert_service.process_alert(alert))
+        latencies.append(time.perf_counter() - start)
+    return latencies, results
+
+
+def run_batch(alerts, batch_size: int):
+    latencies, results = [], []
+    for i in range(0, len(alerts), batch_size):
+        chunk = alerts[i : i + batch_size]
+        start = time.perf_counter()
+        results.extend(alert_service.process_alerts_batch(chunk))
+        # Every alert in a batch waits for the whole batch
+        latencies.extend([time.perf_counter() - start] * len(chunk))
+    return latencies, results
+
+
+def run_async(alerts, concurrency: int):
+    async def main():
+        gate = asyncio.Semaphore(concurrency)
+        latencies = [0.0] * len(alerts)
+
+        async def one(i, alert):
+            async with gate:
+                start = time.perf_counter()
+                result = await alert_service.process_alert_async(alert)
+                latencies[i] = time.perf_counter() - start
+                return result
+
+        results = await asyncio.gather(*(one(i, a) for i, a in enumerate(alerts)))
+        return latencies, list(results)
+
+    return asyncio.run(main())
+
+
+def benchmark(args) -> dict:
+    alerts, kinds = generate_alerts(args.alerts, args.duplicate_ratio, args.exact_share, args.seed)
+    embedder = FakeEmbedder(args.dim, args.embed_latency_ms, args.embed_batch_item_ms)
+    store = VectorStore(args.store_latency_ms)
+    db = SqliteStore(args.db_latency_ms)
+    timer = StageTimer()
+    install_stand_ins(embedder, store, db, timer)
+
+    start = time.perf_counter()
+    if args.mode == "batch":
+        latencies, results = run_batch(alerts, args.batch_size)
+    elif args.mode == "async":
+        latencies, results = run_async(alerts, args.concurrency)
+    else:
+        latencies, results = run_sync(alerts)
+    elapsed = time.perf_counter() - start
+
+    decided = defaultdict(int)
+    missed = 0
+    for kind, result in zip(kinds, results):
+        decided[result["decided_by"]] += 1
+        missed += kind != "new" and result["decided_by"] in ("new", "embedding_failed")
+    return {
+        "mode": args.mode,
+        "alerts": len(alerts),
+        "duplicate_ratio": args.duplicate_ratio,
+        "elapsed_s": round(elapsed, 3),
+        "alerts_per_sec": round(len(alerts) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 3),
+            "p95": round(percentile(latencies, 95) * 1000, 3),
+            "p99": round(percentile(latencies, 99) * 1000, 3),
+            "max": round(max(latencies) * 1000, 3) if latencies else 0.0,
+        },
+        "decided_by": dict(decided),
+        "expected": {kind: kinds.count(kind) for kind in ("new", "exact", "near")},
+        "missed_duplicates": missed,
+        "stages": timer.report(),
+    }
+
+
+def print_report(report: dict) -> None:
+    lat = report["latency_ms"]
+    print(f"mode={report['mode']} alerts={report['alerts']} duplicate_ratio={report['duplicate_ratio']}")
+    print(f"  throughput  {report['alerts_per_sec']} alerts/s ({report['elapsed_s']}s)")
+    print(f"  latency ms  p50 {lat['p50']}  p95 {lat['p95']}  p99 {lat['p99']}  max {lat['max']}")
+    print(f"  decided_by  {report['decided_by']}")
+    print(f"  expected    {report['expected']}  missed duplicates {report['missed_duplicates']}")
+    print(f"\n  {'stage':<14}{'calls':>8}{'total ms':>12}{'mean ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, s in sorted(report["stages"].items(), key=lambda kv: -kv[1]["total_ms"]):
+        print(f"  {stage:<14}{s['calls']:>8}{s['total_ms']:>12}{s['mean_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}")
+
+
+def compare(report: dict, baseline: dict, max_regression: float) -> list[str]:
+    """Regressions of throughput or p95/p99 latency beyond max_regression (a fraction)."""
+    problems = []
+    if report["alerts_per_sec"] < baseline["alerts_per_sec"] * (1 - max_regression):
+        problems.append(f"throughput {report['alerts_per_sec']} < baseline {baseline['alerts_per_sec']}")
+    for key in ("p95", "p99"):
+        now, then = report["latency_ms"][key], baseline["latency_ms"][key]
+        if now > then * (1 + max_regression):
+            problems.append(f"{key} latency {now}ms > baseline {then}ms")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark alert dedup against local stand-ins")
+    parser.add_argument("--mode", choices=["sync", "async", "batch"], default="sync")
+    parser.add_argument("--alerts", type=int, default=2000)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.6)
+    parser.add_argument("--exact-share", type=float, default=0.5, help="fraction of duplicates that are exact repeats")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--embed-latency-ms", type=float, default=15.0, help="per embed call")
+    parser.add_argument("--embed-batch-item-ms", type=float, default=1.0, help="extra per text in a batch call")
+    parser.add_argument("--store-latency-ms", type=float, default=0.0, help="simulated vector store round trip")
+    parser.add_argument("--db-latency-ms", type=float, default=0.0, help="simulated Postgres round trip")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--compare", help="baseline report (from --json) to check for regressions")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    report = benchmark(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            problems = compare(report, json.load(f), args.max_regression)
+        for problem in problems:
+            print(f"REGRESSION: {problem}")
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
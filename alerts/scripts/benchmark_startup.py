@@ -0,0 +1,62 @@
+# Measure how long `import alerts.main` takes in a fresh interpreter.
+# Importing the app must not touch the network, so this runs without Postgres,
+# Weaviate or Ollama:
+# python -m alerts.scripts.benchmark_startup [--runs 5] [--top 15]
+
+import argparse, os, re, statistics, subprocess, sys, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Should only load on first use, never at import time
+HEAVY_MODULES = ["weaviate", "ollama", "numpy", "llama_index"]
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def time_import(module: str) -> tuple[float, list[tuple[str, int, int]]]:
+    """Wall-clock seconds for one cold import, plus (module, cumulative_us, depth) from -X importtime."""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    modules = []
+    for line in proc.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            _, cumulative, indent, name = match.groups()
+            modules.append((name, int(cumulative), (len(indent) - 1) // 2))
+    return elapsed, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cold import time of the app")
+    parser.add_argument("--module", default="alerts.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="slowest direct imports to list")
+    args = parser.parse_args()
+
+    timings = []
+    for _ in range(args.runs):
+        elapsed, modules = time_import(args.module)
+        timings.append(elapsed)
+
+    print(f"import {args.module}: {args.runs} runs")
+    print(f"  wall  median {statistics.median(timings):.3f}s  min {min(timings):.3f}s  max {max(timings):.3f}s")
+    total = next((us for name, us, _ in modules if name == args.module), 0)
+    print(f"  importtime total {total / 1e6:.3f}s")
+
+    print("\nSlowest direct imports (last run):")
+    direct = sorted((m for m in modules if m[2] == 1), key=lambda m: -m[1])
+    for name, us, _ in direct[: args.top]:
+        print(f"  {us / 1e3:9.1f} ms  {name}")
+
+    loaded = sorted({name.split(".")[0] for name, _, _ in modules} & set(HEAVY_MODULES))
+    print(f"\nHeavy modules loaded at import: {', '.join(loaded) if loaded else 'none'}")
+
+
+if __name__ == "__main__":
+    main()
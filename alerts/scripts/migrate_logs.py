@@ -1,18 +1,34 @@
 # Run this script only once. Running it again will create duplicate entries.
 # python -m alerts.scripts.migrate_logs
+#
+# Pipelined mode batches reads, embeddings, searches and writes, and keeps a
+# checkpoint in Postgres so it can be re-run after a crash to resume:
+# python -m alerts.scripts.migrate_logs --pipelined [--batch-size 500] [--restart]
+#
+# Parallel mode embeds shards of all_alerts in worker processes, then merges:
+# python -m alerts.scripts.migrate_logs --workers 8 [--shard-by hash|time] [--restart]
 
-import os, json, psycopg2, warnings
+import os, json, time, argparse, psycopg2, warnings
+from psycopg2.extras import execute_values
 from dotenv import load_dotenv
 import ollama, numpy as np
+from alerts.services.embedding_cache import EMBEDDING_MODEL, get_embedding_cache
+from alerts.services.fingerprint import compute_fingerprint
+from alerts.services.postgres_service import (
+    EMBEDDING_COLUMNS, close_pool, decode_cursor, decode_embedding, embedding_values, encode_cursor,
+    ensure_schema, iter_stored_embeddings, reconcile_counters, write_duplicates
+)
+from alerts.services.thresholds import SIMILARITY_THRESHOLD, dedup_thresholds
+from alerts.services.vector_service import get_embeddings
 from alerts.services.weaviate_client import (
-    create_schema, weaviate_store, weaviate_search, delete_all_weaviate_data
+    create_schema, partition_key, weaviate_store, weaviate_search, weaviate_search_many,
+    weaviate_store_many, weaviate_uuid, delete_all_weaviate_data
 )
 
 warnings.simplefilter("ignore", ResourceWarning)
 load_dotenv()
 
 BATCH_SIZE = 500
-SIMILARITY_THRESHOLD = 0.85
 
 PG_CONN = psycopg2.connect(
     dbname=os.getenv("POSTGRES_DB"),
@@ -23,8 +39,12 @@ PG_CONN = psycopg2.connect(
 )
 
 def get_embedding(text: str):
+    """Embedding for text, reusing the service embedding cache (EMBEDDING_CACHE_*)."""
+    return get_embedding_cache().get_or_compute(text, _embed)
+
+def _embed(text: str):
     try:
-        response = ollama.embed(model="nomic-embed-text", input=text)
+        response = ollama.embed(model=EMBEDDING_MODEL, input=text)
         vector = response.get("embeddings", [])
         if not vector:
             return []
@@ -54,30 +74,13 @@ def insert_into_all_alerts(cur, row):
     ))
 
 def insert_duplicate(cur, top_match, row):
-    """Insert duplicate into duplicate_alerts (reference original incident_id)"""
-    (
-        incident_id, observed_value, policy_name, condition_name,
-        subject, display_name, severity, summary, log_data, created_at
-    ) = row
-
-    original_incident_id = top_match["incident_id"]
-
-    cur.execute("""
-        INSERT INTO duplicate_alerts (
-            incident_id, observed_value, policy_name, condition_name,
-            subject, display_name, severity, summary, log_data, created_at
-        )
-        VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-    """, (
-        original_incident_id, observed_value, policy_name, condition_name,
-        subject, display_name, severity, summary,
-        json.dumps(log_data) if log_data else None,
-        created_at
-    ))
+    """Record a duplicate of the original incident (aggregate + sampled duplicate_alerts row)"""
+    write_duplicates(cur, [(top_match["incident_id"], _row_fields(row), None, row[9])])
 
 def migrate_alerts():
     create_schema()
     delete_all_weaviate_data()
+    ensure_schema()
 
     with PG_CONN.cursor() as cur:
         cur.execute("SELECT COUNT(*) FROM all_alerts")
@@ -126,24 +129,34 @@ def migrate_alerts():
                     continue
 
                 # Step 3 - Semantic duplicate check
-                matches = weaviate_search(vector, limit=1)
-                if matches and matches[0].get("similarity", 0) >= SIMILARITY_THRESHOLD:
+                fields = {
+                    "observed_value": observed_value, "policy_name": policy_name,
+                    "condition_name": condition_name, "subject": subject,
+                    "display_name": display_name, "severity": severity,
+                    "summary": summary, "log_data": log_data,
+                }
+                partition = partition_key(fields)
+                matches = weaviate_search(vector, limit=1, partition=partition)
+                threshold = dedup_thresholds.threshold_for(fields, partition)
+                if matches and matches[0].get("similarity", 0) >= threshold:
                     insert_duplicate(cur, matches[0], row)
                     inserted_duplicates += 1
                     continue
 
-                # Step 4 - Insert cleaned alert
-                cur.execute("""
+                # Step 4 - Insert cleaned alert (with its embedding)
+                cur.execute(f"""
                     INSERT INTO cleaned_alerts (
                         incident_id, observed_value, policy_name, condition_name,
-                        subject, display_name, severity, summary, log_data, created_at
-                    ) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+                        subject, display_name, severity, summary, log_data, created_at,
+                        {EMBEDDING_COLUMNS}
+                    ) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
                     ON CONFLICT (incident_id) DO NOTHING
                 """, (
                     incident_id, observed_value, policy_name, condition_name,
                     subject, display_name, severity, summary,
                     json.dumps(log_data) if log_data else None,
-                    created_at
+                    created_at,
+                    *embedding_values(vector)
                 ))
 
                 # Step 5 - Store vector
@@ -167,7 +180,489 @@ def migrate_alerts():
             print(f"Processed {processed}/{total_rows} | Cleaned: {inserted_cleaned} | Duplicates: {inserted_duplicates}")
 
     PG_CONN.close()
+    # Rows were written directly, so rebuild the dashboard counters
+    reconcile_counters()
+    close_pool()
+    print("Migration completed")
+
+# ---------------------------------------------------------------------- #
+# Pipelined, resumable mode
+# ---------------------------------------------------------------------- #
+CHECKPOINT_NAME = "migrate_alerts"
+
+SOURCE_COLUMNS = """
+    incident_id, observed_value, policy_name, condition_name,
+    subject, display_name, severity, summary, log_data, created_at
+"""
+
+FIELD_NAMES = [
+    "observed_value", "policy_name", "condition_name", "subject",
+    "display_name", "severity", "summary", "log_data",
+]
+
+def build_alert_text(row):
+    """Same embedding text as the row-at-a-time migration."""
+    return " | ".join(str(value or "") for value in row[:9])
+
+def _row_fields(row):
+    return dict(zip(FIELD_NAMES, row[1:9]))
+
+def row_partition(row):
+    return partition_key(_row_fields(row))
+
+def ensure_checkpoint_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS migration_checkpoints (
+            name TEXT PRIMARY KEY,
+            batch_start TEXT,
+            last_key TEXT,
+            vectors_pending BOOLEAN NOT NULL DEFAULT FALSE,
+            processed BIGINT NOT NULL DEFAULT 0,
+            cleaned BIGINT NOT NULL DEFAULT 0,
+            duplicates BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+
+def load_checkpoint(cur, name=CHECKPOINT_NAME):
+    cur.execute("""
+        SELECT batch_start, last_key, vectors_pending, processed, cleaned, duplicates
+        FROM migration_checkpoints WHERE name = %s
+    """, (name,))
+    row = cur.fetchone()
+    if row is None:
+        return None
+    keys = ["batch_start", "last_key", "vectors_pending", "processed", "cleaned", "duplicates"]
+    return dict(zip(keys, row))
+
+def reset_checkpoint(cur, name=CHECKPOINT_NAME):
+    cur.execute("""
+        INSERT INTO migration_checkpoints (name) VALUES (%s)
+        ON CONFLICT (name) DO UPDATE SET
+            batch_start = NULL, last_key = NULL, vectors_pending = FALSE,
+            processed = 0, cleaned = 0, duplicates = 0, updated_at = now()
+    """, (name,))
+
+# Tables the migration writes; a fresh run owns them, so they must start empty
+TARGET_TABLES = ("cleaned_alerts", "duplicate_alerts", "duplicate_alert_aggregates", "alert_counters")
+
+def reset_targets(cur):
+    cur.execute(f"TRUNCATE {', '.join(TARGET_TABLES)}")
+
+def nonempty_targets(cur):
+    found = []
+    for table in TARGET_TABLES:
+        cur.execute(f"SELECT EXISTS (SELECT 1 FROM {table})")
+        if cur.fetchone()[0]:
+            found.append(table)
+    return found
+
+def read_source_batch(cur, after=None, limit=BATCH_SIZE, until=None, shard=None):
+    """Keyset page of all_alerts ordered by (created_at, incident_id); keys are cursor tokens.
+    shard is an optional (sql, params) filter from shard_filters()."""
+    conditions, params = [], []
+    if shard:
+        conditions.append(shard[0])
+        params.extend(shard[1])
+    if after:
+        conditions.append("(created_at, incident_id) > (%s, %s)")
+        params.extend(decode_cursor(after, 2))
+    if until:
+        conditions.append("(created_at, incident_id) <= (%s, %s)")
+        params.extend(decode_cursor(until, 2))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    page = "LIMIT %s" if limit else ""
+    cur.execute(f"""
+        SELECT {SOURCE_COLUMNS}
+        FROM all_alerts
+        {where}
+        ORDER BY created_at, incident_id
+        {page}
+    """, (*params, limit) if limit else params)
+    return cur.fetchall()
+
+def row_key(row):
+    return encode_cursor([row[9], row[0]])
+
+def dedup_batch(rows, vectors, store_matches, threshold=SIMILARITY_THRESHOLD, partitions=None):
+    """Greedy in-order decision for a batch, equivalent to processing the rows
+    one at a time: each row is compared with the store and with the rows of
+    this batch already accepted as new (in the same partition, if given).
+    threshold is one value or a list with each row's threshold. Returns (originals, new_positions) where originals[i] is the incident
+    row i was stored as or matched."""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix = matrix / np.where(norms == 0, 1, norms)
+
+    originals, new_positions = [], []
+    for i, row in enumerate(rows):
+        match = store_matches[i][0] if store_matches[i] else None
+        best_id = match["incident_id"] if match else None
+        best_sim = match.get("similarity", 0) if match else 0.0
+        candidates = new_positions
+        if partitions is not None:
+            candidates = [p for p in new_positions if partitions[p] == partitions[i]]
+        if candidates:
+            sims = matrix[candidates] @ matrix[i]
+            j = int(np.argmax(sims))
+            if float(sims[j]) > best_sim:
+                best_sim = float(sims[j])
+                best_id = rows[candidates[j]][0]
+        limit = threshold[i] if isinstance(threshold, list) else threshold
+        if best_id is not None and best_sim >= limit:
+            originals.append(best_id)
+        else:
+            new_positions.append(i)
+            originals.append(row[0])
+    return originals, new_positions
+
+def _db_row(incident_id, row):
+    log_data = row[8]
+    return (
+        incident_id, *row[1:8],
+        json.dumps(log_data) if log_data else None,
+        row[9],
+        compute_fingerprint(_row_fields(row)),
+    )
+
+def write_batch(cur, rows, originals, new_positions, vectors):
+    """
+    Insert the batch's cleaned (with their embeddings) and duplicate rows; returns (cleaned, duplicates) counts.
+    Cleaned rows whose incident_id is already stored are skipped and not counted.
+    """
+    new = set(new_positions)
+    cleaned = [(*_db_row(row[0], row), *embedding_values(vectors[i])) for i, row in enumerate(rows) if i in new]
+    duplicates = [
+        (originals[i], _row_fields(row), compute_fingerprint(_row_fields(row)), row[9])
+        for i, row in enumerate(rows) if i not in new
+    ]
+    inserted = []
+    if cleaned:
+        inserted = execute_values(cur, f"""
+            INSERT INTO cleaned_alerts ({SOURCE_COLUMNS}, fingerprint, {EMBEDDING_COLUMNS}) VALUES %s
+            ON CONFLICT (incident_id) DO NOTHING
+            RETURNING incident_id
+        """, cleaned, fetch=True)
+    write_duplicates(cur, duplicates)
+    return len(inserted), len(duplicates)
+
+def import_vectors(rows, vectors):
+    """Batch import rows into Weaviate under their deterministic ids."""
+    if rows:
+        weaviate_store_many(
+            [(vector, row[0], _row_fields(row)) for row, vector in zip(rows, vectors)],
+            uuids=[weaviate_uuid(row[0]) for row in rows],
+        )
+
+def embed_rows(rows):
+    vectors = get_embeddings([build_alert_text(row) for row in rows])
+    if not vectors:
+        raise RuntimeError("Embedding failed; re-run to resume from the last checkpoint")
+    return vectors
+
+def replay_pending_vectors(cur, checkpoint):
+    """Re-import the vectors of the last committed batch (crash between commit and import)."""
+    rows = read_source_batch(cur, after=checkpoint["batch_start"], limit=None, until=checkpoint["last_key"])
+    cur.execute(
+        "SELECT incident_id, embedding FROM cleaned_alerts WHERE incident_id = ANY(%s)",
+        ([row[0] for row in rows],),
+    )
+    stored = {r[0]: r[1] for r in cur.fetchall()}
+    rows = [row for row in rows if row[0] in stored]
+    if rows:
+        # The batch committed its embeddings with the rows, so Ollama is not needed here
+        if all(stored[row[0]] is not None for row in rows):
+            vectors = [decode_embedding(bytes(stored[row[0]])) for row in rows]
+        else:
+            vectors = embed_rows(rows)
+        import_vectors(rows, vectors)
+    print(f"Replayed {len(rows)} vectors from the last committed batch")
+
+def report_progress(label, processed, total, started, run_rows, cleaned, duplicates):
+    elapsed = max(time.monotonic() - started, 1e-9)
+    rate = run_rows / elapsed
+    remaining = max(total - processed, 0)
+    eta = f"{remaining / rate:.0f}s" if rate > 0 else "?"
+    print(
+        f"{label}Processed {processed}/{total} | {rate:.1f} rows/s | ETA {eta} | "
+        f"Cleaned: {cleaned} | Duplicates: {duplicates}"
+    )
+
+def start_run(cur, restart=False):
+    """Load (or reset) the checkpoint and make Weaviate consistent with it.
+
+    Starting over truncates TARGET_TABLES with the checkpoint, so a restarted run
+    does not count its rows twice. A first run refuses to write into non-empty
+    targets (e.g. left by the legacy mode) unless restart is set.
+    """
+    ensure_schema()
+    ensure_checkpoint_table(cur)
+    checkpoint = None if restart else load_checkpoint(cur)
+    if checkpoint is None:
+        if not restart:
+            nonempty = nonempty_targets(cur)
+            if nonempty:
+                PG_CONN.rollback()
+                raise RuntimeError(
+                    f"{', '.join(nonempty)} already hold rows but there is no checkpoint; "
+                    "re-run with --restart to truncate them and start over"
+                )
+        reset_targets(cur)
+        delete_all_weaviate_data()
+        reset_checkpoint(cur)
+        checkpoint = load_checkpoint(cur)
+    PG_CONN.commit()
+    create_schema()
+
+    if checkpoint["vectors_pending"]:
+        replay_pending_vectors(cur, checkpoint)
+        cur.execute("UPDATE migration_checkpoints SET vectors_pending = FALSE WHERE name = %s", (CHECKPOINT_NAME,))
+        PG_CONN.commit()
+    elif checkpoint["last_key"]:
+        print(f"Resuming after {checkpoint['processed']} rows")
+    return checkpoint
+
+def run_batches(cur, checkpoint, batch_size=BATCH_SIZE, embed=embed_rows, search=None, on_new=None):
+    """Deduplicate every row after the checkpoint in source order, one committed batch at a time.
+
+    embed(rows) returns the rows' vectors and search(vectors, partitions) their
+    top store match lists (Weaviate by default); on_new(rows, incident_ids, vectors) is
+    called with each batch's new incidents once they are committed.
+    """
+    search = search or (lambda vectors, partitions: weaviate_search_many(vectors, limit=1, partitions=partitions))
+
+    cur.execute("SELECT COUNT(*) FROM all_alerts")
+    total_rows = cur.fetchone()[0]
+    print(f"Total rows in all_alerts: {total_rows}")
+
+    processed, cleaned, duplicates = checkpoint["processed"], checkpoint["cleaned"], checkpoint["duplicates"]
+    after = checkpoint["last_key"]
+    started, run_rows = time.monotonic(), 0
+
+    while True:
+        rows = read_source_batch(cur, after=after, limit=batch_size)
+        if not rows:
+            break
+
+        vectors = embed(rows)
+        partitions = [row_partition(row) for row in rows]
+        thresholds = [dedup_thresholds.threshold_for(_row_fields(row), p) for row, p in zip(rows, partitions)]
+        originals, new_positions = dedup_batch(
+            rows, vectors, search(vectors, partitions), threshold=thresholds, partitions=partitions
+        )
+
+        # Rows and checkpoint commit together; vectors follow once the rows are durable
+        last_key = row_key(rows[-1])
+        n_cleaned, n_duplicates = write_batch(cur, rows, originals, new_positions, vectors)
+        cur.execute("""
+            UPDATE migration_checkpoints SET
+                batch_start = %s, last_key = %s, vectors_pending = TRUE,
+                processed = processed + %s, cleaned = cleaned + %s,
+                duplicates = duplicates + %s, updated_at = now()
+            WHERE name = %s
+        """, (after, last_key, len(rows), n_cleaned, n_duplicates, CHECKPOINT_NAME))
+        PG_CONN.commit()
+
+        new_rows = [rows[i] for i in new_positions]
+        new_vectors = [vectors[i] for i in new_positions]
+        import_vectors(new_rows, new_vectors)
+        cur.execute("UPDATE migration_checkpoints SET vectors_pending = FALSE WHERE name = %s", (CHECKPOINT_NAME,))
+        PG_CONN.commit()
+        if on_new:
+            on_new(new_rows, [row[0] for row in new_rows], new_vectors)
+
+        after = last_key
+        processed += len(rows)
+        run_rows += len(rows)
+        cleaned += n_cleaned
+        duplicates += n_duplicates
+        report_progress("", processed, total_rows, started, run_rows, cleaned, duplicates)
+
+def migrate_alerts_pipelined(batch_size=BATCH_SIZE, restart=False):
+    with PG_CONN.cursor() as cur:
+        checkpoint = start_run(cur, restart=restart)
+        run_batches(cur, checkpoint, batch_size=batch_size)
+
+    PG_CONN.close()
+    reconcile_counters()
+    close_pool()
+    print("Migration completed")
+
+# ---------------------------------------------------------------------- #
+# Parallel mode
+#
+# Embedding dominates the cost, so worker processes embed disjoint shards of
+# all_alerts and spill the vectors to disk. Duplicates are then resolved by
+# the parent in a single merge pass in global source order against an exact
+# in-process index, which gives the same result as a sequential run however
+# the rows were sharded. The merge writes the same checkpoint as pipelined
+# mode: re-running resumes after it (workers only embed the remaining rows
+# and the index is preloaded from the embeddings stored with the merged
+# rows), or it can be finished with --pipelined; --restart starts over.
+# ---------------------------------------------------------------------- #
+def shard_filters(cur, workers, shard_by="hash"):
+    """One (sql, params) filter per shard, by hash of incident_id or by created_at range."""
+    if shard_by == "hash":
+        return [
+            ("mod(abs(hashtext(incident_id)::bigint), %s) = %s", [workers, shard])
+            for shard in range(workers)
+        ]
+    cur.execute("""
+        SELECT percentile_disc(%s::float8[]) WITHIN GROUP (ORDER BY created_at) FROM all_alerts
+    """, ([i / workers for i in range(1, workers)],))
+    bounds = [b for b in (cur.fetchone()[0] or []) if b is not None]
+    edges = [None, *sorted(set(bounds)), None]
+    filters = []
+    for lower, upper in zip(edges, edges[1:]):
+        conditions, params = [], []
+        if lower is not None:
+            conditions.append("created_at >= %s")
+            params.append(lower)
+        if upper is not None:
+            conditions.append("created_at < %s")
+            params.append(upper)
+        filters.append((" AND ".join(conditions) or "TRUE", params))
+    return filters
+
+def _spill_paths(spill_dir, shard):
+    return os.path.join(spill_dir, f"shard{shard}.f32"), os.path.join(spill_dir, f"shard{shard}.ids")
+
+def embed_shard(shard, shard_filter, spill_dir, batch_size=BATCH_SIZE, after=None):
+    """Worker: embed every row of one shard after the key, appending float32 vectors and ids to spill files."""
+    vectors_path, ids_path = _spill_paths(spill_dir, shard)
+    label = f"[shard {shard}] "
+    dim = None
+    with PG_CONN.cursor() as cur, open(vectors_path, "wb") as vectors_file, open(ids_path, "w") as ids_file:
+        cur.execute(f"SELECT COUNT(*) FROM all_alerts WHERE {shard_filter[0]}", shard_filter[1])
+        total_rows = cur.fetchone()[0]
+        processed, started = 0, time.monotonic()
+        while True:
+            rows = read_source_batch(cur, after=after, limit=batch_size, shard=shard_filter)
+            if not rows:
+                break
+            matrix = np.asarray(embed_rows(rows), dtype=np.float32)
+            dim = matrix.shape[1]
+            matrix.tofile(vectors_file)
+            ids_file.writelines(f"{row[0]}\n" for row in rows)
+            after = row_key(rows[-1])
+            processed += len(rows)
+            elapsed = max(time.monotonic() - started, 1e-9)
+            print(f"{label}Embedded {processed}/{total_rows} | {processed / elapsed:.1f} rows/s")
+    PG_CONN.close()
+    return shard, processed, dim
+
+class SpilledVectors:
+    """Looks up the vectors written by embed_shard by incident_id (memory mapped)."""
+
+    def __init__(self, spill_dir, shards, dim):
+        self._matrices, self._where = [], {}
+        for shard in range(shards):
+            vectors_path, ids_path = _spill_paths(spill_dir, shard)
+            with open(ids_path) as f:
+                ids = f.read().splitlines()
+            matrix = np.memmap(vectors_path, dtype=np.float32, mode="r") if ids else np.empty(0, np.float32)
+            self._matrices.append(matrix.reshape(len(ids), dim) if ids else matrix)
+            for position, incident_id in enumerate(ids):
+                self._where[incident_id] = (shard, position)
+
+    def __call__(self, rows):
+        vectors = []
+        for row in rows:
+            location = self._where.get(str(row[0]))
+            if location is None:
+                raise RuntimeError(f"No embedding spilled for {row[0]}; re-run the parallel migration")
+            shard, position = location
+            vectors.append(self._matrices[shard][position].tolist())
+        return vectors
+
+def preload_index(index, batch_size=BATCH_SIZE):
+    """Add the incidents merged before the checkpoint to the merge index, from their stored embeddings."""
+    vectors, props, partitions, loaded = [], [], [], 0
+    for alert, _, vector in iter_stored_embeddings(itersize=batch_size):
+        vectors.append(vector)
+        props.append({"incident_id": alert["incident_id"]})
+        partitions.append(partition_key(alert))
+        if len(vectors) == batch_size:
+            index.add_many(vectors, props, partitions=partitions)
+            loaded += len(vectors)
+            vectors, props, partitions = [], [], []
+    index.add_many(vectors, props, partitions=partitions)
+    loaded += len(vectors)
+    if loaded:
+        print(f"Loaded {loaded} merged incidents into the index")
+
+def migrate_alerts_parallel(workers=os.cpu_count() or 1, batch_size=BATCH_SIZE, shard_by="hash", restart=False):
+    import multiprocessing
+    import shutil
+    import tempfile
+    from alerts.services.numpy_index import NumpyVectorIndex
+
+    with PG_CONN.cursor() as cur:
+        checkpoint = start_run(cur, restart=restart)
+        filters = shard_filters(cur, workers, shard_by)
+    PG_CONN.commit()
+
+    spill_dir = tempfile.mkdtemp(prefix="migrate_alerts_")
+    try:
+        started = time.monotonic()
+        # spawn: every worker opens its own Postgres connection on import
+        with multiprocessing.get_context("spawn").Pool(len(filters)) as pool:
+            results = pool.starmap(
+                embed_shard,
+                [
+                    (shard, shard_filter, spill_dir, batch_size, checkpoint["last_key"])
+                    for shard, shard_filter in enumerate(filters)
+                ],
+            )
+        for shard, rows, _ in sorted(results):
+            print(f"[shard {shard}] done: {rows} rows")
+        print(f"Embedded {sum(r[1] for r in results)} rows in {time.monotonic() - started:.1f}s")
+
+        dims = {dim for _, _, dim in results if dim}
+        if len(dims) > 1:
+            raise RuntimeError(f"Inconsistent embedding dimensions across shards: {sorted(dims)}")
+        spilled = SpilledVectors(spill_dir, len(filters), dims.pop() if dims else 0)
+
+        index = NumpyVectorIndex()
+        preload_index(index, batch_size)
+        with PG_CONN.cursor() as cur:
+            run_batches(
+                cur,
+                checkpoint,
+                batch_size=batch_size,
+                embed=spilled,
+                search=lambda vectors, partitions: index.search_many(vectors, limit=1, partitions=partitions),
+                on_new=lambda rows, ids, vectors: index.add_many(
+                    vectors, [{"incident_id": i} for i in ids], partitions=[row_partition(row) for row in rows]
+                ),
+            )
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+    PG_CONN.close()
+    reconcile_counters()
+    close_pool()
     print("Migration completed")
 
+def main():
+    parser = argparse.ArgumentParser(description="Deduplicate all_alerts into cleaned_alerts/duplicate_alerts")
+    parser.add_argument("--pipelined", action="store_true", help="batched, resumable migration")
+    parser.add_argument("--workers", type=int, default=0, help="embed shards in N processes, then merge")
+    parser.add_argument("--shard-by", choices=["hash", "time"], default="hash")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--restart", action="store_true", help="truncate the migrated tables and checkpoint and start over")
+    args = parser.parse_args()
+    # Per-partition/per-service thresholds as configured for the running service
+    ensure_schema()
+    dedup_thresholds.reload()
+    if args.workers > 0:
+        migrate_alerts_parallel(
+            workers=args.workers, batch_size=args.batch_size, shard_by=args.shard_by, restart=args.restart
+        )
+    elif args.pipelined:
+        migrate_alerts_pipelined(batch_size=args.batch_size, restart=args.restart)
+    else:
+        migrate_alerts()
+
 if __name__ == "__main__":
-    migrate_alerts()
+    main()
@@ -0,0 +1,275 @@
+# Offline similarity-threshold tuning from the embeddings stored in cleaned_alerts.
+# Replays the semantic dedup decision over a time range at many thresholds in
+# one pass, without Ollama or Weaviate:
+# python -m alerts.scripts.tune_threshold [--since ISO] [--until ISO] [--hours 24]
+#     [--thresholds 0.75:0.97:0.01] [--by service|partition] [--borderline 5] [--json out.json]
+#
+# Incidents are replayed oldest first. Each one is compared with the incidents
+# kept so far in its partition, inside DEDUP_WINDOW_HOURS when that is set. It
+# becomes a duplicate of the best match when the similarity reaches the
+# threshold, as in alert_service. Similarities are computed in blocks with one
+# matrix product each. Only pairs at or above the lowest threshold are kept as
+# candidates, so each row costs one small vectorized step covering every
+# threshold. The "configured" row uses each incident's threshold as currently
+# set: default, service or partition override.
+#
+# The input is the stored (cleaned) incidents, i.e. what was kept at the
+# threshold in force when they arrived. Lower thresholds show how many of them
+# would also merge. For higher ones the replay shows the borderline pairs, but
+# it cannot re-split duplicates that were never stored as incidents.
+#
+# Apply a result without a redeploy (or PUT /dedup/thresholds); running
+# workers pick it up within DEDUP_THRESHOLD_REFRESH_SECONDS:
+# python -m alerts.scripts.tune_threshold --apply 0.9 --scope service --value checkout-latency
+
+import argparse, json, time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from alerts.services.alert_service import build_alert_text
+from alerts.services.postgres_service import close_pool, ensure_schema, iter_stored_embeddings, set_threshold
+from alerts.services.thresholds import dedup_thresholds
+from alerts.services.weaviate_client import DEDUP_WINDOW_HOURS, partition_key
+
+BLOCK_SIZE = 1024
+DEFAULT_THRESHOLDS = "0.75:0.97:0.01"
+# Pairs within this similarity of a threshold are reported as borderline
+BORDERLINE_MARGIN = 0.02
+
+
+def parse_thresholds(spec: str) -> list[float]:
+    """'0.8,0.85,0.9' or 'start:stop:step' (stop included)."""
+    if ":" in spec:
+        start, stop, step = (float(part) for part in spec.split(":"))
+        return [round(float(value), 6) for value in np.arange(start, stop + step / 2, step)]
+    return [float(part) for part in spec.split(",") if part.strip()]
+
+
+def _utc(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value)
+    return parsed.astimezone(timezone.utc) if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def load_embeddings(since: datetime | None, until: datetime | None) -> dict:
+    """Stored embeddings of the range as one L2-normalized float32 matrix, oldest first."""
+    ids, texts, times, partitions, services, vectors = [], [], [], [], [], []
+    for alert, created_at, vector in iter_stored_embeddings(since, until=until):
+        ids.append(alert["incident_id"])
+        texts.append(build_alert_text(alert))
+        times.append(created_at.timestamp())
+        partitions.append(partition_key(alert))
+        services.append(dedup_thresholds.service_of(alert))
+        vectors.append(vector)
+    matrix = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return {
+        "ids": ids,
+        "texts": texts,
+        "times": np.asarray(times, dtype=np.float64),
+        "partitions": partitions,
+        "services": services,
+        "matrix": matrix / np.where(norms == 0, 1, norms),
+    }
+
+
+def _candidates(vecs: np.ndarray, times: np.ndarray, start: int, stop: int, floor: float, window: float, block_size: int):
+    """(row, column, similarity) of every earlier row in the window at or above floor, for rows start..stop-1."""
+    first = int(np.searchsorted(times, times[start] - window)) if window > 0 else 0
+    rows, cols, sims = [], [], []
+    block = vecs[start:stop]
+    positions = np.arange(start, stop)[:, None]
+    for col_start in range(first, stop, block_size):
+        col_stop = min(col_start + block_size, stop)
+        scores = block @ vecs[col_start:col_stop].T
+        columns = np.arange(col_start, col_stop)[None, :]
+        valid = (columns < positions) & (scores >= floor)
+        if window > 0:
+            valid &= times[start:stop, None] - times[None, col_start:col_stop] <= window
+        r, c = np.nonzero(valid)
+        rows.append(r)
+        cols.append(c + col_start)
+        sims.append(scores[r, c])
+    if not rows:
+        return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.float32)
+    rows, cols, sims = np.concatenate(rows), np.concatenate(cols), np.concatenate(sims)
+    order = np.argsort(rows, kind="stable")
+    return rows[order], cols[order], sims[order]
+
+
+def replay(data: dict, thresholds: np.ndarray, window: float = 0.0, block_size: int = BLOCK_SIZE) -> dict:
+    """Greedy dedup of every row at every threshold at once.
+
+    thresholds is a (T, N) array: row t holds the threshold each incident is
+    judged with in run t. Returns kept (T, N) bool, best (T, N) similarity
+    of the best kept earlier match (-inf when none is near any threshold) and
+    match (T, N) index of that match (-1 when none).
+    """
+    matrix, times = data["matrix"], data["times"]
+    n, runs = len(matrix), thresholds.shape[0]
+    floor = float(thresholds.min()) - BORDERLINE_MARGIN if n else 0.0
+    kept = np.zeros((runs, n), dtype=bool)
+    best = np.full((runs, n), -np.inf, dtype=np.float32)
+    match = np.full((runs, n), -1, dtype=np.int64)
+    run_index = np.arange(runs)
+
+    _, partition_ids = np.unique(np.asarray(data["partitions"], dtype=object).astype(str), return_inverse=True)
+    for partition in np.unique(partition_ids):
+        members = np.flatnonzero(partition_ids == partition)
+        vecs, part_times = matrix[members], times[members]
+        for start in range(0, len(members), block_size):
+            stop = min(start + block_size, len(members))
+            rows, cols, sims = _candidates(vecs, part_times, start, stop, floor, window, block_size)
+            bounds = np.searchsorted(rows, np.arange(stop - start + 1))
+            for r in range(stop - start):
+                i = members[start + r]
+                lo, hi = bounds[r], bounds[r + 1]
+                if hi > lo:
+                    candidates = members[cols[lo:hi]]
+                    scores = np.where(kept[:, candidates], sims[lo:hi][None, :], -np.inf)
+                    top = scores.argmax(axis=1)
+                    best[:, i] = scores[run_index, top]
+                    match[:, i] = np.where(np.isfinite(best[:, i]), candidates[top], -1)
+                kept[:, i] = ~(best[:, i] >= thresholds[:, i])
+    return {"kept": kept, "best": best, "match": match}
+
+
+def summarize(data: dict, result: dict, labels: list, thresholds: np.ndarray, rows=None, borderline: int = 5) -> list[dict]:
+    """Per-run reduction, cluster counts and borderline pairs, over all rows or the given ones."""
+    rows = np.arange(len(data["ids"])) if rows is None else rows
+    n = len(rows)
+    summary = []
+    for t, label in enumerate(labels):
+        kept, best, match = result["kept"][t, rows], result["best"][t, rows], result["match"][t, rows]
+        roots = np.where(kept, rows, match)
+        sizes = np.unique(roots, return_counts=True)[1] if n else np.array([0])
+        gap = np.abs(best - thresholds[t, rows])
+        near = np.flatnonzero(np.isfinite(best) & (gap <= BORDERLINE_MARGIN))
+        pairs = [
+            {
+                "similarity": round(float(best[k]), 4),
+                "threshold": round(float(thresholds[t, rows[k]]), 4),
+                "merged": not bool(kept[k]),
+                "incident_id": data["ids"][rows[k]],
+                "matched_incident_id": data["ids"][match[k]],
+                "text": data["texts"][rows[k]][:100],
+                "matched_text": data["texts"][match[k]][:100],
+            }
+            for k in near[np.argsort(gap[near], kind="stable")][:borderline]
+        ]
+        clusters = int(kept.sum())
+        summary.append({
+            "threshold": label,
+            "incidents": n,
+            "clusters": clusters,
+            "duplicates": n - clusters,
+            "reduction_pct": round((n - clusters) / n * 100, 2) if n else 0.0,
+            "largest_cluster": int(sizes.max()),
+            "borderline": int(near.size),
+            "borderline_pairs": pairs,
+        })
+    return summary
+
+
+def print_summary(title: str, summary: list[dict], show_pairs: bool) -> None:
+    print(f"\n{title}")
+    print(f"  {'threshold':>10} {'clusters':>9} {'dups':>7} {'reduction':>10} {'largest':>8} {'borderline':>11}")
+    for item in summary:
+        label = item["threshold"] if isinstance(item["threshold"], str) else f"{item['threshold']:.3f}"
+        print(
+            f"  {label:>10} {item['clusters']:>9} {item['duplicates']:>7} {item['reduction_pct']:>9.2f}% "
+            f"{item['largest_cluster']:>8} {item['borderline']:>11}"
+        )
+    if show_pairs:
+        for item in summary:
+            for pair in item["borderline_pairs"]:
+                outcome = "merged" if pair["merged"] else "kept"
+                print(
+                    f"  [{item['threshold']}] {pair['similarity']:.4f} {outcome:<6} "
+                    f"{pair['incident_id']} ~ {pair['matched_incident_id']}\n"
+                    f"      {pair['text']}\n      {pair['matched_text']}"
+                )
+
+
+def tune(
+    since: datetime | None, until: datetime | None, candidates: list[float], by: str | None = None,
+    groups: int = 10, borderline: int = 5, window: float = 0.0, block_size: int = BLOCK_SIZE,
+) -> dict:
+    dedup_thresholds.reload()
+    started = time.monotonic()
+    data = load_embeddings(since, until)
+    n = len(data["ids"])
+    print(f"Loaded {n} stored embeddings in {time.monotonic() - started:.1f}s")
+    if not n:
+        return {"incidents": 0}
+
+    # Run 0 replays the thresholds in effect now; the others one candidate each
+    configured = [
+        dedup_thresholds.threshold_for({dedup_thresholds.service_key: service}, partition)
+        for service, partition in zip(data["services"], data["partitions"])
+    ]
+    thresholds = np.vstack([
+        np.asarray(configured, dtype=np.float32),
+        np.repeat(np.asarray(candidates, dtype=np.float32)[:, None], n, axis=1),
+    ])
+    labels = ["configured", *candidates]
+
+    started = time.monotonic()
+    result = replay(data, thresholds, window=window, block_size=block_size)
+    print(f"Replayed {len(labels)} thresholds in {time.monotonic() - started:.1f}s")
+
+    report = {"incidents": n, "all": summarize(data, result, labels, thresholds, borderline=borderline)}
+    print_summary(f"All incidents ({n})", report["all"], show_pairs=borderline > 0)
+    if by:
+        keys = data["services"] if by == "service" else [str(p) for p in data["partitions"]]
+        values, inverse, counts = np.unique(np.asarray(keys, dtype=object).astype(str), return_inverse=True, return_counts=True)
+        report["groups"] = {}
+        for g in np.argsort(-counts, kind="stable")[:groups]:
+            rows = np.flatnonzero(inverse == g)
+            summary = summarize(data, result, labels, thresholds, rows=rows, borderline=borderline)
+            report["groups"][str(values[g])] = summary
+            print_summary(f"{by} {values[g]} ({len(rows)})", summary, show_pairs=False)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay semantic dedup over stored embeddings at many thresholds")
+    parser.add_argument("--since", help="ISO start of the range (UTC unless an offset is given)")
+    parser.add_argument("--until", help="ISO end of the range (exclusive)")
+    parser.add_argument("--hours", type=float, default=24.0, help="range length when --since is not given")
+    parser.add_argument("--thresholds", default=DEFAULT_THRESHOLDS, help="'start:stop:step' or comma-separated")
+    parser.add_argument("--by", choices=["service", "partition"], help="also report per service or partition")
+    parser.add_argument("--groups", type=int, default=10, help="largest groups reported with --by")
+    parser.add_argument("--borderline", type=int, default=5, help="borderline pairs listed per threshold")
+    parser.add_argument("--window-hours", type=float, default=DEDUP_WINDOW_HOURS, help="dedup window (0 = none)")
+    parser.add_argument("--block-size", type=int, default=BLOCK_SIZE)
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--apply", type=float, metavar="THRESHOLD", help="store a threshold override and exit")
+    parser.add_argument("--scope", choices=["service", "partition"], help="with --apply")
+    parser.add_argument("--value", help="with --apply: the service name or partition key")
+    args = parser.parse_args()
+
+    ensure_schema()
+    if args.apply is not None:
+        if not args.scope or args.value is None:
+            parser.error("--apply needs --scope and --value")
+        set_threshold(args.scope, args.value, args.apply)
+        print(f"Threshold for {args.scope} {args.value!r} set to {args.apply}")
+        close_pool()
+        return
+
+    until = _utc(args.until) if args.until else None
+    since = _utc(args.since) if args.since else (until or datetime.now(timezone.utc)) - timedelta(hours=args.hours)
+    report = tune(
+        since, until, parse_thresholds(args.thresholds), by=args.by, groups=args.groups,
+        borderline=args.borderline, window=args.window_hours * 3600, block_size=args.block_size,
+    )
+    close_pool()
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
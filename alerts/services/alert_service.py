@@ -1,11 +1,18 @@
+from alerts.services.fingerprint import compute_fingerprint, recent_fingerprints
 from alerts.services.postgres_service import (
-    insert_cleaned_alert, insert_duplicate_alert, fetch_alert_by_id
+    insert_cleaned_alert, insert_duplicate_alert, fetch_exact_match,
+    insert_alert_batch, fetch_exact_matches,
 )
 from alerts.services.vector_service import (
-    get_embedding, search_vector_store, store_vector
+    get_embedding, search_vector_store, store_vector,
+    get_embeddings, search_vector_store_many, store_vectors,
+    get_embedding_async, search_vector_store_async, store_vector_async,
+    partition_key,
 )
-
-SIMILARITY_THRESHOLD = 0.85
+from alerts.services import async_postgres_service as apg
+from alerts.services.metrics import DEDUP_SIMILARITY, counts_outcomes, timed
+from alerts.services.single_flight import single_flight
+from alerts.services.thresholds import dedup_thresholds
 
 def normalize_alert(raw_alert: dict) -> dict:
     return {
@@ -20,22 +27,8 @@ def normalize_alert(raw_alert: dict) -> dict:
         "log_data": raw_alert,
     }
 
-def process_alert(raw_alert: dict):
-    alert = normalize_alert(raw_alert)
-    incident_id = alert["incident_id"]
-
-    # Step 2 - Check exact duplicate (incident_id)
-    existing = fetch_alert_by_id(incident_id)
-    if existing:
-        insert_duplicate_alert(incident_id, alert)
-        return {
-            "status": "Duplicate",
-            "message": f"Incident {incident_id} already exists",
-            "incident_id": incident_id,
-        }
-
-    # Step 3 - Build embedding text
-    alert_text = " | ".join([
+def build_alert_text(alert: dict) -> str:
+    return " | ".join([
         str(alert.get("incident_id", "")),
         str(alert.get("observed_value", "")),
         str(alert.get("policy_name", "")),
@@ -46,30 +39,278 @@ def process_alert(raw_alert: dict):
         str(alert.get("summary", "")),
     ])
 
-    vector = get_embedding(alert_text)
-    if not vector:
-        insert_cleaned_alert(alert)
-        return {
-            "status": "Unique",
-            "message": "Stored (embedding failed)",
-            "incident_id": incident_id,
-        }
-
-    # Step 4 - Semantic duplicate check
-    match = search_vector_store(vector, limit=1)
-    if match and match.get("similarity", 0) >= SIMILARITY_THRESHOLD:
-        insert_duplicate_alert(match["incident_id"], alert)
-        return {
-            "status": "Duplicate alert detected (semantic match)",
-            "message": "An alert with similar content already exists.",
-            "incident_id": f"This alert matches existing incident ID: {match['incident_id']}",
-        }
-
-    # Step 5 - Store unique
-    insert_cleaned_alert(alert)
-    store_vector(vector, **alert)
+def _exact_duplicate_result(incident_id: str, decided_by: str = "incident_id") -> dict:
+    return {
+        "status": "Duplicate",
+        "message": f"Incident {incident_id} already exists",
+        "incident_id": incident_id,
+        "decided_by": decided_by,
+    }
+
+def _semantic_duplicate_result(original_incident_id: str) -> dict:
+    return {
+        "status": "Duplicate alert detected (semantic match)",
+        "message": "An alert with similar content already exists.",
+        "incident_id": f"This alert matches existing incident ID: {original_incident_id}",
+        "decided_by": "semantic",
+    }
+
+def _embedding_failed_result(incident_id: str) -> dict:
+    return {
+        "status": "Unique",
+        "message": "Stored (embedding failed)",
+        "incident_id": incident_id,
+        "decided_by": "embedding_failed",
+    }
+
+def _new_alert_result(incident_id: str) -> dict:
     return {
         "status": "New alert created",
         "message": "This is a new alert and has been stored successfully.",
         "incident_id": f"New incident created with ID: {incident_id}",
+        "decided_by": "new",
     }
+
+@counts_outcomes
+@timed("pipeline")
+def process_alert(raw_alert: dict):
+    alert = normalize_alert(raw_alert)
+    incident_id = alert["incident_id"]
+    fingerprint = compute_fingerprint(alert)
+
+    # Step 1 - Exact repeat seen recently by this process
+    original_id = recent_fingerprints.get(fingerprint)
+    if original_id:
+        insert_duplicate_alert(original_id, alert, fingerprint)
+        return _exact_duplicate_result(original_id, "fingerprint_cache")
+
+    # Step 2 - Check exact duplicate (incident_id or stored fingerprint)
+    exact = fetch_exact_match(incident_id, fingerprint)
+    if exact:
+        original_id, tier = exact
+        insert_duplicate_alert(original_id, alert, fingerprint)
+        recent_fingerprints.add(fingerprint, original_id)
+        return _exact_duplicate_result(original_id, tier)
+
+    # Step 3-5 - Embed, search and store once per embedding text; concurrent
+    # copies wait for that and are recorded against the same incident
+    alert_text = build_alert_text(alert)
+    (result, original_id), shared = single_flight.do(
+        alert_text, lambda: _resolve_semantic(alert, fingerprint, alert_text)
+    )
+    if not shared:
+        return result
+    insert_duplicate_alert(original_id, alert, fingerprint)
+    recent_fingerprints.add(fingerprint, original_id)
+    return _exact_duplicate_result(original_id, "single_flight")
+
+def _resolve_semantic(alert: dict, fingerprint: str, alert_text: str) -> tuple[dict, str]:
+    """Steps 3-5 of process_alert; returns (result, incident the alert was stored as or matched)."""
+    incident_id = alert["incident_id"]
+    vector = get_embedding(alert_text)
+    if not vector:
+        inserted = insert_cleaned_alert(alert, fingerprint)
+        recent_fingerprints.add(fingerprint, incident_id)
+        if not inserted:
+            return _exact_duplicate_result(incident_id), incident_id
+        return _embedding_failed_result(incident_id), incident_id
+
+    # Step 4 - Semantic duplicate check, within the alert's partition
+    partition = partition_key(alert)
+    match = search_vector_store(vector, limit=1, partition=partition)
+    if match:
+        DEDUP_SIMILARITY.observe(match.get("similarity", 0))
+    if match and match.get("similarity", 0) >= dedup_thresholds.threshold_for(alert, partition):
+        insert_duplicate_alert(match["incident_id"], alert, fingerprint)
+        recent_fingerprints.add(fingerprint, match["incident_id"])
+        return _semantic_duplicate_result(match["incident_id"]), match["incident_id"]
+
+    # Step 5 - Store unique; the incident_id may have been inserted
+    # concurrently since step 2, in which case the alert is now its duplicate
+    inserted = insert_cleaned_alert(alert, fingerprint, vector)
+    recent_fingerprints.add(fingerprint, incident_id)
+    if not inserted:
+        return _exact_duplicate_result(incident_id), incident_id
+    store_vector(vector, **alert)
+    return _new_alert_result(incident_id), incident_id
+
+@counts_outcomes
+@timed("pipeline")
+async def process_alert_async(raw_alert: dict):
+    """Same pipeline and response shape as process_alert, without blocking the event loop."""
+    alert = normalize_alert(raw_alert)
+    incident_id = alert["incident_id"]
+    fingerprint = compute_fingerprint(alert)
+
+    # Step 1 - Exact repeat seen recently by this process
+    original_id = recent_fingerprints.get(fingerprint)
+    if original_id:
+        await apg.insert_duplicate_alert(original_id, alert, fingerprint)
+        return _exact_duplicate_result(original_id, "fingerprint_cache")
+
+    # Step 2 - Check exact duplicate (incident_id or stored fingerprint)
+    exact = await apg.fetch_exact_match(incident_id, fingerprint)
+    if exact:
+        original_id, tier = exact
+        await apg.insert_duplicate_alert(original_id, alert, fingerprint)
+        recent_fingerprints.add(fingerprint, original_id)
+        return _exact_duplicate_result(original_id, tier)
+
+    # Step 3-5 - Single flight per embedding text, as in process_alert
+    alert_text = build_alert_text(alert)
+    (result, original_id), shared = await single_flight.do_async(
+        alert_text, lambda: _resolve_semantic_async(alert, fingerprint, alert_text)
+    )
+    if not shared:
+        return result
+    await apg.insert_duplicate_alert(original_id, alert, fingerprint)
+    recent_fingerprints.add(fingerprint, original_id)
+    return _exact_duplicate_result(original_id, "single_flight")
+
+async def _resolve_semantic_async(alert: dict, fingerprint: str, alert_text: str) -> tuple[dict, str]:
+    incident_id = alert["incident_id"]
+    vector = await get_embedding_async(alert_text)
+    if not vector:
+        inserted = await apg.insert_cleaned_alert(alert, fingerprint)
+        recent_fingerprints.add(fingerprint, incident_id)
+        if not inserted:
+            return _exact_duplicate_result(incident_id), incident_id
+        return _embedding_failed_result(incident_id), incident_id
+
+    # Step 4 - Semantic duplicate check, within the alert's partition
+    partition = partition_key(alert)
+    match = await search_vector_store_async(vector, limit=1, partition=partition)
+    if match:
+        DEDUP_SIMILARITY.observe(match.get("similarity", 0))
+    if match and match.get("similarity", 0) >= dedup_thresholds.threshold_for(alert, partition):
+        await apg.insert_duplicate_alert(match["incident_id"], alert, fingerprint)
+        recent_fingerprints.add(fingerprint, match["incident_id"])
+        return _semantic_duplicate_result(match["incident_id"]), match["incident_id"]
+
+    # Step 5 - Store unique (or duplicate of a concurrent insert, as above)
+    inserted = await apg.insert_cleaned_alert(alert, fingerprint, vector)
+    recent_fingerprints.add(fingerprint, incident_id)
+    if not inserted:
+        return _exact_duplicate_result(incident_id), incident_id
+    await store_vector_async(vector, **alert)
+    return _new_alert_result(incident_id), incident_id
+
+@counts_outcomes
+@timed("pipeline")
+def process_alerts_batch(raw_alerts: list[dict]) -> list[dict]:
+    """Deduplicate a batch of alerts with one embed call, one search round trip
+    and multi-row inserts. Alerts are resolved in input order, so a later alert
+    in the batch can be a duplicate of an earlier one. Results are returned in
+    input order with the same shape as process_alert."""
+    alerts = [normalize_alert(raw) for raw in raw_alerts]
+    fingerprints = [compute_fingerprint(alert) for alert in alerts]
+    results: list[dict | None] = [None] * len(alerts)
+    cleaned: list[tuple[dict, str]] = []
+    duplicates: list[tuple[str, dict, str]] = []
+
+    # Step 1/2 - Exact repeats: recent fingerprints, Postgres, earlier alerts in the batch
+    cached = {fp: recent_fingerprints.get(fp) for fp in set(fingerprints)}
+    existing, stored_fingerprints = fetch_exact_matches(
+        [a["incident_id"] for a in alerts],
+        [fp for fp, original_id in cached.items() if original_id is None],
+    )
+    seen_ids: set[str] = set()
+    batch_originals: dict[str, str] = {}  # fingerprint -> original incident_id
+    leaders: dict[str, int] = {}  # fingerprint -> index of the pending alert that carries it
+    followers: dict[int, list[int]] = {}  # leader index -> exact repeats later in the batch
+    pending: list[int] = []
+    for i, alert in enumerate(alerts):
+        incident_id, fingerprint = alert["incident_id"], fingerprints[i]
+        if fingerprint in leaders:
+            followers.setdefault(leaders[fingerprint], []).append(i)
+            continue
+
+        original_id, tier = batch_originals.get(fingerprint), "fingerprint_batch"
+        if original_id is None:
+            original_id, tier = cached[fingerprint], "fingerprint_cache"
+        if original_id is None and (incident_id in existing or incident_id in seen_ids):
+            original_id, tier = incident_id, "incident_id"
+        if original_id is None and fingerprint in stored_fingerprints:
+            original_id, tier = stored_fingerprints[fingerprint], "fingerprint_db"
+
+        if original_id is not None:
+            duplicates.append((original_id, alert, fingerprint))
+            batch_originals[fingerprint] = original_id
+            results[i] = _exact_duplicate_result(original_id, tier)
+        else:
+            seen_ids.add(incident_id)
+            leaders[fingerprint] = i
+            pending.append(i)
+
+    # Step 3 - Embed all remaining alerts in a single call
+    vectors = get_embeddings([build_alert_text(alerts[i]) for i in pending]) if pending else []
+    if pending and not vectors:
+        for i in pending:
+            cleaned.append((alerts[i], fingerprints[i]))
+            results[i] = _embedding_failed_result(alerts[i]["incident_id"])
+        originals = {i: alerts[i]["incident_id"] for i in pending}
+        return _write_batch(alerts, fingerprints, results, cleaned, duplicates, followers, originals, [])
+
+    # Step 4 - Semantic check against the store and against earlier new alerts in the batch
+    import numpy as np
+
+    partitions = [partition_key(alerts[i]) for i in pending]
+    store_matches = search_vector_store_many(vectors, limit=1, partitions=partitions)
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix = matrix / np.where(norms == 0, 1, norms)
+
+    new_rows: list[int] = []  # positions in `pending` accepted as new incidents
+    new_vectors = []
+    originals: dict[int, str] = {}  # alert index -> incident it was stored as or matched
+    for pos, i in enumerate(pending):
+        alert = alerts[i]
+        match = store_matches[pos]
+        best_id = match["incident_id"] if match else None
+        best_sim = match.get("similarity", 0) if match else 0.0
+
+        same_partition = [row for row in new_rows if partitions[row] == partitions[pos]]
+        if same_partition:
+            sims = matrix[same_partition] @ matrix[pos]
+            j = int(np.argmax(sims))
+            if float(sims[j]) > best_sim:
+                best_sim = float(sims[j])
+                best_id = alerts[pending[same_partition[j]]]["incident_id"]
+
+        if best_id is not None:
+            DEDUP_SIMILARITY.observe(best_sim)
+        if best_id is not None and best_sim >= dedup_thresholds.threshold_for(alert, partitions[pos]):
+            duplicates.append((best_id, alert, fingerprints[i]))
+            results[i] = _semantic_duplicate_result(best_id)
+            originals[i] = best_id
+            continue
+
+        # Step 5 - Store unique
+        new_rows.append(pos)
+        cleaned.append((alert, fingerprints[i]))
+        new_vectors.append((vectors[pos], alert["incident_id"], {k: v for k, v in alert.items() if k != "incident_id"}))
+        results[i] = _new_alert_result(alert["incident_id"])
+        originals[i] = alert["incident_id"]
+
+    return _write_batch(alerts, fingerprints, results, cleaned, duplicates, followers, originals, new_vectors)
+
+def _write_batch(alerts, fingerprints, results, cleaned, duplicates, followers, originals, new_vectors):
+    """Resolve in-batch exact repeats against their leader's outcome, then persist the batch."""
+    for leader, repeats in followers.items():
+        for i in repeats:
+            duplicates.append((originals[leader], alerts[i], fingerprints[i]))
+            results[i] = _exact_duplicate_result(originals[leader], "fingerprint_batch")
+
+    # New alerts whose incident_id was inserted concurrently were recorded as its duplicates
+    existing = insert_alert_batch(cleaned, duplicates, {incident_id: vector for vector, incident_id, _ in new_vectors})
+    if existing:
+        for i, alert in enumerate(alerts):
+            if alert["incident_id"] in existing and results[i]["decided_by"] in ("new", "embedding_failed"):
+                results[i] = _exact_duplicate_result(alert["incident_id"])
+        new_vectors = [item for item in new_vectors if item[1] not in existing]
+    store_vectors(new_vectors)
+    for original_id, _, fingerprint in duplicates:
+        recent_fingerprints.add(fingerprint, original_id)
+    for alert, fingerprint in cleaned:
+        recent_fingerprints.add(fingerprint, alert["incident_id"])
+    return results
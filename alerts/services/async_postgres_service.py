@@ -0,0 +1,116 @@
+import asyncio
+import json
+import os
+import re
+
+import asyncpg
+from dotenv import load_dotenv
+
+from alerts.services.metrics import timed
+from alerts.services.postgres_service import (
+    CLEANED_ALERT_WRITE, DUPLICATE_ALERT_WRITE, alert_write_params,
+)
+
+load_dotenv()
+
+_pool = None
+_pool_lock = asyncio.Lock()
+
+
+async def _init_connection(conn):
+    # Match psycopg2's Json adapter: dicts in, dicts out
+    for type_name in ("json", "jsonb"):
+        await conn.set_type_codec(
+            type_name, encoder=lambda v: json.dumps(v, default=str), decoder=json.loads, schema="pg_catalog"
+        )
+
+
+async def get_async_pool() -> asyncpg.Pool:
+    """Return the process-wide asyncpg pool (sized by the same POSTGRES_POOL_* env vars)."""
+    global _pool
+    if _pool is None:
+        async with _pool_lock:
+            if _pool is None:
+                _pool = await asyncpg.create_pool(
+                    database=os.getenv("POSTGRES_DB"),
+                    user=os.getenv("POSTGRES_USER"),
+                    password=os.getenv("POSTGRES_PASSWORD"),
+                    host=os.getenv("POSTGRES_HOST"),
+                    port=int(os.getenv("POSTGRES_PORT") or 5432),
+                    min_size=int(os.getenv("POSTGRES_POOL_MIN_SIZE", "1")),
+                    max_size=int(os.getenv("POSTGRES_POOL_MAX_SIZE", "10")),
+                    max_inactive_connection_lifetime=float(os.getenv("POSTGRES_POOL_MAX_IDLE", "300")),
+                    init=_init_connection,
+                )
+    return _pool
+
+
+async def close_async_pool() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+def _numbered(query: str) -> tuple[str, list[str]]:
+    """Rewrite a psycopg2 query with %(name)s parameters into asyncpg's $n form;
+    returns the query and the parameter names in $n order."""
+    names = []
+
+    def number(match):
+        if match.group(1) is None:
+            return "%"
+        if match.group(1) not in names:
+            names.append(match.group(1))
+        return f"${names.index(match.group(1)) + 1}"
+
+    return re.sub(r"%\((\w+)\)s|%%", number, query), names
+
+
+_CLEANED_ALERT_WRITE, _CLEANED_ALERT_NAMES = _numbered(CLEANED_ALERT_WRITE)
+_DUPLICATE_ALERT_WRITE, _DUPLICATE_ALERT_NAMES = _numbered(DUPLICATE_ALERT_WRITE)
+
+
+async def _write(query: str, names: list[str], params: dict):
+    pool = await get_async_pool()
+    async with pool.acquire() as conn:
+        return await conn.fetchval(query, *(params[name] for name in names))
+
+
+@timed("postgres_async")
+async def insert_cleaned_alert(alert: dict, fingerprint: str | None = None, vector: list[float] | None = None) -> bool:
+    """Async variant of postgres_service.insert_cleaned_alert."""
+    params = alert_write_params(alert["incident_id"], alert, fingerprint, vector, json_adapter=lambda v: v)
+    return await _write(_CLEANED_ALERT_WRITE, _CLEANED_ALERT_NAMES, params)
+
+
+@timed("postgres_async")
+async def insert_duplicate_alert(original_incident_id: str, alert: dict, fingerprint: str | None = None):
+    """Async variant of postgres_service.insert_duplicate_alert."""
+    params = alert_write_params(original_incident_id, alert, fingerprint, json_adapter=lambda v: v)
+    await _write(_DUPLICATE_ALERT_WRITE, _DUPLICATE_ALERT_NAMES, params)
+
+
+@timed("postgres_async")
+async def fetch_exact_match(incident_id: str, fingerprint: str) -> tuple[str, str] | None:
+    """Async variant of postgres_service.fetch_exact_match."""
+    pool = await get_async_pool()
+    row = await pool.fetchrow(
+        """
+        SELECT incident_id, tier FROM (
+            SELECT incident_id, 'incident_id' AS tier, 0 AS priority
+            FROM cleaned_alerts WHERE incident_id = $1
+            UNION ALL
+            (SELECT incident_id, 'fingerprint_db', 1
+             FROM cleaned_alerts WHERE fingerprint = $2 LIMIT 1)
+            UNION ALL
+            (SELECT incident_id, 'fingerprint_db', 2
+             FROM duplicate_alerts WHERE fingerprint = $2 LIMIT 1)
+        ) m
+        ORDER BY priority
+        LIMIT 1
+        """,
+        incident_id,
+        fingerprint,
+    )
+    return (row["incident_id"], row["tier"]) if row else None
@@ -0,0 +1,217 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the pool timeout."""
+
+
+class PgPool:
+    """Bounded, thread-safe psycopg2 connection pool.
+
+    Connections are handed out LIFO so the hottest ones stay warm, health
+    checked when they have been idle for a while, and recycled once they
+    exceed their maximum lifetime or idle time.
+    """
+
+    def __init__(
+        self,
+        connect,
+        min_size: int = 1,
+        max_size: int = 10,
+        timeout: float = 30.0,
+        max_lifetime: float = 1800.0,
+        max_idle: float = 300.0,
+        healthcheck_after: float = 30.0,
+    ):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self._connect = connect
+        self.min_size = max(0, min(min_size, max_size))
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.healthcheck_after = healthcheck_after
+
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._idle = deque()  # (conn, created_at, last_used)
+        self._created_at = {}  # id(conn) -> created_at for checked-out conns
+        self._closed = False
+
+        self._stats = {
+            "connections_created": 0,
+            "connections_recycled": 0,
+            "healthcheck_failures": 0,
+            "acquired": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "wait_time_total_ms": 0.0,
+        }
+
+    # ------------------------------------------------------------------ #
+    # Acquire / release
+    # ------------------------------------------------------------------ #
+    def acquire(self):
+        if self._closed:
+            raise PoolTimeout("Connection pool is closed")
+
+        start = time.monotonic()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats["waits"] += 1
+            if not self._slots.acquire(timeout=self.timeout):
+                with self._lock:
+                    self._stats["timeouts"] += 1
+                raise PoolTimeout(
+                    f"No Postgres connection available after {self.timeout}s "
+                    f"(max_size={self.max_size})"
+                )
+
+        try:
+            conn, created_at = self._checkout()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._created_at[id(conn)] = created_at
+            self._stats["acquired"] += 1
+            self._stats["wait_time_total_ms"] += (time.monotonic() - start) * 1000
+        return conn
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                entry = self._idle.pop() if self._idle else None
+
+            if entry is None:
+                conn = self._connect()
+                with self._lock:
+                    self._stats["connections_created"] += 1
+                return conn, time.monotonic()
+
+            conn, created_at, last_used = entry
+            now = time.monotonic()
+            if conn.closed or self._expired(created_at, last_used, now):
+                self._discard(conn, recycled=True)
+                continue
+            if now - last_used >= self.healthcheck_after and not self._healthy(conn):
+                with self._lock:
+                    self._stats["healthcheck_failures"] += 1
+                self._discard(conn)
+                continue
+            return conn, created_at
+
+    def release(self, conn, discard: bool = False) -> None:
+        with self._lock:
+            created_at = self._created_at.pop(id(conn), time.monotonic())
+
+        try:
+            now = time.monotonic()
+            if discard or self._closed or conn.closed:
+                self._discard(conn)
+                return
+            if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            if now - created_at >= self.max_lifetime:
+                self._discard(conn, recycled=True)
+                return
+            with self._lock:
+                self._idle.append((conn, created_at, now))
+        except Exception:
+            self._discard(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; commit on success, roll back on error."""
+        conn = self.acquire()
+        discard = False
+        try:
+            yield conn
+            conn.commit()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            discard = True
+            raise
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    # ------------------------------------------------------------------ #
+    # Maintenance
+    # ------------------------------------------------------------------ #
+    def warm_up(self) -> None:
+        """Open connections until min_size are idle."""
+        while True:
+            with self._lock:
+                if len(self._idle) >= self.min_size:
+                    return
+            conn = self._connect()
+            with self._lock:
+                self._stats["connections_created"] += 1
+                self._idle.append((conn, time.monotonic(), time.monotonic()))
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+        for conn, _, _ in idle:
+            self._discard(conn)
+
+    def stats(self) -> dict:
+        with self._lock:
+            in_use = len(self._created_at)
+            idle = len(self._idle)
+            stats = dict(self._stats)
+        acquired = stats["acquired"]
+        stats.update(
+            {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "in_use": in_use,
+                "idle": idle,
+                "open": in_use + idle,
+                "utilization": round(in_use / self.max_size, 4),
+                "avg_wait_ms": round(stats["wait_time_total_ms"] / acquired, 3) if acquired else 0.0,
+            }
+        )
+        stats["wait_time_total_ms"] = round(stats["wait_time_total_ms"], 3)
+        return stats
+
+    # ------------------------------------------------------------------ #
+    # Helpers
+    # ------------------------------------------------------------------ #
+    def _expired(self, created_at: float, last_used: float, now: float) -> bool:
+        return now - created_at >= self.max_lifetime or now - last_used >= self.max_idle
+
+    def _healthy(self, conn) -> bool:
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, conn, recycled: bool = False) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+        if recycled:
+            with self._lock:
+                self._stats["connections_recycled"] += 1
@@ -0,0 +1,158 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Ollama model used for every embedding
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "nomic-embed-text")
+# Bump when the model's vectors change without a new name (e.g. a re-pulled
+# tag); embeddings stored under another model or version need re-embedding
+EMBEDDING_MODEL_VERSION = os.getenv("EMBEDDING_MODEL_VERSION", "1")
+
+
+class EmbeddingCache:
+    """Content-addressed embedding cache.
+
+    Entries are keyed by sha256(model + version + text), so bumping
+    EMBEDDING_MODEL_VERSION misses every stored entry instead of serving the
+    old model's vectors. The in-memory tier is a bounded LRU with an optional
+    TTL; the optional on-disk tier is a SQLite file storing float32 blobs, so
+    embeddings survive restarts.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 0, path: str | None = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.path = path or None
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (vector, stored_at)
+        self._stats = {"hits": 0, "misses": 0, "disk_hits": 0, "evictions": 0, "expirations": 0, "puts": 0}
+        self._db = None
+        if self.path:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, stored_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def key(text: str, model: str, version: str) -> str:
+        return hashlib.sha256(f"{model}\0{version}\0{text}".encode("utf-8")).hexdigest()
+
+    def _expired(self, stored_at: float, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - stored_at > self.ttl_seconds
+
+    def get(self, text: str, model: str = EMBEDDING_MODEL) -> list[float] | None:
+        key = self.key(text, model, EMBEDDING_MODEL_VERSION)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                vector, stored_at = entry
+                if not self._expired(stored_at, now):
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return vector
+                del self._entries[key]
+                self._stats["expirations"] += 1
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT vector, stored_at FROM embeddings WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    if not self._expired(row[1], now):
+                        import numpy as np
+
+                        vector = np.frombuffer(row[0], dtype=np.float32).tolist()
+                        self._insert(key, vector, row[1])
+                        self._stats["hits"] += 1
+                        self._stats["disk_hits"] += 1
+                        return vector
+                    self._db.execute("DELETE FROM embeddings WHERE key = ?", (key,))
+                    self._db.commit()
+                    self._stats["expirations"] += 1
+
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, text: str, vector: list[float], model: str = EMBEDDING_MODEL) -> None:
+        if not vector:
+            return
+        key = self.key(text, model, EMBEDDING_MODEL_VERSION)
+        now = time.time()
+        with self._lock:
+            self._insert(key, vector, now)
+            self._stats["puts"] += 1
+            if self._db is not None:
+                import numpy as np
+
+                self._db.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, stored_at) VALUES (?, ?, ?)",
+                    (key, np.asarray(vector, dtype=np.float32).tobytes(), now),
+                )
+                self._db.commit()
+
+    def get_or_compute(self, text: str, compute, model: str = EMBEDDING_MODEL) -> list[float]:
+        """Return the cached vector for text, calling compute(text) on a miss."""
+        vector = self.get(text, model)
+        if vector is None:
+            vector = compute(text)
+            self.put(text, vector, model)
+        return vector
+
+    def _insert(self, key: str, vector: list[float], stored_at: float) -> None:
+        self._entries[key] = (vector, stored_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM embeddings")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["max_entries"] = self.max_entries
+        stats["ttl_seconds"] = self.ttl_seconds
+        stats["persistent"] = self._db is not None
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Process-wide cache configured from EMBEDDING_CACHE_* env vars."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache(
+                    max_entries=int(os.getenv("EMBEDDING_CACHE_SIZE", "10000")),
+                    ttl_seconds=float(os.getenv("EMBEDDING_CACHE_TTL", "0")),
+                    path=os.getenv("EMBEDDING_CACHE_PATH") or None,
+                )
+    return _cache
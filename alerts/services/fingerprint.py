@@ -0,0 +1,84 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Fields that identify *what* fired, as opposed to *which occurrence* fired.
+FINGERPRINT_FIELDS = [
+    "observed_value", "policy_name", "condition_name", "subject",
+    "display_name", "severity", "summary", "log_data",
+]
+
+# Keys that change on every occurrence and are stripped at any nesting depth.
+VOLATILE_KEYS = {
+    key.strip()
+    for key in os.getenv(
+        "FINGERPRINT_VOLATILE_KEYS",
+        "incident_id,timestamp,started_at,ended_at,created_at,updated_at,"
+        "event_time,observed_at,received_at,date,time",
+    ).split(",")
+    if key.strip()
+}
+
+
+def _strip_volatile(value):
+    if isinstance(value, dict):
+        return {k: _strip_volatile(v) for k, v in value.items() if k not in VOLATILE_KEYS}
+    if isinstance(value, list):
+        return [_strip_volatile(v) for v in value]
+    return value
+
+
+def compute_fingerprint(alert: dict) -> str:
+    """sha256 over the canonical JSON of the dedup-relevant fields of a normalized alert."""
+    payload = _strip_volatile({field: alert.get(field) for field in FINGERPRINT_FIELDS})
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class RecentFingerprints:
+    """Bounded LRU of fingerprint -> original incident_id seen by this process."""
+
+    def __init__(self, max_entries: int = 50000, ttl_seconds: float = 0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # fingerprint -> (incident_id, stored_at)
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, fingerprint: str) -> str | None:
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is not None:
+                incident_id, stored_at = entry
+                if self.ttl_seconds <= 0 or time.time() - stored_at <= self.ttl_seconds:
+                    self._entries.move_to_end(fingerprint)
+                    self._stats["hits"] += 1
+                    return incident_id
+                del self._entries[fingerprint]
+            self._stats["misses"] += 1
+            return None
+
+    def add(self, fingerprint: str, incident_id: str) -> None:
+        with self._lock:
+            self._entries[fingerprint] = (incident_id, time.time())
+            self._entries.move_to_end(fingerprint)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "size": len(self._entries), "max_entries": self.max_entries}
+
+
+recent_fingerprints = RecentFingerprints(
+    max_entries=int(os.getenv("FINGERPRINT_CACHE_SIZE", "50000")),
+    ttl_seconds=float(os.getenv("FINGERPRINT_CACHE_TTL", "0")),
+)
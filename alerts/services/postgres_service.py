@@ -1,12 +1,39 @@
 import psycopg2
-from psycopg2.extras import RealDictCursor, Json
+from psycopg2.extras import RealDictCursor, Json, execute_values
+import base64
+import json
 import os
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
+from alerts.services.db_pool import PgPool
+from alerts.services.embedding_cache import EMBEDDING_MODEL, EMBEDDING_MODEL_VERSION
+from alerts.services.metrics import timed
 
 load_dotenv()
 
+# Which duplicates keep a full duplicate_alerts row: "all" (every occurrence) or
+# "sampled" (only those selected by the DUPLICATE_SAMPLE_* policy below).
+# Every occurrence is counted in duplicate_alert_aggregates either way.
+DUPLICATE_PAYLOADS = os.getenv("DUPLICATE_PAYLOADS", "all").lower()
+# Sampled mode: keep the first N occurrences of an incident per day...
+DUPLICATE_SAMPLE_FIRST = int(os.getenv("DUPLICATE_SAMPLE_FIRST", "1"))
+# ...every Nth occurrence after that (0 = off)...
+DUPLICATE_SAMPLE_EVERY = int(os.getenv("DUPLICATE_SAMPLE_EVERY", "0"))
+# ...and any occurrence whose fingerprint is not stored yet, so exact-match
+# lookups still find every distinct variant
+DUPLICATE_SAMPLE_NEW_FINGERPRINTS = os.getenv("DUPLICATE_SAMPLE_NEW_FINGERPRINTS", "true").lower() in ("1", "true", "yes")
+# Recent occurrences kept inline in each aggregate row (shown by /alerts/grouped)
+DUPLICATE_RING_SIZE = int(os.getenv("DUPLICATE_RING_SIZE", "20"))
+
+_pool = None
+_pool_lock = threading.Lock()
+
 
 def get_pg_connection():
+    """Open a new, unpooled connection (used by the pool and one-off scripts)."""
     return psycopg2.connect(
         dbname=os.getenv("POSTGRES_DB"),
         user=os.getenv("POSTGRES_USER"),
@@ -16,155 +43,964 @@ def get_pg_connection():
     )
 
 
-def insert_cleaned_alert(alert: dict):
-    """Insert into cleaned_alerts (new schema)."""
-    conn = get_pg_connection()
-    cur = conn.cursor()
+def get_pool() -> PgPool:
+    """Return the process-wide connection pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = PgPool(
+                    get_pg_connection,
+                    min_size=int(os.getenv("POSTGRES_POOL_MIN_SIZE", "1")),
+                    max_size=int(os.getenv("POSTGRES_POOL_MAX_SIZE", "10")),
+                    timeout=float(os.getenv("POSTGRES_POOL_TIMEOUT", "30")),
+                    max_lifetime=float(os.getenv("POSTGRES_POOL_MAX_LIFETIME", "1800")),
+                    max_idle=float(os.getenv("POSTGRES_POOL_MAX_IDLE", "300")),
+                    healthcheck_after=float(os.getenv("POSTGRES_POOL_HEALTHCHECK_AFTER", "30")),
+                )
+    return _pool
+
+
+@contextmanager
+def pg_connection():
+    """Borrow a pooled connection for one transaction."""
+    with get_pool().connection() as conn:
+        yield conn
+
+
+@contextmanager
+def pg_cursor(cursor_factory=None):
+    """Borrow a pooled connection and yield a cursor; commits on success."""
+    with get_pool().connection() as conn:
+        cur = conn.cursor(cursor_factory=cursor_factory)
+        try:
+            yield cur
+        finally:
+            cur.close()
+
+
+def get_pool_stats() -> dict:
+    """Connection pool utilization for monitoring."""
+    return get_pool().stats()
+
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def ensure_schema():
+    """Add the columns/indexes the service relies on to the existing tables (idempotent)."""
+    with pg_cursor() as cur:
+        cur.execute("SELECT to_regclass('alert_counters') IS NULL")
+        counters_created = cur.fetchone()[0]
+        cur.execute(
+            """
+            ALTER TABLE cleaned_alerts ADD COLUMN IF NOT EXISTS fingerprint TEXT;
+            ALTER TABLE cleaned_alerts ADD COLUMN IF NOT EXISTS embedding BYTEA;
+            ALTER TABLE cleaned_alerts ADD COLUMN IF NOT EXISTS embedding_model TEXT;
+            ALTER TABLE cleaned_alerts ADD COLUMN IF NOT EXISTS embedding_dim INTEGER;
+            ALTER TABLE cleaned_alerts ADD COLUMN IF NOT EXISTS embedding_version TEXT;
+            ALTER TABLE chat_messages ADD COLUMN IF NOT EXISTS cache_key TEXT;
+            ALTER TABLE chat_messages ADD COLUMN IF NOT EXISTS cached BOOLEAN NOT NULL DEFAULT FALSE;
+            CREATE INDEX IF NOT EXISTS idx_chat_messages_cache_key ON chat_messages (cache_key);
+            ALTER TABLE duplicate_alerts ADD COLUMN IF NOT EXISTS fingerprint TEXT;
+            CREATE INDEX IF NOT EXISTS idx_cleaned_alerts_fingerprint ON cleaned_alerts (fingerprint);
+            CREATE INDEX IF NOT EXISTS idx_duplicate_alerts_fingerprint ON duplicate_alerts (fingerprint);
+            CREATE INDEX IF NOT EXISTS idx_cleaned_alerts_created_at_incident_id
+                ON cleaned_alerts (created_at DESC, incident_id DESC);
+            CREATE INDEX IF NOT EXISTS idx_duplicate_alerts_incident_id_created_at
+                ON duplicate_alerts (incident_id, created_at DESC);
+            CREATE TABLE IF NOT EXISTS alert_counters (
+                metric TEXT NOT NULL,
+                dimension TEXT NOT NULL DEFAULT '',
+                bucket TEXT NOT NULL,
+                count BIGINT NOT NULL DEFAULT 0,
+                PRIMARY KEY (metric, dimension, bucket)
+            );
+            CREATE TABLE IF NOT EXISTS alert_dedup_thresholds (
+                scope TEXT NOT NULL,
+                value TEXT NOT NULL,
+                threshold DOUBLE PRECISION NOT NULL,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                PRIMARY KEY (scope, value)
+            );
+            """
+        )
+        cur.execute("SELECT to_regclass('duplicate_alert_aggregates') IS NULL")
+        created = cur.fetchone()[0]
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS duplicate_alert_aggregates (
+                incident_id TEXT NOT NULL,
+                day DATE NOT NULL,
+                occurrence_count BIGINT NOT NULL,
+                first_seen TIMESTAMPTZ NOT NULL,
+                last_seen TIMESTAMPTZ NOT NULL,
+                samples JSONB NOT NULL DEFAULT '[]',
+                PRIMARY KEY (incident_id, day)
+            );
+            """
+        )
+        if created:
+            # One-off backfill from the duplicate rows written before the aggregate existed
+            cur.execute(
+                f"""
+                INSERT INTO duplicate_alert_aggregates
+                    (incident_id, day, occurrence_count, first_seen, last_seen, samples)
+                SELECT incident_id, (created_at AT TIME ZONE 'UTC')::date, COUNT(*), min(created_at), max(created_at),
+                       to_jsonb((array_agg(jsonb_build_object(
+                           'source', 'duplicate', 'severity', severity,
+                           'summary', summary, 'timestamp', created_at
+                       ) ORDER BY created_at DESC))[1:{DUPLICATE_RING_SIZE}])
+                FROM duplicate_alerts
+                GROUP BY 1, 2
+                ON CONFLICT (incident_id, day) DO NOTHING
+                """
+            )
+        if counters_created:
+            # Seed the running totals from the rows that predate the counter table
+            _rebuild_counters(cur)
+
+
+# ---------------------------------------------------------------------- #
+# Counters
+#
+# alert_counters holds running totals maintained in the same transaction as
+# the inserts: metric is "cleaned", "duplicate" or "severity" (cleaned rows
+# only, dimension = severity), bucket is COUNTER_TOTAL or a UTC day
+# (YYYY-MM-DD). Reads touch a handful of rows instead of scanning the tables.
+# Duplicates are rebuilt from duplicate_alert_aggregates, which counts every
+# occurrence even when its full row was not kept.
+# ---------------------------------------------------------------------- #
+COUNTER_TOTAL = "all"
+
+COUNTER_UPSERT = """
+    INSERT INTO alert_counters (metric, dimension, bucket, count) VALUES %s
+    ON CONFLICT (metric, dimension, bucket)
+    DO UPDATE SET count = alert_counters.count + EXCLUDED.count
+"""
+
+
+def counter_deltas(cleaned_severities: list, duplicates: int, day: str | None = None) -> list[tuple]:
+    """Counter rows (metric, dimension, bucket, delta) for a set of inserts.
+
+    Sorted so concurrent writers always lock counter rows in the same order.
+    """
+    day = day or datetime.now(timezone.utc).date().isoformat()
+    deltas = Counter()
+    for bucket in (COUNTER_TOTAL, day):
+        for severity in cleaned_severities:
+            deltas[("cleaned", "", bucket)] += 1
+            deltas[("severity", severity or "", bucket)] += 1
+        if duplicates:
+            deltas[("duplicate", "", bucket)] += duplicates
+    return sorted((*key, delta) for key, delta in deltas.items())
+
+
+def _bump_counters(cur, cleaned_severities: list, duplicates: int) -> None:
+    rows = counter_deltas(cleaned_severities, duplicates)
+    if rows:
+        execute_values(cur, COUNTER_UPSERT, rows)
+
+
+@timed("postgres")
+def reconcile_counters() -> dict:
+    """Rebuild alert_counters from the base tables; returns the new totals.
+
+    The counter table is locked for the duration, so inserts that race with
+    the rebuild wait and are applied on top of the recomputed values.
+    """
+    with pg_cursor() as cur:
+        _rebuild_counters(cur)
+    return get_alert_counts()
+
+
+def _rebuild_counters(cur) -> None:
     cur.execute(
         """
-        INSERT INTO cleaned_alerts (
-            incident_id, observed_value, policy_name, condition_name, subject,
-            display_name, severity, summary, log_data
-        ) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
+        LOCK TABLE alert_counters IN EXCLUSIVE MODE;
+        DELETE FROM alert_counters;
+        INSERT INTO alert_counters (metric, dimension, bucket, count)
+        SELECT metric, dimension, bucket, SUM(n) FROM (
+            SELECT 'cleaned' AS metric, '' AS dimension, (created_at AT TIME ZONE 'UTC')::date AS day, 1 AS n
+            FROM cleaned_alerts
+            UNION ALL
+            SELECT 'severity', COALESCE(severity, ''), (created_at AT TIME ZONE 'UTC')::date, 1 FROM cleaned_alerts
+            UNION ALL
+            SELECT 'duplicate', '', day, occurrence_count FROM duplicate_alert_aggregates
+        ) r
+        CROSS JOIN LATERAL (VALUES (%s), (to_char(day, 'YYYY-MM-DD'))) b (bucket)
+        GROUP BY metric, dimension, bucket;
         """,
-        (
-            alert["incident_id"],
-            alert.get("observed_value"),
-            alert.get("policy_name"),
-            alert.get("condition_name"),
-            alert.get("subject"),
-            alert.get("display_name"),
-            alert.get("severity"),
-            alert.get("summary"),
-            Json(alert.get("log_data")),  # always full payload
-        ),
+        (COUNTER_TOTAL,),
     )
-    conn.commit()
-    cur.close()
-    conn.close()
 
 
-def insert_duplicate_alert(original_incident_id: str, alert: dict):
-    """Insert into duplicate_alerts, referencing original cleaned incident."""
-    conn = get_pg_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT INTO duplicate_alerts (
-            incident_id, observed_value, policy_name, condition_name, subject,
-            display_name, severity, summary, log_data
-        ) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
-        """,
-        (
-            original_incident_id,
-            alert.get("observed_value"),
-            alert.get("policy_name"),
-            alert.get("condition_name"),
-            alert.get("subject"),
-            alert.get("display_name"),
-            alert.get("severity"),
-            alert.get("summary"),
-            Json(alert.get("log_data")),  # always full payload
-        ),
+ALERT_COLUMNS = """
+    incident_id, observed_value, policy_name, condition_name, subject,
+    display_name, severity, summary, log_data, fingerprint
+"""
+# A stored alert as returned to API and chat clients (no embedding columns)
+ALERT_DETAIL_COLUMNS = ALERT_COLUMNS + ", created_at"
+
+
+def _alert_row(incident_id: str, alert: dict, fingerprint: str | None = None) -> tuple:
+    return (
+        incident_id,
+        alert.get("observed_value"),
+        alert.get("policy_name"),
+        alert.get("condition_name"),
+        alert.get("subject"),
+        alert.get("display_name"),
+        alert.get("severity"),
+        alert.get("summary"),
+        Json(alert.get("log_data")),  # always full payload
+        fingerprint,
     )
-    conn.commit()
-    cur.close()
-    conn.close()
 
 
-def fetch_alerts():
-    """Fetch cleaned alerts (latest first)."""
-    conn = get_pg_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+# ---------------------------------------------------------------------- #
+# Stored embeddings
+#
+# Each cleaned incident keeps the embedding it was deduplicated with
+# (little-endian float32 bytes) with the model, dimension and model version
+# that produced it, so the vector store can be rebuilt from Postgres
+# (scripts/rebuild_vectors.py) without calling Ollama again. Rows without an
+# embedding (embedding failed) or from another EMBEDDING_MODEL /
+# EMBEDDING_MODEL_VERSION are the ones that need re-embedding.
+# ---------------------------------------------------------------------- #
+EMBEDDING_COLUMNS = "embedding, embedding_model, embedding_dim, embedding_version"
+
+STALE_EMBEDDING = """(
+    embedding IS NULL
+    OR embedding_model IS DISTINCT FROM %(embedding_model)s
+    OR embedding_version IS DISTINCT FROM %(embedding_version)s
+)"""
+
+
+def encode_embedding(vector: list[float]) -> bytes:
+    import numpy as np
+
+    return np.asarray(vector, dtype="<f4").tobytes()
+
+
+def decode_embedding(data: bytes) -> list[float]:
+    import numpy as np
+
+    return np.frombuffer(data, dtype="<f4").tolist()
+
+
+def embedding_values(vector: list[float] | None) -> tuple:
+    """Values for EMBEDDING_COLUMNS (all NULL when there is no vector)."""
+    if not vector:
+        return None, None, None, None
+    return encode_embedding(vector), EMBEDDING_MODEL, len(vector), EMBEDDING_MODEL_VERSION
+
+
+def _stale_params() -> dict:
+    return {"embedding_model": EMBEDDING_MODEL, "embedding_version": EMBEDDING_MODEL_VERSION}
+
+
+@timed("postgres")
+def count_embeddings(since: datetime | None = None) -> dict:
+    """Cleaned incidents (created at or after since, when given) by embedding state."""
+    with pg_cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT COUNT(*), COUNT(*) FILTER (WHERE {STALE_EMBEDDING})
+            FROM cleaned_alerts
+            WHERE %(since)s::timestamptz IS NULL OR created_at >= %(since)s::timestamptz
+            """,
+            {**_stale_params(), "since": since},
+        )
+        total, stale = cur.fetchone()
+    return {"total": total, "current": total - stale, "stale": stale}
+
+
+def iter_stored_embeddings(
+    since: datetime | None = None, stale: bool = False, itersize: int = 1000, until: datetime | None = None
+):
+    """Yield (alert, created_at, vector) for cleaned incidents created at or after
+    since (and before until), oldest first, through a server-side cursor. With stale=False only
+    rows with a current embedding are read; with stale=True only the rows that
+    need re-embedding (vector is then None)."""
+    condition = STALE_EMBEDDING if stale else f"NOT {STALE_EMBEDDING}"
+    with pg_connection() as conn:
+        with conn.cursor(name="stored_embeddings") as cur:
+            cur.itersize = itersize
+            cur.execute(
+                f"""
+                SELECT {ALERT_COLUMNS}, created_at, embedding
+                FROM cleaned_alerts
+                WHERE {condition}
+                  AND (%(since)s::timestamptz IS NULL OR created_at >= %(since)s::timestamptz)
+                  AND (%(until)s::timestamptz IS NULL OR created_at < %(until)s::timestamptz)
+                ORDER BY created_at, incident_id
+                """,
+                {**_stale_params(), "since": since, "until": until},
+            )
+            names = [name.strip() for name in ALERT_COLUMNS.split(",")]
+            for row in cur:
+                embedding = row[-1]
+                yield dict(zip(names, row[:-2])), row[-2], None if stale else decode_embedding(bytes(embedding))
+
+
+@timed("postgres")
+def update_embeddings(items: list[tuple[str, list[float]]]) -> None:
+    """Store new (incident_id, vector) embeddings under the current model and version."""
+    if not items:
+        return
+    with pg_cursor() as cur:
+        execute_values(
+            cur,
+            """
+            UPDATE cleaned_alerts c SET
+                embedding = v.embedding, embedding_model = v.embedding_model,
+                embedding_dim = v.embedding_dim, embedding_version = v.embedding_version
+            FROM (VALUES %s) v (incident_id, embedding, embedding_model, embedding_dim, embedding_version)
+            WHERE c.incident_id = v.incident_id
+            """,
+            [(incident_id, *embedding_values(vector)) for incident_id, vector in items],
+        )
+
+
+# ---------------------------------------------------------------------- #
+# Dedup thresholds
+#
+# alert_dedup_thresholds overrides the semantic similarity threshold for one
+# partition (scope "partition", value = a partition_key()) or one service
+# (scope "service", value = the alert's DEDUP_THRESHOLD_SERVICE_KEY field).
+# services/thresholds.py re-reads it periodically, so a change applies to
+# running workers without a redeploy.
+# ---------------------------------------------------------------------- #
+THRESHOLD_SCOPES = ("partition", "service")
+
+
+@timed("postgres")
+def fetch_thresholds() -> list[dict]:
+    """All threshold overrides as {scope, value, threshold, updated_at} dicts."""
+    with pg_cursor(RealDictCursor) as cur:
+        cur.execute("SELECT scope, value, threshold, updated_at FROM alert_dedup_thresholds ORDER BY scope, value")
+        return cur.fetchall()
+
+
+@timed("postgres")
+def set_threshold(scope: str, value: str, threshold: float) -> None:
+    """Create or replace the threshold override of one partition or service."""
+    if scope not in THRESHOLD_SCOPES:
+        raise ValueError(f"scope must be one of {THRESHOLD_SCOPES}, got {scope!r}")
+    if not 0.0 <= threshold <= 1.0:
+        raise ValueError(f"threshold must be between 0 and 1, got {threshold}")
+    with pg_cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO alert_dedup_thresholds (scope, value, threshold) VALUES (%s, %s, %s)
+            ON CONFLICT (scope, value) DO UPDATE SET threshold = EXCLUDED.threshold, updated_at = NOW()
+            """,
+            (scope, value, threshold),
+        )
+
+
+@timed("postgres")
+def delete_threshold(scope: str, value: str) -> bool:
+    """Remove an override (the default threshold applies again); False when there was none."""
+    with pg_cursor() as cur:
+        cur.execute("DELETE FROM alert_dedup_thresholds WHERE scope = %s AND value = %s", (scope, value))
+        return cur.rowcount > 0
+
+
+# ---------------------------------------------------------------------- #
+# Duplicate aggregates
+#
+# Every duplicate occurrence is upserted into duplicate_alert_aggregates
+# (one row per original incident and UTC day: occurrence_count, first/last
+# seen and a ring of the DUPLICATE_RING_SIZE most recent occurrences). A full
+# duplicate_alerts row is only written when keeps_payload() selects it.
+# ---------------------------------------------------------------------- #
+DUPLICATE_AGGREGATE_CONFLICT = f"""
+    ON CONFLICT (incident_id, day) DO UPDATE SET
+        occurrence_count = a.occurrence_count + EXCLUDED.occurrence_count,
+        first_seen = LEAST(a.first_seen, EXCLUDED.first_seen),
+        last_seen = GREATEST(a.last_seen, EXCLUDED.last_seen),
+        samples = (
+            SELECT jsonb_agg(s ORDER BY n) FROM (
+                SELECT s, n FROM jsonb_array_elements(EXCLUDED.samples || a.samples) WITH ORDINALITY e (s, n)
+                ORDER BY n
+                LIMIT {DUPLICATE_RING_SIZE}
+            ) ring
+        )
+    RETURNING incident_id, day, occurrence_count
+"""
+
+DUPLICATE_AGGREGATE_UPSERT = f"""
+    INSERT INTO duplicate_alert_aggregates AS a
+        (incident_id, day, occurrence_count, first_seen, last_seen, samples)
+    VALUES %s
+    {DUPLICATE_AGGREGATE_CONFLICT}
+"""
+
+
+def keeps_payload(occurrence: int) -> bool:
+    """Whether the occurrence-th duplicate of an incident's day keeps its full row
+    (the new-fingerprint rule is applied on top of this by the writers)."""
+    if DUPLICATE_PAYLOADS != "sampled":
+        return True
+    return occurrence <= DUPLICATE_SAMPLE_FIRST or (
+        DUPLICATE_SAMPLE_EVERY > 0 and occurrence % DUPLICATE_SAMPLE_EVERY == 0
+    )
+
+
+# SQL form of keeps_payload() plus the new-fingerprint rule, for the
+# single-statement writers below (agg is the upserted aggregate row)
+KEEPS_PAYLOAD_SQL = """
+    %(keep_all)s::bool
+    OR agg.occurrence_count <= %(sample_first)s::int
+    OR (%(sample_every)s::int > 0 AND agg.occurrence_count %% %(sample_every)s::int = 0)
+    OR (%(new_fingerprints)s::bool AND %(fingerprint)s::text IS NOT NULL
+        AND NOT EXISTS (SELECT 1 FROM cleaned_alerts WHERE fingerprint = %(fingerprint)s::text)
+        AND NOT EXISTS (SELECT 1 FROM duplicate_alerts WHERE fingerprint = %(fingerprint)s::text))
+"""
+
+
+def duplicate_sample(alert: dict, seen_at: datetime) -> dict:
+    """Ring entry for one occurrence, in the shape /alerts/grouped returns duplicates."""
+    return {
+        "source": "duplicate",
+        "severity": alert.get("severity"),
+        "summary": alert.get("summary"),
+        "timestamp": seen_at.isoformat(),
+    }
+
+
+def _stored_fingerprints(cur, fingerprints: set) -> set:
+    if not fingerprints:
+        return set()
     cur.execute(
         """
-        SELECT incident_id, observed_value, policy_name, condition_name,
-               subject, display_name, severity, summary, log_data, created_at
-        FROM cleaned_alerts
-        ORDER BY created_at DESC
-        """
+        SELECT fingerprint FROM cleaned_alerts WHERE fingerprint = ANY(%(fps)s)
+        UNION
+        SELECT fingerprint FROM duplicate_alerts WHERE fingerprint = ANY(%(fps)s)
+        """,
+        {"fps": list(fingerprints)},
     )
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    return rows
+    return {row[0] for row in cur.fetchall()}
 
 
-def fetch_grouped_alerts():
-    """Group cleaned + duplicates by incident_id for UI display."""
-    conn = get_pg_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-
-    cur.execute("""SELECT * FROM cleaned_alerts ORDER BY created_at DESC""")
-    cleaned = cur.fetchall()
-
-    cur.execute("""SELECT * FROM duplicate_alerts ORDER BY created_at DESC""")
-    duplicates = cur.fetchall()
-
-    cur.close()
-    conn.close()
-
-    grouped = {}
-    for c in cleaned:
-        grouped[c["incident_id"]] = [
-            {
-                "source": "cleaned",
-                "severity": c.get("severity"),
-                "summary": c.get("summary"),
-                "timestamp": c["created_at"].isoformat(),
-            }
-        ]
-    for d in duplicates:
-        inc_id = d["incident_id"]
-        grouped.setdefault(inc_id, []).append(
-            {
-                "source": "duplicate",
-                "severity": d.get("severity"),
-                "summary": d.get("summary"),
-                "timestamp": d["created_at"].isoformat(),
+def write_duplicates(cur, duplicates: list[tuple[str, dict, str | None, datetime]]) -> int:
+    """Record (original_incident_id, alert, fingerprint, seen_at) occurrences on cur.
+
+    Upserts the aggregates (sorted, so concurrent writers lock rows in the
+    same order) and inserts the full rows the sampling policy keeps; returns
+    the number of full rows written.
+    """
+    if not duplicates:
+        return 0
+    groups = {}
+    for pos, (incident_id, _, _, seen_at) in enumerate(duplicates):
+        groups.setdefault((incident_id, seen_at.astimezone(timezone.utc).date()), []).append(pos)
+
+    rows = []
+    for (incident_id, day), positions in sorted(groups.items()):
+        times = [duplicates[pos][3] for pos in positions]
+        # Newest first, matching the ring order
+        samples = [duplicate_sample(duplicates[pos][1], duplicates[pos][3]) for pos in reversed(positions)]
+        rows.append((incident_id, day, len(positions), min(times), max(times), Json(samples[:DUPLICATE_RING_SIZE])))
+    totals = {(row[0], row[1]): row[2] for row in execute_values(cur, DUPLICATE_AGGREGATE_UPSERT, rows, fetch=True)}
+
+    keep = [False] * len(duplicates)
+    for key, positions in groups.items():
+        first = totals[key] - len(positions) + 1
+        for n, pos in enumerate(positions):
+            keep[pos] = keeps_payload(first + n)
+    if DUPLICATE_SAMPLE_NEW_FINGERPRINTS:
+        kept_fps = {fp for (_, _, fp, _), kept in zip(duplicates, keep) if kept}
+        candidates = {fp for _, _, fp, _ in duplicates if fp} - kept_fps
+        new = candidates - _stored_fingerprints(cur, candidates)
+        for pos, (_, _, fp, _) in enumerate(duplicates):
+            if fp in new and not keep[pos]:
+                keep[pos] = True
+                new.discard(fp)  # one row per new variant is enough
+
+    kept = [(*_alert_row(i, a, fp), seen_at) for (i, a, fp, seen_at), k in zip(duplicates, keep) if k]
+    if kept:
+        execute_values(cur, f"INSERT INTO duplicate_alerts ({ALERT_COLUMNS}, created_at) VALUES %s", kept)
+    return len(kept)
+
+
+# ---------------------------------------------------------------------- #
+# Single-statement writes
+#
+# One alert is written with one statement built from data-modifying CTEs:
+# the cleaned insert (ON CONFLICT DO NOTHING), the duplicate fallback
+# (aggregate upsert + sampled full row) and the counter bumps. The statement
+# is atomic, takes one round trip, and an incident_id inserted concurrently
+# by another request turns this one into a duplicate instead of an error.
+# Parameters come from alert_write_params(); async_postgres_service runs the
+# same statements through asyncpg.
+# ---------------------------------------------------------------------- #
+_VALUE_NAMES = [
+    "observed_value", "policy_name", "condition_name", "subject",
+    "display_name", "severity", "summary", "log_data", "fingerprint",
+]
+
+
+def _duplicate_ctes(when: str) -> str:
+    values = ", ".join(f"%({name})s" for name in _VALUE_NAMES)
+    return f"""
+    agg AS (
+        INSERT INTO duplicate_alert_aggregates AS a
+            (incident_id, day, occurrence_count, first_seen, last_seen, samples)
+        SELECT %(original_id)s::text, %(day)s::date, 1, %(seen_at)s::timestamptz, %(seen_at)s::timestamptz,
+               %(sample)s::jsonb
+        WHERE {when}
+        {DUPLICATE_AGGREGATE_CONFLICT}
+    ),
+    dup AS (
+        INSERT INTO duplicate_alerts ({ALERT_COLUMNS}, created_at)
+        SELECT agg.incident_id, {values}, %(seen_at)s::timestamptz FROM agg
+        WHERE {KEEPS_PAYLOAD_SQL}
+    )"""
+
+
+def _counters_cte(when: str) -> str:
+    return f"""
+    counters AS (
+        INSERT INTO alert_counters (metric, dimension, bucket, count)
+        SELECT metric, dimension, bucket, count
+        FROM unnest(%(counter_metrics)s::text[], %(counter_dimensions)s::text[], %(counter_buckets)s::text[],
+                    %(counter_counts)s::bigint[], %(counter_cleaned)s::bool[]) c (metric, dimension, bucket, count, cleaned)
+        WHERE {when}
+        ORDER BY metric, dimension, bucket
+        ON CONFLICT (metric, dimension, bucket)
+        DO UPDATE SET count = alert_counters.count + EXCLUDED.count
+    )"""
+
+
+# Returns one row (inserted): false when the incident_id already existed and
+# the alert was recorded as its duplicate
+CLEANED_ALERT_WRITE = f"""
+    WITH ins AS (
+        INSERT INTO cleaned_alerts ({ALERT_COLUMNS}, {EMBEDDING_COLUMNS})
+        VALUES (%(original_id)s, {", ".join(f"%({name})s" for name in _VALUE_NAMES)},
+                %(embedding)s::bytea, %(embedding_model)s::text, %(embedding_dim)s::int, %(embedding_version)s::text)
+        ON CONFLICT (incident_id) DO NOTHING
+        RETURNING incident_id
+    ),
+    {_duplicate_ctes("NOT EXISTS (SELECT 1 FROM ins)")},
+    {_counters_cte("c.cleaned = EXISTS (SELECT 1 FROM ins)")}
+    SELECT EXISTS (SELECT 1 FROM ins) AS inserted
+"""
+
+# Returns one row (occurrence_count) for the recorded duplicate
+DUPLICATE_ALERT_WRITE = f"""
+    WITH {_duplicate_ctes("TRUE").strip()},
+    {_counters_cte("NOT c.cleaned")}
+    SELECT occurrence_count FROM agg
+"""
+
+
+def alert_write_params(
+    original_id: str, alert: dict, fingerprint: str | None, vector: list[float] | None = None, json_adapter=Json
+) -> dict:
+    """Parameters of CLEANED_ALERT_WRITE / DUPLICATE_ALERT_WRITE (original_id is
+    the alert's own incident_id for the cleaned write, which also stores vector)."""
+    seen_at = datetime.now(timezone.utc)
+    counters = [(*row, False) for row in counter_deltas([], 1)]
+    counters += [(*row, True) for row in counter_deltas([alert.get("severity")], 0)]
+    metrics, dimensions, buckets, counts, cleaned = (list(column) for column in zip(*counters))
+    embedding, embedding_model, embedding_dim, embedding_version = embedding_values(vector)
+    return {
+        **{name: alert.get(name) for name in _VALUE_NAMES},
+        "log_data": json_adapter(alert.get("log_data")),  # always full payload
+        "fingerprint": fingerprint,
+        "original_id": original_id,
+        "day": seen_at.date(),
+        "seen_at": seen_at,
+        "sample": json_adapter([duplicate_sample(alert, seen_at)]),
+        "keep_all": DUPLICATE_PAYLOADS != "sampled",
+        "sample_first": DUPLICATE_SAMPLE_FIRST,
+        "sample_every": DUPLICATE_SAMPLE_EVERY,
+        "new_fingerprints": DUPLICATE_SAMPLE_NEW_FINGERPRINTS,
+        "counter_metrics": metrics,
+        "counter_dimensions": dimensions,
+        "counter_buckets": buckets,
+        "counter_counts": counts,
+        "counter_cleaned": cleaned,
+        "embedding": embedding,
+        "embedding_model": embedding_model,
+        "embedding_dim": embedding_dim,
+        "embedding_version": embedding_version,
+    }
+
+
+@timed("postgres")
+def insert_cleaned_alert(alert: dict, fingerprint: str | None = None, vector: list[float] | None = None) -> bool:
+    """Insert into cleaned_alerts (with its embedding, when given) in one atomic round trip.
+
+    Returns False when the incident_id already exists; the alert has then been
+    recorded as a duplicate of that incident instead.
+    """
+    with pg_cursor() as cur:
+        cur.execute(CLEANED_ALERT_WRITE, alert_write_params(alert["incident_id"], alert, fingerprint, vector))
+        return cur.fetchone()[0]
+
+
+@timed("postgres")
+def insert_duplicate_alert(original_incident_id: str, alert: dict, fingerprint: str | None = None):
+    """Record a duplicate of the original cleaned incident (aggregate, plus the
+    full duplicate_alerts row when the sampling policy keeps it) in one round trip."""
+    with pg_cursor() as cur:
+        cur.execute(DUPLICATE_ALERT_WRITE, alert_write_params(original_incident_id, alert, fingerprint))
+
+
+@timed("postgres")
+def insert_alert_batch(
+    cleaned: list[tuple[dict, str | None]],
+    duplicates: list[tuple[str, dict, str | None]],
+    vectors: dict[str, list[float]] | None = None,
+) -> set[str]:
+    """Multi-row insert of new (alert, fingerprint) rows and
+    (original_incident_id, alert, fingerprint) duplicates in one transaction.
+    vectors maps new incident_ids to the embeddings stored with them.
+
+    Returns the incident_ids of new alerts that already existed (inserted
+    concurrently); those are recorded as duplicates of the existing incident.
+    """
+    existing = set()
+    with pg_cursor() as cur:
+        if cleaned:
+            inserted = {
+                row[0] for row in execute_values(
+                    cur,
+                    f"INSERT INTO cleaned_alerts ({ALERT_COLUMNS}, {EMBEDDING_COLUMNS}) VALUES %s "
+                    "ON CONFLICT (incident_id) DO NOTHING RETURNING incident_id",
+                    [
+                        (*_alert_row(a["incident_id"], a, fp), *embedding_values((vectors or {}).get(a["incident_id"])))
+                        for a, fp in cleaned
+                    ],
+                    fetch=True,
+                )
             }
+            existing = {a["incident_id"] for a, _ in cleaned} - inserted
+            if existing:
+                duplicates = duplicates + [(a["incident_id"], a, fp) for a, fp in cleaned if a["incident_id"] in existing]
+                cleaned = [(a, fp) for a, fp in cleaned if a["incident_id"] in inserted]
+        seen_at = datetime.now(timezone.utc)
+        write_duplicates(cur, [(original_id, a, fp, seen_at) for original_id, a, fp in duplicates])
+        _bump_counters(cur, [a.get("severity") for a, _ in cleaned], len(duplicates))
+    return existing
+
+
+@timed("postgres")
+def fetch_exact_match(incident_id: str, fingerprint: str) -> tuple[str, str] | None:
+    """Look up an exact repeat in one round trip.
+
+    Returns (original_incident_id, tier) where tier is "incident_id" when the
+    incident already exists, or "fingerprint_db" when a stored alert has the
+    same fingerprint; None when neither matches.
+    """
+    with pg_cursor() as cur:
+        cur.execute(
+            """
+            SELECT incident_id, tier FROM (
+                SELECT incident_id, 'incident_id' AS tier, 0 AS priority
+                FROM cleaned_alerts WHERE incident_id = %(incident_id)s
+                UNION ALL
+                (SELECT incident_id, 'fingerprint_db', 1
+                 FROM cleaned_alerts WHERE fingerprint = %(fingerprint)s LIMIT 1)
+                UNION ALL
+                (SELECT incident_id, 'fingerprint_db', 2
+                 FROM duplicate_alerts WHERE fingerprint = %(fingerprint)s LIMIT 1)
+            ) m
+            ORDER BY priority
+            LIMIT 1
+            """,
+            {"incident_id": incident_id, "fingerprint": fingerprint},
         )
-    return grouped
+        row = cur.fetchone()
+    return (row[0], row[1]) if row else None
 
 
-def get_alert_counts():
-    """Counts for dashboard/metrics."""
-    conn = get_pg_connection()
-    cur = conn.cursor()
+@timed("postgres")
+def fetch_exact_matches(incident_ids: list[str], fingerprints: list[str]) -> tuple[set[str], dict[str, str]]:
+    """Batch variant of fetch_exact_match.
 
-    # Count cleaned
-    cur.execute("SELECT COUNT(*) FROM cleaned_alerts")
-    cleaned_count = cur.fetchone()[0]
+    Returns the incident_ids already in cleaned_alerts and a
+    fingerprint -> original incident_id map for stored fingerprints.
+    """
+    if not incident_ids and not fingerprints:
+        return set(), {}
+    with pg_cursor() as cur:
+        cur.execute(
+            "SELECT incident_id FROM cleaned_alerts WHERE incident_id = ANY(%s)",
+            (list(incident_ids),),
+        )
+        existing = {row[0] for row in cur.fetchall()}
+        cur.execute(
+            """
+            SELECT DISTINCT ON (fingerprint) fingerprint, incident_id FROM (
+                SELECT fingerprint, incident_id, 0 AS priority
+                FROM cleaned_alerts WHERE fingerprint = ANY(%(fps)s)
+                UNION ALL
+                SELECT fingerprint, incident_id, 1
+                FROM duplicate_alerts WHERE fingerprint = ANY(%(fps)s)
+            ) m
+            ORDER BY fingerprint, priority
+            """,
+            {"fps": list(fingerprints)},
+        )
+        by_fingerprint = {row[0]: row[1] for row in cur.fetchall()}
+    return existing, by_fingerprint
+
+
+def encode_cursor(values: list) -> str:
+    """Opaque, URL-safe token for a keyset position."""
+    raw = json.dumps([v.isoformat() if hasattr(v, "isoformat") else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, size: int) -> list:
+    """Inverse of encode_cursor; raises ValueError for malformed tokens."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    return values
+
+
+@timed("postgres")
+def fetch_alerts(
+    limit: int = 100,
+    cursor: str | None = None,
+    severity: str | None = None,
+    policy_name: str | None = None,
+    since=None,
+    until=None,
+    include_payload: bool = True,
+):
+    """Fetch one page of cleaned alerts (latest first) using keyset pagination
+    over (created_at, incident_id). Returns (rows, next_cursor); next_cursor is
+    None on the last page."""
+    conditions, params = [], []
+    if cursor:
+        conditions.append("(created_at, incident_id) < (%s, %s)")
+        params.extend(decode_cursor(cursor, 2))
+    if severity:
+        conditions.append("severity = %s")
+        params.append(severity)
+    if policy_name:
+        conditions.append("policy_name = %s")
+        params.append(policy_name)
+    if since:
+        conditions.append("created_at >= %s")
+        params.append(since)
+    if until:
+        conditions.append("created_at < %s")
+        params.append(until)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    payload = ", log_data" if include_payload else ""
+
+    with pg_cursor(RealDictCursor) as cur:
+        cur.execute(
+            f"""
+            SELECT incident_id, observed_value, policy_name, condition_name,
+                   subject, display_name, severity, summary{payload}, created_at
+            FROM cleaned_alerts
+            {where}
+            ORDER BY created_at DESC, incident_id DESC
+            LIMIT %s
+            """,
+            (*params, limit + 1),
+        )
+        rows = cur.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1]["created_at"], rows[-1]["incident_id"]])
+    return rows, next_cursor
+
+
+def iter_grouped_alerts(
+    limit: int | None = None,
+    cursor: str | None = None,
+    max_duplicates: int | None = None,
+    itersize: int = 500,
+):
+    """Yield (incident_id, created_at, entries_json, duplicate_count, first_seen, last_seen)
+    per cleaned incident, latest first. Grouping is done in Postgres from
+    duplicate_alert_aggregates and rows are read through a server-side cursor,
+    so memory stays flat regardless of table size. entries_json is the JSON
+    text of the group's entries (cleaned first, then up to max_duplicates of
+    the recent occurrences kept in the aggregates, newest first);
+    duplicate_count, first_seen and last_seen cover every occurrence."""
+    conditions, params = [], {"max_duplicates": max_duplicates}
+    if cursor:
+        created_at, incident_id = decode_cursor(cursor, 2)
+        conditions.append("(c.created_at, c.incident_id) < (%(created_at)s, %(incident_id)s)")
+        params.update(created_at=created_at, incident_id=incident_id)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    page = ""
+    if limit is not None:
+        page = "LIMIT %(limit)s"
+        params["limit"] = limit
+
+    with pg_connection() as conn:
+        with conn.cursor(name="grouped_alerts") as cur:
+            cur.itersize = itersize
+            cur.execute(
+                f"""
+                SELECT c.incident_id, c.created_at, g.entries::text, agg.total, agg.first_seen, agg.last_seen
+                FROM cleaned_alerts c
+                CROSS JOIN LATERAL (
+                    SELECT jsonb_agg(e ORDER BY ord, day DESC, n) AS entries FROM (
+                        SELECT 0 AS ord, NULL::date AS day, 0::bigint AS n, jsonb_build_object(
+                            'source', 'cleaned', 'severity', c.severity,
+                            'summary', c.summary, 'timestamp', c.created_at
+                        ) AS e
+                        UNION ALL
+                        (SELECT 1, a.day, s.n, s.e
+                        FROM duplicate_alert_aggregates a
+                        CROSS JOIN LATERAL jsonb_array_elements(a.samples) WITH ORDINALITY s (e, n)
+                        WHERE a.incident_id = c.incident_id
+                        ORDER BY a.day DESC, s.n
+                        LIMIT %(max_duplicates)s)
+                    ) x
+                ) g
+                CROSS JOIN LATERAL (
+                    SELECT COALESCE(SUM(occurrence_count), 0)::bigint AS total,
+                           min(first_seen) AS first_seen, max(last_seen) AS last_seen
+                    FROM duplicate_alert_aggregates a WHERE a.incident_id = c.incident_id
+                ) agg
+                {where}
+                ORDER BY c.created_at DESC, c.incident_id DESC
+                {page}
+                """,
+                params,
+            )
+            for row in cur:
+                yield row
+
+
+def _json_time(value) -> str:
+    return json.dumps(value.isoformat() if value else None)
+
+
+def stream_grouped_alerts(
+    fmt: str = "json",
+    limit: int | None = None,
+    cursor: str | None = None,
+    max_duplicates: int | None = None,
+):
+    """Stream grouped alerts as text chunks.
 
-    # Count duplicates
-    cur.execute("SELECT COUNT(*) FROM duplicate_alerts")
-    duplicate_count = cur.fetchone()[0]
+    fmt="json" produces the legacy {incident_id: [entries]} object.
+    fmt="ndjson" produces one {"incident_id", "duplicate_count", "first_seen",
+    "last_seen", "entries"} line per group and, when more groups remain, a final {"next_cursor"} line.
+    """
+    fetch_limit = limit + 1 if limit is not None else None
+    rows = iter_grouped_alerts(limit=fetch_limit, cursor=cursor, max_duplicates=max_duplicates)
 
-    # Severity breakdown from cleaned only
-    cur.execute("SELECT severity, COUNT(*) FROM cleaned_alerts GROUP BY severity")
-    severity = {row[0]: row[1] for row in cur.fetchall()}
+    if fmt == "ndjson":
+        last = None
+        for n, (incident_id, created_at, entries, total, first_seen, last_seen) in enumerate(rows):
+            if limit is not None and n == limit:
+                yield json.dumps({"next_cursor": encode_cursor([last[1], last[0]])}) + "\n"
+                break
+            yield (
+                f'{{"incident_id": {json.dumps(incident_id)}, "duplicate_count": {total}, '
+                f'"first_seen": {_json_time(first_seen)}, "last_seen": {_json_time(last_seen)}, '
+                f'"entries": {entries}}}\n'
+            )
+            last = (incident_id, created_at)
+        return
 
-    cur.close()
-    conn.close()
+    yield "{"
+    for n, (incident_id, _, entries, *_) in enumerate(rows):
+        if limit is not None and n == limit:
+            break
+        yield ("," if n else "") + json.dumps(incident_id) + ":" + entries
+    yield "}"
+
+
+@timed("postgres")
+def fetch_grouped_alerts(max_duplicates: int | None = None):
+    """Group cleaned + duplicates by incident_id for UI display."""
+    return {
+        incident_id: json.loads(entries)
+        for incident_id, _, entries, *_ in iter_grouped_alerts(max_duplicates=max_duplicates)
+    }
+
+
+@timed("postgres")
+def get_alert_counts():
+    """Counts for dashboard/metrics."""
+    with pg_cursor() as cur:
+        cur.execute(
+            "SELECT metric, dimension, count FROM alert_counters WHERE bucket = %s",
+            (COUNTER_TOTAL,),
+        )
+        rows = cur.fetchall()
+
+    totals = {"cleaned": 0, "duplicate": 0}
+    severity = {}
+    for metric, dimension, count in rows:
+        if metric == "severity":
+            # Severity breakdown from cleaned only
+            if count:
+                severity[dimension or None] = count
+        else:
+            totals[metric] = count
 
     return {
-        "totalAlertsCount": cleaned_count,
-        "totalDuplicateCount": duplicate_count,
+        "totalAlertsCount": totals["cleaned"],
+        "totalDuplicateCount": totals["duplicate"],
         "severityCounts": severity,
     }
 
 
+@timed("postgres")
+def get_daily_counts(days: int = 30):
+    """Per-day cleaned/duplicate counts and severity breakdown, newest day first."""
+    with pg_cursor() as cur:
+        cur.execute(
+            """
+            SELECT bucket, metric, dimension, count FROM alert_counters
+            WHERE bucket <> %s AND bucket >= %s
+            ORDER BY bucket DESC
+            """,
+            (COUNTER_TOTAL, (datetime.now(timezone.utc).date() - timedelta(days=days - 1)).isoformat()),
+        )
+        rows = cur.fetchall()
+
+    daily = {}
+    for bucket, metric, dimension, count in rows:
+        day = daily.setdefault(bucket, {"date": bucket, "alerts": 0, "duplicates": 0, "severityCounts": {}})
+        if metric == "cleaned":
+            day["alerts"] = count
+        elif metric == "duplicate":
+            day["duplicates"] = count
+        elif count:
+            day["severityCounts"][dimension or None] = count
+    return list(daily.values())
+
+
+@timed("postgres")
 def fetch_alert_by_id(incident_id: str):
     """Fetch a single cleaned alert by ID."""
-    conn = get_pg_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    cur.execute("SELECT * FROM cleaned_alerts WHERE incident_id=%s", (incident_id,))
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
-    return row
+    with pg_cursor(RealDictCursor) as cur:
+        cur.execute(f"SELECT {ALERT_DETAIL_COLUMNS} FROM cleaned_alerts WHERE incident_id=%s", (incident_id,))
+        return cur.fetchone()
 
 
+@timed("postgres")
 def get_alert_summary():
     """Fetch summary for dashboard/health endpoint."""
     counts = get_alert_counts()
@@ -178,3 +1014,32 @@ def get_alert_summary():
         "reduction": reduction,
         "severityCounts": counts["severityCounts"],
     }
+
+
+@timed("postgres")
+def fetch_duplicate_summary(incident_id: str, top: int = 3) -> dict:
+    """Occurrence count, first/last seen and the most common summaries of an incident's duplicates
+    (counts from the aggregates; variants from the full rows that were kept)."""
+    with pg_cursor() as cur:
+        cur.execute(
+            """
+            SELECT COALESCE(SUM(occurrence_count), 0)::bigint, min(first_seen), max(last_seen)
+            FROM duplicate_alert_aggregates WHERE incident_id = %s
+            """,
+            (incident_id,),
+        )
+        count, first_seen, last_seen = cur.fetchone()
+        variants = []
+        if count and top > 0:
+            cur.execute(
+                """
+                SELECT summary, count(*) AS n FROM duplicate_alerts
+                WHERE incident_id = %s
+                GROUP BY summary
+                ORDER BY n DESC, summary
+                LIMIT %s
+                """,
+                (incident_id, top),
+            )
+            variants = cur.fetchall()
+    return {"count": count, "first_seen": first_seen, "last_seen": last_seen, "variants": variants}
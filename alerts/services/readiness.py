@@ -0,0 +1,80 @@
+import asyncio
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Seconds between retries of warm-up steps that failed (e.g. Weaviate still starting)
+STARTUP_RETRY_INTERVAL = float(os.getenv("STARTUP_RETRY_INTERVAL", "5"))
+# Hold startup until every step succeeded instead of warming up in the background
+STARTUP_WAIT_FOR_BACKENDS = os.getenv("STARTUP_WAIT_FOR_BACKENDS", "false").lower() in ("1", "true", "yes")
+
+
+class Readiness:
+    """Status of each named warm-up step; ready once all of them have succeeded."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started_at = time.monotonic()
+        self._ready_at = None
+        self._checks = {}  # name -> {"status", "attempts", "error", "duration_ms"}
+
+    def register(self, name: str) -> None:
+        with self._lock:
+            self._checks.setdefault(name, {"status": "pending", "attempts": 0, "error": None, "duration_ms": None})
+
+    def mark(self, name: str, ok: bool, duration_ms: float, error: str | None = None) -> None:
+        with self._lock:
+            check = self._checks[name]
+            check["attempts"] += 1
+            check["status"] = "ready" if ok else "failed"
+            check["error"] = error
+            check["duration_ms"] = round(duration_ms, 1)
+            if self._ready_at is None and all(c["status"] == "ready" for c in self._checks.values()):
+                self._ready_at = time.monotonic()
+
+    def is_step_ready(self, name: str) -> bool:
+        with self._lock:
+            return self._checks[name]["status"] == "ready"
+
+    def is_ready(self) -> bool:
+        with self._lock:
+            return bool(self._checks) and all(c["status"] == "ready" for c in self._checks.values())
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            checks = {name: dict(check) for name, check in self._checks.items()}
+            ready_at = self._ready_at
+        ready = bool(checks) and all(c["status"] == "ready" for c in checks.values())
+        return {
+            "ready": ready,
+            "uptime_seconds": round(time.monotonic() - self._started_at, 1),
+            "ready_after_seconds": round(ready_at - self._started_at, 1) if ready_at else None,
+            "checks": checks,
+        }
+
+
+readiness = Readiness()
+
+
+async def warm_up(steps: list[tuple[str, callable]], retry_interval: float = STARTUP_RETRY_INTERVAL) -> None:
+    """Run each blocking (name, step) off the event loop, retrying failed ones until all succeed."""
+    for name, _ in steps:
+        readiness.register(name)
+    while True:
+        for name, step in steps:
+            if readiness.is_step_ready(name):
+                continue
+            start = time.perf_counter()
+            try:
+                await asyncio.to_thread(step)
+                readiness.mark(name, True, (time.perf_counter() - start) * 1000)
+            except Exception as e:
+                print(f"Startup step {name} failed: {e}")
+                readiness.mark(name, False, (time.perf_counter() - start) * 1000, str(e))
+        if readiness.is_ready():
+            return
+        await asyncio.sleep(retry_interval)
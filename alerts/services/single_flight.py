@@ -0,0 +1,118 @@
+import asyncio
+import os
+import threading
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+class _Flight:
+    """One in-flight call: the leader fills `result` (or `failed`) and wakes the followers."""
+
+    __slots__ = ("event", "future", "result", "failed", "followers")
+
+    def __init__(self, future: asyncio.Future | None = None):
+        self.event = threading.Event()
+        self.future = future
+        self.result = None
+        self.failed = False
+        self.followers = 0
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one execution.
+
+    The first caller for a key (the leader) runs the work; callers arriving
+    while it is in flight wait and receive the leader's result with
+    shared=True. If the leader raises, its followers retry as a new flight.
+    Threads (do) and coroutines (do_async) are tracked separately.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._flights = {}  # key -> _Flight (threads)
+        self._async_flights = {}  # key -> _Flight (event loop)
+        self._stats = {"leaders": 0, "coalesced": 0, "fallbacks": 0, "max_followers": 0}
+
+    def _join(self, flights: dict, key: str, make_future=None) -> tuple[_Flight, bool]:
+        with self._lock:
+            flight = flights.get(key)
+            if flight is None:
+                flight = flights[key] = _Flight(make_future() if make_future else None)
+                self._stats["leaders"] += 1
+                return flight, True
+            flight.followers += 1
+            return flight, False
+
+    def _finish(self, flights: dict, key: str, flight: _Flight) -> None:
+        with self._lock:
+            flights.pop(key, None)
+            self._stats["max_followers"] = max(self._stats["max_followers"], flight.followers)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def do(self, key: str, fn):
+        """Run fn() once for all concurrent callers of key; returns (result, shared)."""
+        if not self.enabled:
+            return fn(), False
+        flight, leader = self._join(self._flights, key)
+        if leader:
+            try:
+                flight.result = fn()
+                return flight.result, False
+            except BaseException:
+                flight.failed = True
+                raise
+            finally:
+                self._finish(self._flights, key, flight)
+                flight.event.set()
+
+        flight.event.wait()
+        if flight.failed:
+            self._count("fallbacks")
+            return self.do(key, fn)
+        self._count("coalesced")
+        return flight.result, True
+
+    async def do_async(self, key: str, fn):
+        """Await fn() once for all concurrent callers of key; returns (result, shared)."""
+        if not self.enabled:
+            return await fn(), False
+        flight, leader = self._join(self._async_flights, key, asyncio.get_running_loop().create_future)
+        if leader:
+            try:
+                flight.result = await fn()
+                return flight.result, False
+            except BaseException:
+                flight.failed = True
+                raise
+            finally:
+                self._finish(self._async_flights, key, flight)
+                flight.future.set_result(None)
+
+        # shield: a cancelled follower must not cancel the leader's future
+        await asyncio.shield(flight.future)
+        if flight.failed:
+            self._count("fallbacks")
+            return await self.do_async(key, fn)
+        self._count("coalesced")
+        return flight.result, True
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            in_flight = len(self._flights) + len(self._async_flights)
+        calls = stats["leaders"] + stats["coalesced"]
+        stats["in_flight"] = in_flight
+        stats["coalesced_ratio"] = round(stats["coalesced"] / calls, 4) if calls else 0.0
+        stats["enabled"] = self.enabled
+        return stats
+
+
+single_flight = SingleFlight(enabled=SINGLE_FLIGHT_ENABLED)
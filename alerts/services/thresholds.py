@@ -0,0 +1,112 @@
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from alerts.services.postgres_service import fetch_thresholds
+
+load_dotenv()
+
+# Best-match cosine similarity at or above which an alert is a semantic duplicate
+SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.85"))
+# Alert field that "service" threshold overrides are matched against
+THRESHOLD_SERVICE_KEY = os.getenv("DEDUP_THRESHOLD_SERVICE_KEY", "policy_name")
+# How often running workers re-read the overrides from Postgres (seconds, 0 = only on reload())
+THRESHOLD_REFRESH_SECONDS = float(os.getenv("DEDUP_THRESHOLD_REFRESH_SECONDS", "30"))
+
+
+class DedupThresholds:
+    """Similarity threshold per alert: its partition's override, else its service's, else the default.
+
+    Overrides are rows of alert_dedup_thresholds, returned by the load callable.
+    They are re-read in a background thread once refresh_seconds have passed,
+    so lookups never wait on Postgres. A failed reload keeps the previous overrides.
+    """
+
+    def __init__(
+        self,
+        load,
+        default: float = SIMILARITY_THRESHOLD,
+        service_key: str = THRESHOLD_SERVICE_KEY,
+        refresh_seconds: float = THRESHOLD_REFRESH_SECONDS,
+    ):
+        self._load = load
+        self.default = default
+        self.service_key = service_key
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._overrides = {}  # (scope, value) -> threshold
+        self._loaded_at = None
+        self._refreshing = False
+        self._stats = {"reloads": 0, "reload_failures": 0}
+
+    def service_of(self, alert: dict) -> str:
+        value = alert.get(self.service_key)
+        return "" if value is None else str(value)
+
+    def threshold_for(self, alert: dict, partition: str | None = None) -> float:
+        self._maybe_refresh()
+        overrides = self._overrides
+        if partition is not None and ("partition", partition) in overrides:
+            return overrides[("partition", partition)]
+        return overrides.get(("service", self.service_of(alert)), self.default)
+
+    def load(self) -> dict:
+        """Re-read the overrides now, raising when they cannot be read; returns snapshot()."""
+        try:
+            overrides = {(row["scope"], row["value"]): float(row["threshold"]) for row in self._load()}
+        except Exception:
+            with self._lock:
+                self._stats["reload_failures"] += 1
+                self._loaded_at = time.monotonic()
+                self._refreshing = False
+            raise
+        with self._lock:
+            self._overrides = overrides
+            self._stats["reloads"] += 1
+            self._loaded_at = time.monotonic()
+            self._refreshing = False
+        return self.snapshot()
+
+    def reload(self) -> dict:
+        """load(), keeping the previous overrides when Postgres is unavailable."""
+        try:
+            return self.load()
+        except Exception as e:
+            print(f"Error loading dedup thresholds: {e}")
+            return self.snapshot()
+
+    def _maybe_refresh(self) -> None:
+        with self._lock:
+            if self._refreshing or (
+                self._loaded_at is not None
+                and (self.refresh_seconds <= 0 or time.monotonic() - self._loaded_at < self.refresh_seconds)
+            ):
+                return
+            self._refreshing = True
+        threading.Thread(target=self.reload, name="dedup-thresholds", daemon=True).start()
+
+    def snapshot(self) -> dict:
+        """The default and every override in effect, for GET /dedup/thresholds."""
+        with self._lock:
+            overrides = sorted(self._overrides.items())
+        return {
+            "default": self.default,
+            "service_key": self.service_key,
+            "overrides": [
+                {"scope": scope, "value": value, "threshold": threshold} for (scope, value), threshold in overrides
+            ],
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["overrides"] = len(self._overrides)
+            stats["age_seconds"] = round(time.monotonic() - self._loaded_at, 1) if self._loaded_at is not None else -1
+        stats["default"] = self.default
+        stats["refresh_seconds"] = self.refresh_seconds
+        return stats
+
+
+dedup_thresholds = DedupThresholds(fetch_thresholds)
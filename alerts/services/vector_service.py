@@ -1,33 +1,150 @@
-import ollama
-from alerts.services.weaviate_client import weaviate_store, weaviate_search
+from datetime import datetime, timezone
+import asyncio
+from alerts.services.embedding_cache import EMBEDDING_MODEL, get_embedding_cache
+from alerts.services.metrics import record_error, timed, track
+from alerts.services.weaviate_client import DEDUP_WINDOW_HOURS, partition_key, weaviate_expire, window_cutoff
+from alerts.services.write_behind import WRITE_BEHIND
+import os
+from dotenv import load_dotenv
 
+load_dotenv()
+
+# Seconds between background expiry runs (only when DEDUP_WINDOW_HOURS is set)
+VECTOR_EXPIRY_INTERVAL = float(os.getenv("VECTOR_EXPIRY_INTERVAL", "300"))
+
+# "weaviate" (default) or "numpy" for the in-process index that writes through to Weaviate
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "weaviate").lower()
+
+if VECTOR_BACKEND == "numpy":
+    from alerts.services.numpy_index import (
+        index_store, index_search, index_store_many, index_search_many
+    )
+elif WRITE_BEHIND:
+    from alerts.services.write_behind import (
+        buffered_store as index_store,
+        buffered_search as index_search,
+        buffered_store_many as index_store_many,
+        buffered_search_many as index_search_many,
+    )
+else:
+    from alerts.services.weaviate_client import (
+        weaviate_store as index_store,
+        weaviate_search as index_search,
+        weaviate_store_many as index_store_many,
+        weaviate_search_many as index_search_many,
+    )
+
+# Time whichever backend is active under stable stage names
+index_store = timed("vector", "index_store")(index_store)
+index_search = timed("vector", "index_search")(index_search)
+index_store_many = timed("vector", "index_store_many")(index_store_many)
+index_search_many = timed("vector", "index_search_many")(index_search_many)
+
+@timed("vector")
 def get_embedding(text: str) -> list[float]:
+    """Embedding for text, served from the embedding cache when possible."""
+    return get_embedding_cache().get_or_compute(text, _embed)
+
+def _flatten(vec) -> list[float]:
+    flat = []
+    for item in vec:
+        if isinstance(item, list):
+            flat.extend(float(x) for x in item)
+        else:
+            flat.append(float(item))
+    return flat
+
+@timed("ollama", "embed")
+def _embed(text: str) -> list[float]:
+    import ollama
+
     try:
-        response = ollama.embed(model="nomic-embed-text", input=text)
-        vec = response.get("embeddings", [])
-        if not vec:
-            return []
-        flat = []
-        for item in vec:
-            if isinstance(item, list):
-                flat.extend(float(x) for x in item)
-            else:
-                flat.append(float(item))
-        return flat
+        response = ollama.embed(model=EMBEDDING_MODEL, input=text)
+        return _flatten(response.get("embeddings", []))
     except Exception as e:
         print(f"Error getting embedding: {e}")
+        record_error("ollama", "embed")
         return []
 
+_async_ollama = None
+
+def _async_client():
+    global _async_ollama
+    if _async_ollama is None:
+        import ollama
+        _async_ollama = ollama.AsyncClient()
+    return _async_ollama
+
+@timed("vector")
+async def get_embedding_async(text: str) -> list[float]:
+    """Non-blocking get_embedding using the async Ollama client."""
+    cache = get_embedding_cache()
+    vector = cache.get(text)
+    if vector is not None:
+        return vector
+    vector = await _embed_async(text)
+    cache.put(text, vector)
+    return vector
+
+@timed("ollama", "embed_async")
+async def _embed_async(text: str) -> list[float]:
+    try:
+        response = await _async_client().embed(model=EMBEDDING_MODEL, input=text)
+        return _flatten(response.get("embeddings", []))
+    except Exception as e:
+        print(f"Error getting embedding: {e}")
+        record_error("ollama", "embed_async")
+        return []
+
+@timed("vector")
+def get_embeddings(texts: list[str]) -> list[list[float]]:
+    """Embed a batch of texts; cache misses go to Ollama in a single call (returns [] on failure)."""
+    if not texts:
+        return []
+    cache = get_embedding_cache()
+    vectors = [cache.get(text) for text in texts]
+    missing = [i for i, vec in enumerate(vectors) if vec is None]
+    if not missing:
+        return vectors
+    import ollama
+
+    with track("ollama", "embed_batch"):
+        try:
+            response = ollama.embed(model=EMBEDDING_MODEL, input=[texts[i] for i in missing])
+            vecs = response.get("embeddings", [])
+            if len(vecs) != len(missing):
+                print(f"Error getting embeddings: expected {len(missing)}, got {len(vecs)}")
+                record_error("ollama", "embed_batch")
+                return []
+        except Exception as e:
+            print(f"Error getting embeddings: {e}")
+            record_error("ollama", "embed_batch")
+            return []
+    for i, vec in zip(missing, vecs):
+        vectors[i] = [float(x) for x in vec]
+        cache.put(texts[i], vectors[i])
+    return vectors
+
 def store_vector(vector: list[float], **fields) -> None:
     """Thin wrapper so callers can pass the same keyword args as weaviate_store."""
     try:
-        weaviate_store(vector, **fields)
+        index_store(vector, **fields)
     except Exception as e:
         print(f"Error storing vector: {e}")
 
-def search_vector_store(vector: list[float], limit: int = 1) -> dict | None:
+def store_vectors(objects: list[tuple[list[float], str, dict]]) -> None:
+    """Batch variant of store_vector taking (vector, incident_id, fields) tuples."""
+    if not objects:
+        return
+    try:
+        index_store_many(objects)
+    except Exception as e:
+        print(f"Error storing vectors: {e}")
+
+def search_vector_store(vector: list[float], limit: int = 1, partition: str | None = None) -> dict | None:
+    """Top match for vector (only within `partition` when given), or None."""
     try:
-        matches = weaviate_search(vector, limit=limit)
+        matches = index_search(vector, limit=limit, partition=partition)
         if matches:
             match = matches[0]
             if "similarity" not in match:
@@ -35,4 +152,88 @@ def search_vector_store(vector: list[float], limit: int = 1) -> dict | None:
             return match
     except Exception as e:
         print(f"Error searching vector store: {e}")
-    return None
\ No newline at end of file
+    return None
+
+def search_vector_store_many(
+    vectors: list[list[float]], limit: int = 1, partitions: list[str | None] | None = None
+) -> list[dict | None]:
+    """Top match (or None) for each vector, searched in one round trip."""
+    try:
+        results = index_search_many(vectors, limit=limit, partitions=partitions)
+    except Exception as e:
+        print(f"Error searching vector store: {e}")
+        return [None] * len(vectors)
+    best = []
+    for matches in results:
+        if matches:
+            match = matches[0]
+            if "similarity" not in match:
+                match["similarity"] = 0.9
+            best.append(match)
+        else:
+            best.append(None)
+    return best
+
+async def search_vector_store_async(vector: list[float], limit: int = 1, partition: str | None = None) -> dict | None:
+    """search_vector_store without blocking the event loop (in-process index runs inline)."""
+    if VECTOR_BACKEND == "numpy":
+        return search_vector_store(vector, limit=limit, partition=partition)
+    return await asyncio.to_thread(search_vector_store, vector, limit, partition)
+
+async def store_vector_async(vector: list[float], **fields) -> None:
+    """store_vector off the event loop (the Weaviate client is synchronous)."""
+    await asyncio.to_thread(lambda: store_vector(vector, **fields))
+
+
+def warm_vector_index() -> int:
+    """Load the in-process index from Weaviate when VECTOR_BACKEND=numpy; returns rows loaded."""
+    if VECTOR_BACKEND != "numpy":
+        return 0
+    from alerts.services.numpy_index import load_index_from_weaviate
+    return load_index_from_weaviate()
+
+
+def warm_embedding_model() -> int:
+    """Embed a probe text so Ollama has the model loaded before the first alert; returns its dimension."""
+    vector = _embed("warm-up")
+    if not vector:
+        raise RuntimeError("Embedding model returned no vector")
+    return len(vector)
+
+
+_expiry_stats = {"runs": 0, "failures": 0, "expired_store": 0, "expired_index": 0, "last_run": None, "last_error": None}
+
+
+@timed("vector")
+def expire_vectors() -> int:
+    """Remove vectors older than the dedup window from the vector store (and the
+    in-process index) so the searched set stays bounded; returns the number deleted."""
+    cutoff = window_cutoff()
+    if cutoff is None:
+        return 0
+    if VECTOR_BACKEND == "numpy":
+        from alerts.services.numpy_index import expire_index
+        _expiry_stats["expired_index"] += expire_index(cutoff)
+    expired = weaviate_expire(cutoff)
+    _expiry_stats["expired_store"] += expired
+    return expired
+
+
+async def run_vector_expiry(interval: float = VECTOR_EXPIRY_INTERVAL) -> None:
+    """Background loop calling expire_vectors every interval seconds."""
+    while True:
+        try:
+            await asyncio.to_thread(expire_vectors)
+            _expiry_stats["last_error"] = None
+        except Exception as e:
+            print(f"Error expiring vectors: {e}")
+            _expiry_stats["failures"] += 1
+            _expiry_stats["last_error"] = str(e)
+        _expiry_stats["runs"] += 1
+        _expiry_stats["last_run"] = datetime.now(timezone.utc).isoformat()
+        await asyncio.sleep(interval)
+
+
+def get_vector_expiry_stats() -> dict:
+    """Dedup window settings and expiry counters."""
+    return {**_expiry_stats, "window_hours": DEDUP_WINDOW_HOURS, "interval": VECTOR_EXPIRY_INTERVAL}
@@ -1,6 +1,77 @@
-import weaviate
+import json
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
 
-client = weaviate.Client(url="http://localhost:8080")
+from dotenv import load_dotenv
+
+load_dotenv()
+
+WEAVIATE_URL = os.getenv("WEAVIATE_URL", "http://localhost:8080")
+# Only incidents stored within the last DEDUP_WINDOW_HOURS are dedup candidates (0 = no limit)
+DEDUP_WINDOW_HOURS = float(os.getenv("DEDUP_WINDOW_HOURS", "0"))
+# Date property the window is applied to
+TIME_PROPERTY = "created_at"
+# Alert fields that bound the dedup search: an alert is only compared with
+# incidents sharing all of these values (empty = search everything)
+PARTITION_KEYS = [k.strip() for k in os.getenv("DEDUP_PARTITION_KEYS", "").split(",") if k.strip()]
+# Filterable property holding the partition key of each stored incident
+PARTITION_PROPERTY = "partition"
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Process-wide Weaviate client, created (and the weaviate package imported) on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import weaviate
+                _client = weaviate.Client(url=WEAVIATE_URL)
+    return _client
+
+SEARCH_PROPERTIES = [
+    "incident_id", "observed_value", "policy_name", "condition_name",
+    "subject", "display_name", "severity", "summary", "log_data", "created_at", "partition"
+]
+
+def partition_key(alert: dict) -> str | None:
+    """Partition of an alert (JSON of its PARTITION_KEYS values), or None when partitioning is off."""
+    if not PARTITION_KEYS:
+        return None
+    return json.dumps([alert.get(key) for key in PARTITION_KEYS], default=str)
+
+def window_cutoff() -> datetime | None:
+    """Oldest created_at still inside the dedup window, or None when the window is off."""
+    if DEDUP_WINDOW_HOURS <= 0:
+        return None
+    return datetime.now(timezone.utc) - timedelta(hours=DEDUP_WINDOW_HOURS)
+
+def _time_filter(operator: str, cutoff: datetime) -> dict:
+    return {"path": [TIME_PROPERTY], "operator": operator, "valueDate": cutoff.isoformat()}
+
+def _partition_filter(partition: str) -> dict:
+    return {"path": [PARTITION_PROPERTY], "operator": "Equal", "valueString": partition}
+
+def _near_vector_query(vector, limit, partition=None):
+    query = get_client().query.get("Incident", SEARCH_PROPERTIES).with_near_vector(
+        {"vector": vector}
+    ).with_limit(limit).with_additional(["distance"])
+    cutoff = window_cutoff()
+    filters = [_time_filter("GreaterThanEqual", cutoff)] if cutoff else []
+    if partition is not None:
+        filters.append(_partition_filter(partition))
+    if len(filters) > 1:
+        return query.with_where({"operator": "And", "operands": filters})
+    return query.with_where(filters[0]) if filters else query
+
+# Whole-value tokenization so Equal matches the exact key, indexed for pre-filtering
+PARTITION_SCHEMA = {
+    "name": PARTITION_PROPERTY, "dataType": ["string"], "tokenization": "field", "indexFilterable": True,
+}
 
 def create_schema():
     schema = {
@@ -16,32 +87,104 @@ def create_schema():
             {"name": "severity", "dataType": ["string"]},
             {"name": "summary", "dataType": ["string"]},
             {"name": "log_data", "dataType": ["string"]},
+            {"name": TIME_PROPERTY, "dataType": ["date"]},
+            PARTITION_SCHEMA,
         ]
     }
-    existing = client.schema.get().get("classes", [])
-    if not any(c.get("class") == "Incident" for c in existing):
+    client = get_client()
+    existing = next((c for c in client.schema.get().get("classes", []) if c.get("class") == "Incident"), None)
+    if existing is None:
         client.schema.create_class(schema)
+        return
+    # Objects stored before a property existed have no value for it: they fall
+    # outside the dedup window / every partition until they are re-imported
+    names = {p.get("name") for p in existing.get("properties", [])}
+    for prop in ({"name": TIME_PROPERTY, "dataType": ["date"]}, PARTITION_SCHEMA):
+        if prop["name"] not in names:
+            client.schema.property.create("Incident", prop)
 
-def weaviate_store(vector, incident_id, **fields):
+def weaviate_uuid(incident_id):
+    """Deterministic object id, so re-importing an incident overwrites instead of duplicating."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"alerts/Incident/{incident_id}"))
+
+def _object_props(incident_id, fields) -> dict:
     props = {**fields, "incident_id": incident_id}
     props["log_data"] = str(props.get("log_data")) if props.get("log_data") else None
-    client.data_object.create(data_object=props, class_name="Incident", vector=vector)
+    props.setdefault(TIME_PROPERTY, datetime.now(timezone.utc).isoformat())
+    props.setdefault(PARTITION_PROPERTY, partition_key(fields))
+    return props
 
-def weaviate_search(vector, limit=1):
-    if not vector:
-        return []
-    result = client.query.get("Incident", [
-        "incident_id", "observed_value", "policy_name", "condition_name",
-        "subject", "display_name", "severity", "summary", "log_data"
-    ]).with_near_vector({"vector": vector}).with_limit(limit).with_additional(["distance"]).do()
-    matches = result.get("data", {}).get("Get", {}).get("Incident", [])
+def weaviate_store(vector, incident_id, **fields):
+    props = _object_props(incident_id, fields)
+    get_client().data_object.create(data_object=props, class_name="Incident", vector=vector)
+
+def weaviate_store_many(objects, uuids=None):
+    """Store several (vector, incident_id, fields) tuples with one batch import.
+    Pass uuids (one per object) to make re-imports overwrite instead of duplicate."""
+    uuids = uuids or [None] * len(objects)
+    with get_client().batch as batch:
+        for (vector, incident_id, fields), object_uuid in zip(objects, uuids):
+            props = _object_props(incident_id, fields)
+            batch.add_data_object(data_object=props, class_name="Incident", vector=vector, uuid=object_uuid)
+
+def _with_similarity(matches):
     for m in matches:
         distance = m.get("_additional", {}).get("distance", 1.0)
         m["similarity"] = max(0.0, 1 - distance)
     return matches
 
+def weaviate_search(vector, limit=1, partition=None):
+    """Nearest incidents to vector, only within `partition` when one is given."""
+    if not vector:
+        return []
+    result = _near_vector_query(vector, limit, partition).do()
+    return _with_similarity(result.get("data", {}).get("Get", {}).get("Incident", []))
+
+def weaviate_search_many(vectors, limit=1, partitions=None):
+    """Run one near-vector search per vector in a single GraphQL request
+    (each within its entry of `partitions`, when given)."""
+    if not vectors:
+        return []
+    client = get_client()
+    partitions = partitions or [None] * len(vectors)
+    queries = [
+        _near_vector_query(vector, limit, partition).with_alias(f"q{i}")
+        for i, (vector, partition) in enumerate(zip(vectors, partitions))
+    ]
+    result = client.query.multi_get(queries).do()
+    data = result.get("data", {}).get("Get", {})
+    return [_with_similarity(data.get(f"q{i}") or []) for i in range(len(vectors))]
+
+def weaviate_iter_objects(batch_size=500):
+    """Yield (vector, properties) for every stored Incident using cursor pagination."""
+    after = None
+    while True:
+        page = get_client().data_object.get(
+            class_name="Incident", with_vector=True, limit=batch_size, after=after
+        )
+        objects = (page or {}).get("objects", [])
+        if not objects:
+            return
+        for obj in objects:
+            yield obj.get("vector") or [], obj.get("properties", {})
+        after = objects[-1]["id"]
+
+def weaviate_expire(cutoff: datetime) -> int:
+    """Delete Incidents created before cutoff; returns the number deleted.
+    Postgres keeps every incident, so nothing is lost but the vector."""
+    deleted = 0
+    while True:
+        result = get_client().batch.delete_objects(
+            class_name="Incident", where=_time_filter("LessThan", cutoff)
+        )
+        # A single call deletes at most the server's query limit; repeat until none are left
+        successful = (result or {}).get("results", {}).get("successful", 0)
+        if not successful:
+            return deleted
+        deleted += successful
+
 def delete_all_weaviate_data():
     try:
-        client.schema.delete_class("Incident")
+        get_client().schema.delete_class("Incident")
     except Exception as e:
         print(f"Error deleting schema: {e}")
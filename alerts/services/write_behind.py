@@ -0,0 +1,232 @@
+import atexit
+import os
+import threading
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+from alerts.services.weaviate_client import (
+    PARTITION_PROPERTY, SEARCH_PROPERTIES, TIME_PROPERTY, partition_key, weaviate_search, weaviate_search_many,
+    weaviate_store_many
+)
+
+load_dotenv()
+
+# Buffer Weaviate writes and flush them in batches instead of one request per incident
+WRITE_BEHIND = os.getenv("VECTOR_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+
+
+class WriteBehindBuffer:
+    """Collects vector-store writes and flushes them in batches off the request path.
+
+    Objects are handed to flush(objects) once max_batch are pending or every
+    interval seconds, whichever comes first, from a background thread. Until
+    a flush succeeds the buffered vectors stay searchable through
+    search_many, so near-identical alerts in one flush window still dedup.
+    A failed flush puts its objects back at the front of the queue.
+
+    At most max_pending vectors are held: a writer that goes over the cap
+    flushes synchronously itself, and if the store still refuses the writes
+    the oldest unflushed vectors are dropped (their embeddings are in
+    Postgres, so rebuild_vectors restores them).
+    """
+
+    def __init__(self, flush, max_batch: int = 100, interval: float = 0.5, max_pending: int = 10000):
+        self._flush = flush
+        self.max_batch = max(1, max_batch)
+        self.interval = interval
+        self.max_pending = max(self.max_batch, max_pending)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending = []  # (object, normalized vector, props)
+        self._inflight = []
+        self._thread = None
+        self._closed = False
+        self._stats = {"buffered": 0, "flushed": 0, "flushes": 0, "flush_failures": 0, "dropped": 0}
+
+    def add_many(self, objects, vectors, props) -> None:
+        import numpy as np
+
+        entries = []
+        for obj, vector, prop in zip(objects, vectors, props):
+            vec = np.asarray(vector, dtype=np.float32)
+            norm = np.linalg.norm(vec)
+            entries.append((obj, vec / norm if norm else vec, prop))
+        if not entries:
+            return
+        with self._lock:
+            self._pending.extend(entries)
+            self._stats["buffered"] += len(entries)
+            full = len(self._pending) >= self.max_batch
+            over = len(self._pending) + len(self._inflight) > self.max_pending
+        if self._closed:
+            self.flush()
+            return
+        if over:
+            self._backpressure()
+            return
+        self._start()
+        if full:
+            self._wake.set()
+
+    def _backpressure(self) -> None:
+        """Flush on the writer's thread; drop the oldest vectors if the buffer is still over the cap."""
+        self.flush()
+        with self._lock:
+            excess = min(len(self._pending) + len(self._inflight) - self.max_pending, len(self._pending))
+            if excess <= 0:
+                return
+            del self._pending[:excess]
+            self._stats["dropped"] += excess
+        print(f"Vector write buffer full: dropped {excess} unflushed vectors")
+
+    def search_many(self, vectors, limit: int = 1, partitions: list | None = None) -> list[list[dict]]:
+        """Exact cosine search over the vectors not yet confirmed by the store
+        (each query only within its entry of `partitions`, when given)."""
+        with self._lock:
+            entries = self._inflight + self._pending
+        if not entries or len(vectors) == 0:
+            return [[] for _ in range(len(vectors))]
+        import numpy as np
+
+        matrix = np.stack([vec for _, vec, _ in entries])
+        queries = np.asarray(vectors, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+        if queries.shape[1] != matrix.shape[1]:
+            return [[] for _ in range(len(queries))]
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        sims = (queries / np.where(norms == 0, 1, norms)) @ matrix.T
+        if partitions is not None:
+            row_partitions = np.array([prop.get("partition") for _, _, prop in entries], dtype=object)
+            for q, partition in enumerate(partitions):
+                if partition is not None:
+                    sims[q, row_partitions != partition] = -np.inf
+
+        results = []
+        for row in sims:
+            matches = []
+            for idx in np.argsort(-row)[:limit]:
+                similarity = float(row[idx])
+                if similarity == -np.inf:
+                    break
+                matches.append({
+                    **entries[idx][2],
+                    "_additional": {"distance": 1.0 - similarity},
+                    "similarity": max(0.0, similarity),
+                })
+            results.append(matches)
+        return results
+
+    def flush(self) -> int:
+        """Write everything pending now; returns the number of objects flushed."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+                self._inflight = batch
+            if not batch:
+                return 0
+            try:
+                self._flush([obj for obj, _, _ in batch])
+            except Exception as e:
+                print(f"Error flushing vector writes: {e}")
+                with self._lock:
+                    self._pending = batch + self._pending
+                    self._inflight = []
+                    self._stats["flush_failures"] += 1
+                return 0
+            with self._lock:
+                self._inflight = []
+                self._stats["flushed"] += len(batch)
+                self._stats["flushes"] += 1
+            return len(batch)
+
+    def _start(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="vector-write-behind", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while not self._closed:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def close(self) -> None:
+        """Stop the flusher and write out whatever is still pending."""
+        self._closed = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=max(self.interval, 1.0) * 5)
+        self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = len(self._pending) + len(self._inflight)
+        stats["max_batch"] = self.max_batch
+        stats["max_pending"] = self.max_pending
+        stats["interval"] = self.interval
+        return stats
+
+
+write_buffer = WriteBehindBuffer(
+    weaviate_store_many,
+    max_batch=int(os.getenv("VECTOR_WRITE_BATCH_SIZE", "100")),
+    interval=float(os.getenv("VECTOR_WRITE_FLUSH_INTERVAL", "0.5")),
+    max_pending=int(os.getenv("VECTOR_WRITE_MAX_PENDING", "10000")),
+)
+atexit.register(write_buffer.close)
+
+
+def _props(incident_id, fields) -> dict:
+    props = {**fields, "incident_id": incident_id}
+    props["log_data"] = str(props.get("log_data")) if props.get("log_data") else None
+    props.setdefault(PARTITION_PROPERTY, partition_key(fields))
+    return {k: props.get(k) for k in SEARCH_PROPERTIES}
+
+
+def _merge(stored, pending, limit):
+    """Best matches from both sources, one per incident."""
+    merged, seen = [], set()
+    for match in sorted(stored + pending, key=lambda m: m.get("similarity", 0), reverse=True):
+        if match.get("incident_id") in seen:
+            continue
+        seen.add(match.get("incident_id"))
+        merged.append(match)
+    return merged[:limit]
+
+
+def buffered_store(vector, incident_id, **fields):
+    """Same contract as weaviate_store; the write happens on the next flush."""
+    buffered_store_many([(vector, incident_id, fields)])
+
+
+def buffered_store_many(objects):
+    """Same contract as weaviate_store_many; created_at defaults to the time the write was buffered."""
+    now = datetime.now(timezone.utc).isoformat()
+    objects = [(vector, incident_id, {TIME_PROPERTY: now, **fields}) for vector, incident_id, fields in objects]
+    write_buffer.add_many(objects, [v for v, _, _ in objects], [_props(i, f) for _, i, f in objects])
+
+
+def buffered_search(vector, limit=1, partition=None):
+    """weaviate_search that also sees buffered, not yet flushed vectors."""
+    if not vector:
+        return []
+    return _merge(
+        weaviate_search(vector, limit=limit, partition=partition),
+        write_buffer.search_many([vector], limit, [partition])[0], limit,
+    )
+
+
+def buffered_search_many(vectors, limit=1, partitions=None):
+    """weaviate_search_many that also sees buffered, not yet flushed vectors."""
+    if not vectors:
+        return []
+    stored = weaviate_search_many(vectors, limit=limit, partitions=partitions)
+    pending = write_buffer.search_many(vectors, limit, partitions)
+    return [_merge(s, p, limit) for s, p in zip(stored, pending)]
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Dict, Optional
+from pydantic import BaseModel, Field
+from typing import Dict, Literal, Optional
 
 class AlertRequest(BaseModel):
     appName: str
@@ -8,4 +8,9 @@ class AlertRequest(BaseModel):
     label: str
     level: str
     message: str
-    kubernetesDetails: Optional[Dict] = None  # JSON field
\ No newline at end of file
+    kubernetesDetails: Optional[Dict] = None  # JSON field
+
+class ThresholdRequest(BaseModel):
+    scope: Literal["partition", "service"]
+    value: str
+    threshold: float = Field(ge=0.0, le=1.0)
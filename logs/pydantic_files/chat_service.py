@@ -11,3 +11,4 @@ class ChatResponse(BaseModel):
     query: str 
     response: str
     timestamp: datetime
+    cached: bool = False
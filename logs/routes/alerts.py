@@ -1,41 +1,104 @@
-from fastapi import APIRouter, HTTPException
-from logs.pydantic_files.alerts import AlertRequest
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from logs.pydantic_files.alerts import AlertRequest, ThresholdRequest
 from logs.pydantic_files.chat_service import *
-from logs.services.alert_service import process_alert
-from typing import List, Dict
+from logs.services.alert_service import process_alert_async, process_alerts_batch
+from typing import List, Dict, Literal, Optional
+from datetime import datetime
 from logs.services.postgres_service import *
 from logs.services.chat_service import *
+from logs.services.embedding_cache import get_embedding_cache
+from logs.services.fingerprint import recent_fingerprints
+from logs.services.metrics import StatsGauges, register, render
+from logs.services.readiness import readiness
+from logs.services.single_flight import single_flight
+from logs.services.thresholds import dedup_thresholds
+from logs.services.vector_service import VECTOR_BACKEND, get_vector_expiry_stats
+from logs.services.write_behind import write_buffer
 
 
 router = APIRouter(tags=["Alerts"])
 
 @router.post("/deduplicate_alert")
-def deduplicate_alert(alert: AlertRequest):
+async def deduplicate_alert(alert: AlertRequest):
     """
     Endpoint for Flow Designer to send alerts.
     """
-    return process_alert(alert.model_dump())
+    return await process_alert_async(alert.model_dump())
 
-@router.get("/alerts", response_model=List[Dict])
-def list_alerts():
+@router.post("/deduplicate_alerts/batch", response_model=List[Dict])
+def deduplicate_alerts_batch(alerts: List[AlertRequest]):
     """
-    List all alerts from cleaned_logs with optional pagination.
+    Endpoint for log shippers to send a buffered batch of alerts.
+    Results are returned in input order.
     """
-    alerts = fetch_alerts()
-    return alerts
+    return process_alerts_batch([alert.model_dump() for alert in alerts])
+
+@router.get("/alerts")
+def list_alerts(
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    level: Optional[str] = None,
+    appName: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    include_payload: bool = True,
+):
+    """
+    List alerts from cleaned_logs, latest first, with keyset pagination.
+    Returns {"alerts": [...], "next_cursor": ...}; pass next_cursor (also sent
+    as the X-Next-Cursor header, null on the last page) back as `cursor` for
+    the next page. include_payload=false omits kubernetesDetails.
+    """
+    try:
+        alerts, next_cursor = fetch_alerts(
+            limit=limit, cursor=cursor, level=level, appName=appName,
+            since=since, until=until, include_payload=include_payload
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return {"alerts": alerts, "next_cursor": next_cursor}
 
 @router.get("/alerts/grouped")
-def get_grouped_alerts():
+def get_grouped_alerts(
+    format: Literal["json", "ndjson"] = "json",
+    limit: Optional[int] = Query(None, ge=1, le=10000),
+    cursor: Optional[str] = None,
+    max_duplicates: Optional[int] = Query(None, ge=0),
+):
     """
     Return alerts grouped by incident_id, including duplicates.
+
+    Groups are built in Postgres and streamed. format=ndjson emits one group
+    per line with its total duplicate_count, followed by a next_cursor line
+    when `limit` cut the page short; pass it back as `cursor` to continue.
+    max_duplicates caps the duplicate entries returned per group.
     """
-    grouped = fetch_grouped_alerts()
-    return grouped
+    if cursor:
+        try:
+            decode_cursor(cursor, 3)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    media_type = "application/x-ndjson" if format == "ndjson" else "application/json"
+    return StreamingResponse(
+        stream_grouped_alerts(format, limit=limit, cursor=cursor, max_duplicates=max_duplicates),
+        media_type=media_type,
+    )
 
 @router.get("/alerts/counts")
 def alert_counts():
     return get_alert_counts()
 
+@router.get("/alerts/counts/daily", response_model=List[Dict])
+def alert_counts_daily(days: int = Query(30, ge=1, le=366)):
+    """
+    Returns per-day alert, deduplicated and level counts, newest day first.
+    """
+    return get_daily_counts(days)
+
 @router.get("/alerts/summary")
 def alerts_summary():
     """
@@ -48,10 +111,153 @@ def alerts_summary():
 def create_chat_message(chat_req: ChatRequest):
     return add_chat_message(chat_req)
 
+@router.post("/alerts/grouped/chat/stream")
+def create_chat_message_stream(chat_req: ChatRequest):
+    """
+    Streaming variant of POST /alerts/grouped/chat (NDJSON token lines, then the saved message).
+    """
+    return StreamingResponse(stream_chat_message(chat_req), media_type="application/x-ndjson")
+
 @router.get("/alerts/grouped/chat/{incident_id}", response_model=List[ChatResponse])
 def fetch_chat_messages(incident_id: str):
     return get_chat_messages(incident_id)
 
+@router.get("/ready")
+def ready():
+    """
+    Readiness probe: 200 once the Postgres and Weaviate schemas, the vector
+    index and the embedding model are warm, 503 (with per-step status) before.
+    """
+    snapshot = readiness.snapshot()
+    return JSONResponse(snapshot, status_code=200 if snapshot["ready"] else 503)
+
+@router.get("/stats/db_pool")
+def db_pool_stats():
+    """
+    Return Postgres connection pool utilization.
+    """
+    return get_pool_stats()
+
+@router.get("/stats/embedding_cache")
+def embedding_cache_stats():
+    """
+    Return embedding cache hit/miss/eviction counters.
+    """
+    return get_embedding_cache().stats()
+
+@router.get("/stats/fingerprints")
+def fingerprint_stats():
+    """
+    Return in-memory recent-fingerprint set counters.
+    """
+    return recent_fingerprints.stats()
+
+@router.get("/stats/vector_index")
+def vector_index_stats():
+    """
+    Return the active vector backend and, for the in-process index, its size.
+    """
+    if VECTOR_BACKEND != "numpy":
+        return {"backend": VECTOR_BACKEND}
+    from logs.services.numpy_index import index
+    return {"backend": VECTOR_BACKEND, **index.stats()}
+
+
+@router.get("/stats/vector_expiry")
+def vector_expiry_stats():
+    """
+    Return the dedup window (hours, 0 = unlimited) and background expiry counters.
+    """
+    return get_vector_expiry_stats()
+
+
+@router.get("/stats/vector_writes")
+def vector_write_stats():
+    """
+    Return write-behind buffer counters (pending, flushed, failures).
+    """
+    return write_buffer.stats()
+
+@router.get("/stats/chat_cache")
+def chat_cache_stats():
+    """
+    Return chat answer cache hit/miss counters.
+    """
+    return chat_answer_cache.stats()
+
+@router.get("/stats/chat_context")
+def chat_context_stats():
+    """
+    Return prompt-size statistics (estimated tokens, truncated and dropped
+    fields) for chat context building.
+    """
+    return context_metrics.stats()
+
+@router.get("/stats/single_flight")
+def single_flight_stats():
+    """
+    Return single-flight counters: concurrent logs with the same embedding
+    text that waited for one embed/search/store instead of running their own.
+    """
+    return single_flight.stats()
+
+@router.get("/stats/dedup_thresholds")
+def dedup_threshold_stats():
+    """
+    Return threshold override counters: overrides loaded, reloads and
+    seconds since the last one.
+    """
+    return dedup_thresholds.stats()
+
+@router.get("/dedup/thresholds")
+def get_dedup_thresholds():
+    """
+    Return the default similarity threshold and the per-partition/per-service
+    overrides in effect.
+    """
+    return dedup_thresholds.snapshot()
+
+@router.put("/dedup/thresholds")
+def put_dedup_threshold(req: ThresholdRequest):
+    """
+    Set the similarity threshold of one partition or service.
+    Other workers pick it up within the refresh interval.
+    """
+    set_threshold(req.scope, req.value, req.threshold)
+    return dedup_thresholds.reload()
+
+@router.delete("/dedup/thresholds")
+def delete_dedup_threshold(scope: Literal["partition", "service"] = Query(...), value: str = Query(...)):
+    """
+    Remove a threshold override so the default applies again.
+    """
+    if not delete_threshold(scope, value):
+        raise HTTPException(status_code=404, detail="Threshold override not found")
+    return dedup_thresholds.reload()
+
+@router.get("/metrics")
+def metrics():
+    """
+    Prometheus scrape endpoint.
+    Exposes per-stage latency histograms, dedup outcome counters and the
+    numeric values of the /stats endpoints as gauges.
+    """
+    return Response(render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# /stats counters are also exported as gauges, read at scrape time
+for prefix, help_text, source in [
+    ("aiops_db_pool", "Postgres connection pool", db_pool_stats),
+    ("aiops_embedding_cache", "Embedding cache", embedding_cache_stats),
+    ("aiops_fingerprints", "Recent-fingerprint set", fingerprint_stats),
+    ("aiops_vector_index", "In-process vector index", vector_index_stats),
+    ("aiops_vector_writes", "Vector write-behind buffer", vector_write_stats),
+    ("aiops_vector_expiry", "Dedup window vector expiry", vector_expiry_stats),
+    ("aiops_chat_cache", "Chat answer cache", chat_cache_stats),
+    ("aiops_chat_context", "Chat context builder", chat_context_stats),
+    ("aiops_single_flight", "Single-flight alert coalescing", single_flight_stats),
+    ("aiops_dedup_thresholds", "Dedup threshold overrides", dedup_threshold_stats),
+]:
+    register(StatsGauges(prefix, help_text, source))
 
 @router.get("/alerts/{incident_id}", response_model=Dict)
 def get_alert_detail(incident_id: str):
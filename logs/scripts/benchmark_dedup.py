@@ -0,0 +1,480 @@
+# Offline throughput/latency benchmark for the log dedup pipeline.
+# Runs the real alert_service code against local stand-ins, so no Postgres,
+# Ollama or Weaviate is needed:
+#   - a deterministic hashing embedder with configurable latency
+#   - the in-process NumpyVectorIndex as the vector store
+#   - an in-memory SQLite database in place of Postgres
+#
+# python -m logs.scripts.benchmark_dedup [--mode sync|async|batch] [--alerts 2000]
+#     [--duplicate-ratio 0.6] [--embed-latency-ms 15] [--json out.json]
+#     [--compare baseline.json --max-regression 0.2]
+
+import argparse, asyncio, hashlib, json, math, random, re, sqlite3, sys, threading, time
+from collections import defaultdict
+
+import numpy as np
+
+from logs.services import alert_service
+from logs.services import async_postgres_service as apg
+from logs.services.fingerprint import RecentFingerprints, compute_fingerprint
+from logs.services.numpy_index import NumpyVectorIndex
+from logs.services.postgres_service import counter_deltas, embedding_values, new_incident_id
+from logs.services.thresholds import DedupThresholds
+
+WORDS = (
+    "cpu memory disk latency error timeout queue pod node cluster api gateway database replica "
+    "cache kafka consumer lag throughput saturation restart crash oom network packet loss dns tls "
+    "certificate expiry storage volume quota budget burn rate ingress egress scheduler job batch "
+    "worker thread pool connection refused unavailable degraded spike drop leak retry backoff"
+).split()
+LEVELS = ["ERROR", "WARN", "INFO", "DEBUG"]
+
+
+# --------------------------------------------------------------------------- #
+# Synthetic alerts
+# --------------------------------------------------------------------------- #
+def _phrase(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+def generate_alerts(count: int, duplicate_ratio: float, exact_share: float = 0.5, seed: int = 7):
+    """
+    Raw logs plus the expected kind of each ("new", "exact" or "near").
+
+    A duplicate repeats an earlier new log: an exact repeat is identical, a
+    near duplicate only changes the number in the message (so it must be
+    caught by the semantic check).
+    """
+    rng = random.Random(seed)
+    originals, alerts, kinds = [], [], []
+    for _ in range(count):
+        if originals and rng.random() < duplicate_ratio:
+            template, alert = rng.choice(originals)
+            alert = dict(alert)
+            if rng.random() < exact_share:
+                kinds.append("exact")
+            else:
+                alert["message"] = template.format(rng.randint(100, 9999))
+                kinds.append("near")
+        else:
+            template = _phrase(rng, 6) + " after {} ms"
+            alert = {
+                "appName": _phrase(rng, 1),
+                "serviceName": _phrase(rng, 2),
+                "job": _phrase(rng, 1),
+                "label": _phrase(rng, 1),
+                "level": rng.choice(LEVELS),
+                "message": template.format(rng.randint(100, 9999)),
+                "kubernetesDetails": {
+                    "namespace": _phrase(rng, 1),
+                    "podName": f"{_phrase(rng, 1)}-{rng.randint(1000, 9999)}",
+                    "containerName": _phrase(rng, 1),
+                },
+            }
+            originals.append((template, alert))
+            kinds.append("new")
+        alerts.append(alert)
+    return alerts, kinds
+
+
+# --------------------------------------------------------------------------- #
+# Stand-ins
+# --------------------------------------------------------------------------- #
+class FakeEmbedder:
+    """Deterministic feature-hashing embedder: texts sharing most tokens get close vectors."""
+
+    def __init__(self, dim: int = 768, latency_ms: float = 0.0, batch_item_ms: float = 0.0):
+        self.dim = dim
+        self.latency = latency_ms / 1000
+        self.batch_item = batch_item_ms / 1000
+        self._tokens = {}
+
+    def _token_vector(self, token: str) -> np.ndarray:
+        vec = self._tokens.get(token)
+        if vec is None:
+            seed = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "big")
+            vec = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+            self._tokens[token] = vec
+        return vec
+
+    def _vector(self, text: str) -> list[float]:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for token in re.findall(r"[a-z0-9-]+", text.lower()):
+            vec += self._token_vector(token)
+        norm = np.linalg.norm(vec)
+        return (vec / norm if norm else vec).tolist()
+
+    def embed(self, text: str) -> list[float]:
+        time.sleep(self.latency)
+        return self._vector(text)
+
+    def embed_many(self, texts: list[str]) -> list[list[float]]:
+        time.sleep(self.latency + self.batch_item * len(texts))
+        return [self._vector(text) for text in texts]
+
+    async def embed_async(self, text: str) -> list[float]:
+        await asyncio.sleep(self.latency)
+        return self._vector(text)
+
+
+class VectorStore:
+    """In-memory vector store with the vector_service index_* call shapes and optional network latency."""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.index = NumpyVectorIndex()
+        self.latency = latency_ms / 1000
+
+    def search(self, vector, limit: int = 1, partition=None) -> list[dict]:
+        time.sleep(self.latency)
+        return self.index.search(vector, limit=limit, partition=partition)
+
+    def search_many(self, vectors, limit: int = 1, partitions=None) -> list[list[dict]]:
+        time.sleep(self.latency)
+        return self.index.search_many(vectors, limit=limit, partitions=partitions)
+
+    def store(self, vector, incident_id, alert_text, timestamp, partition=None) -> None:
+        time.sleep(self.latency)
+        self.index.add(vector, {"incident_id": incident_id, "message": alert_text}, partition=partition)
+
+    def store_many(self, objects) -> None:
+        if not objects:
+            return
+        time.sleep(self.latency)
+        self.index.add_many(
+            [o[0] for o in objects],
+            [{"incident_id": o[1], "message": o[2]} for o in objects],
+            partitions=[o[4] if len(o) > 4 else None for o in objects],
+        )
+
+    async def search_async(self, vector, limit: int = 1, partition=None) -> list[dict]:
+        await asyncio.sleep(self.latency)
+        return self.index.search(vector, limit=limit, partition=partition)
+
+    async def store_async(self, vector, incident_id, alert_text, timestamp, partition=None) -> None:
+        await asyncio.sleep(self.latency)
+        self.index.add(vector, {"incident_id": incident_id, "message": alert_text}, partition=partition)
+
+
+class SqliteStore:
+    """In-memory SQLite stand-in for the postgres_service / async_postgres_service functions used by dedup."""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(":memory:", check_same_thread=False)
+        self.db.executescript(
+            """
+            CREATE TABLE cleaned_logs (
+                id TEXT PRIMARY KEY, ts TEXT, level TEXT, payload TEXT, fingerprint TEXT, embedding BLOB);
+            CREATE TABLE duplicate_logs (
+                row_id INTEGER PRIMARY KEY, incident_id TEXT, ts TEXT, payload TEXT, fingerprint TEXT);
+            CREATE TABLE log_counters (
+                metric TEXT, dimension TEXT, bucket TEXT, count INTEGER,
+                PRIMARY KEY (metric, dimension, bucket));
+            CREATE INDEX idx_cleaned_fp ON cleaned_logs (fingerprint);
+            CREATE INDEX idx_duplicate_fp ON duplicate_logs (fingerprint);
+            CREATE INDEX idx_duplicate_incident ON duplicate_logs (incident_id, ts);
+            """
+        )
+
+    def _write(self, cleaned, duplicates, vectors=None) -> dict:
+        """
+        cleaned: (incident_id, timestamp, alert, fingerprint); duplicates: (original_id, timestamp, alert, fingerprint);
+        vectors: {incident_id: embedding} of cleaned logs. Taken ids are replaced as in postgres_service.insert_log_batch; returns {generated id: stored id}.
+        """
+        time.sleep(self.latency)
+        with self._lock, self.db:
+            taken = {
+                row[0] for row in self.db.execute(
+                    f"SELECT id FROM cleaned_logs WHERE id IN ({','.join('?' * len(cleaned))})", [c[0] for c in cleaned]
+                )
+            } if cleaned else set()
+            renamed = {i: new_incident_id(taken | {c[0] for c in cleaned}) for i in taken}
+            vectors = vectors or {}
+            embeddings = [embedding_values(vectors.get(i))[0] for i, *_ in cleaned]
+            cleaned = [(renamed.get(i, i), *rest) for i, *rest in cleaned]
+            duplicates = [(renamed.get(i, i), *rest) for i, *rest in duplicates]
+            self.db.executemany(
+                "INSERT INTO cleaned_logs (id, ts, level, payload, fingerprint, embedding) VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (i, ts.isoformat(), a.get("level"), json.dumps(a, default=str), fp, embedding)
+                    for (i, ts, a, fp), embedding in zip(cleaned, embeddings)
+                ],
+            )
+            self.db.executemany(
+                "INSERT INTO duplicate_logs (incident_id, ts, payload, fingerprint) VALUES (?, ?, ?, ?)",
+                [(i, ts.isoformat(), json.dumps(a, default=str), fp) for i, ts, a, fp in duplicates],
+            )
+            self.db.executemany(
+                "INSERT INTO log_counters VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (metric, dimension, bucket) DO UPDATE SET count = count + excluded.count",
+                counter_deltas([(a.get("level"), ts) for _, ts, a, _ in cleaned], [ts for _, ts, _, _ in duplicates]),
+            )
+        return renamed
+
+    def insert_cleaned_log(self, incident_id, timestamp, fingerprint=None, vector=None, **alert) -> bool:
+        return self._insert_if_free(incident_id, timestamp, alert, fingerprint, vector)
+
+    def _insert_if_free(self, incident_id, timestamp, alert, fingerprint, vector=None) -> bool:
+        with self._lock:
+            if self.db.execute("SELECT 1 FROM cleaned_logs WHERE id = ?", (incident_id,)).fetchone():
+                return False
+        self._write([(incident_id, timestamp, alert, fingerprint)], [], {incident_id: vector})
+        return True
+
+    def insert_duplicate_log(self, original_incident_id, timestamp, fingerprint=None, **alert) -> None:
+        self._write([], [(original_incident_id, timestamp, alert, fingerprint)])
+
+    def insert_log_batch(self, cleaned, duplicates, vectors=None) -> dict:
+        return self._write(cleaned, duplicates, vectors)
+
+    def fetch_incident_by_fingerprint(self, fingerprint):
+        return self.fetch_incidents_by_fingerprints([fingerprint]).get(fingerprint)
+
+    def fetch_incidents_by_fingerprints(self, fingerprints):
+        if not fingerprints:
+            return {}
+        time.sleep(self.latency)
+        fps = list(fingerprints)
+        marks = ",".join("?" * len(fps))
+        with self._lock:
+            rows = self.db.execute(
+                f"""
+                SELECT fingerprint, id, 0 FROM cleaned_logs WHERE fingerprint IN ({marks})
+                UNION ALL
+                SELECT fingerprint, incident_id, 1 FROM duplicate_logs WHERE fingerprint IN ({marks})
+                ORDER BY 3 DESC
+                """,
+                fps + fps,
+            ).fetchall()
+        return {fp: incident_id for fp, incident_id, _ in rows}
+
+    async def insert_cleaned_log_async(self, incident_id, timestamp, alert, fingerprint=None, vector=None) -> bool:
+        await asyncio.sleep(self.latency)
+        return self._insert_if_free(incident_id, timestamp, alert, fingerprint, vector)
+
+    async def insert_duplicate_log_async(self, original_incident_id, timestamp, alert, fingerprint=None):
+        await asyncio.sleep(self.latency)
+        self._write([], [(original_incident_id, timestamp, alert, fingerprint)])
+
+    async def fetch_incident_by_fingerprint_async(self, fingerprint):
+        await asyncio.sleep(self.latency)
+        return self.fetch_incident_by_fingerprint(fingerprint)
+
+
+# --------------------------------------------------------------------------- #
+# Timing
+# --------------------------------------------------------------------------- #
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))]
+
+
+class StageTimer:
+    """Wraps pipeline seams and records the wall time of every call per stage."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def wrap(self, stage: str, fn):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.samples[stage].append(time.perf_counter() - start)
+        return timed
+
+    def wrap_async(self, stage: str, fn):
+        async def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                self.samples[stage].append(time.perf_counter() - start)
+        return timed
+
+    def report(self) -> dict:
+        return {
+            stage: {
+                "calls": len(values),
+                "total_ms": round(sum(values) * 1000, 2),
+                "mean_ms": round(sum(values) / len(values) * 1000, 4),
+                "p50_ms": round(percentile(values, 50) * 1000, 4),
+                "p95_ms": round(percentile(values, 95) * 1000, 4),
+                "p99_ms": round(percentile(values, 99) * 1000, 4),
+            }
+            for stage, values in self.samples.items()
+        }
+
+
+def install_stand_ins(embedder: FakeEmbedder, store: VectorStore, db: SqliteStore, timer: StageTimer) -> None:
+    """Point alert_service at the stand-ins (each wrapped in a stage timer)."""
+    svc = alert_service
+    svc.recent_fingerprints = RecentFingerprints(max_entries=50000)
+    svc.compute_fingerprint = timer.wrap("fingerprint", compute_fingerprint)
+    svc.dedup_thresholds = DedupThresholds(lambda: [])  # default threshold, no overrides
+    # sync / batch
+    svc.fetch_incident_by_fingerprint = timer.wrap("exact_match", db.fetch_incident_by_fingerprint)
+    svc.fetch_incidents_by_fingerprints = timer.wrap("exact_match", db.fetch_incidents_by_fingerprints)
+    svc.insert_cleaned_log = timer.wrap("insert", db.insert_cleaned_log)
+    svc.insert_duplicate_log = timer.wrap("insert", db.insert_duplicate_log)
+    svc.insert_log_batch = timer.wrap("insert", db.insert_log_batch)
+    svc.get_embedding = timer.wrap("embed", embedder.embed)
+    svc.get_embeddings = timer.wrap("embed", embedder.embed_many)
+    svc.index_search = timer.wrap("search", store.search)
+    svc.index_search_many = timer.wrap("search", store.search_many)
+    svc.index_store = timer.wrap("store_vector", store.store)
+    svc.index_store_many = timer.wrap("store_vector", store.store_many)
+    # async
+    apg.fetch_incident_by_fingerprint = timer.wrap_async("exact_match", db.fetch_incident_by_fingerprint_async)
+    apg.insert_cleaned_log = timer.wrap_async("insert", db.insert_cleaned_log_async)
+    apg.insert_duplicate_log = timer.wrap_async("insert", db.insert_duplicate_log_async)
+    svc.get_embedding_async = timer.wrap_async("embed", embedder.embed_async)
+    svc.index_search_async = timer.wrap_async("search", store.search_async)
+    svc.index_store_async = timer.wrap_async("store_vector", store.store_async)
+
+
+# --------------------------------------------------------------------------- #
+# Runs
+# --------------------------------------------------------------------------- #
+def run_sync(alerts):
+    latencies, results = [], []
+    for alert in alerts:
+        start = time.perf_counter()
+        results.append(alert_service.process_alert(alert))
+        latencies.append(time.perf_counter() - start)
+    return latencies, results
+
+
+def run_batch(alerts, batch_size: int):
+    latencies, results = [], []
+    for i in range(0, len(alerts), batch_size):
+        chunk = alerts[i : i + batch_size]
+        start = time.perf_counter()
+        results.extend(alert_service.process_alerts_batch(chunk))
+        # Every alert in a batch waits for the whole batch
+        latencies.extend([time.perf_counter() - start] * len(chunk))
+    return latencies, results
+
+
+def run_async(alerts, concurrency: int):
+    async def main():
+        gate = asyncio.Semaphore(concurrency)
+        latencies = [0.0] * len(alerts)
+
+        async def one(i, alert):
+            async with gate:
+                start = time.perf_counter()
+                result = await alert_service.process_alert_async(alert)
+                latencies[i] = time.perf_counter() - start
+                return result
+
+        results = await asyncio.gather(*(one(i, a) for i, a in enumerate(alerts)))
+        return latencies, list(results)
+
+    return asyncio.run(main())
+
+
+def benchmark(args) -> dict:
+    alerts, kinds = generate_alerts(args.alerts, args.duplicate_ratio, args.exact_share, args.seed)
+    embedder = FakeEmbedder(args.dim, args.embed_latency_ms, args.embed_batch_item_ms)
+    store = VectorStore(args.store_latency_ms)
+    db = SqliteStore(args.db_latency_ms)
+    timer = StageTimer()
+    install_stand_ins(embedder, store, db, timer)
+
+    start = time.perf_counter()
+    if args.mode == "batch":
+        latencies, results = run_batch(alerts, args.batch_size)
+    elif args.mode == "async":
+        latencies, results = run_async(alerts, args.concurrency)
+    else:
+        latencies, results = run_sync(alerts)
+    elapsed = time.perf_counter() - start
+
+    decided = defaultdict(int)
+    missed = 0
+    for kind, result in zip(kinds, results):
+        decided[result["decided_by"]] += 1
+        missed += kind != "new" and result["decided_by"] in ("new", "embedding_failed")
+    return {
+        "mode": args.mode,
+        "alerts": len(alerts),
+        "duplicate_ratio": args.duplicate_ratio,
+        "elapsed_s": round(elapsed, 3),
+        "alerts_per_sec": round(len(alerts) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 3),
+            "p95": round(percentile(latencies, 95) * 1000, 3),
+            "p99": round(percentile(latencies, 99) * 1000, 3),
+            "max": round(max(latencies) * 1000, 3) if latencies else 0.0,
+        },
+        "decided_by": dict(decided),
+        "expected": {kind: kinds.count(kind) for kind in ("new", "exact", "near")},
+        "missed_duplicates": missed,
+        "stages": timer.report(),
+    }
+
+
+def print_report(report: dict) -> None:
+    lat = report["latency_ms"]
+    print(f"mode={report['mode']} alerts={report['alerts']} duplicate_ratio={report['duplicate_ratio']}")
+    print(f"  throughput  {report['alerts_per_sec']} alerts/s ({report['elapsed_s']}s)")
+    print(f"  latency ms  p50 {lat['p50']}  p95 {lat['p95']}  p99 {lat['p99']}  max {lat['max']}")
+    print(f"  decided_by  {report['decided_by']}")
+    print(f"  expected    {report['expected']}  missed duplicates {report['missed_duplicates']}")
+    print(f"\n  {'stage':<14}{'calls':>8}{'total ms':>12}{'mean ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, s in sorted(report["stages"].items(), key=lambda kv: -kv[1]["total_ms"]):
+        print(f"  {stage:<14}{s['calls']:>8}{s['total_ms']:>12}{s['mean_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}")
+
+
+def compare(report: dict, baseline: dict, max_regression: float) -> list[str]:
+    """Regressions of throughput or p95/p99 latency beyond max_regression (a fraction)."""
+    problems = []
+    if report["alerts_per_sec"] < baseline["alerts_per_sec"] * (1 - max_regression):
+        problems.append(f"throughput {report['alerts_per_sec']} < baseline {baseline['alerts_per_sec']}")
+    for key in ("p95", "p99"):
+        now, then = report["latency_ms"][key], baseline["latency_ms"][key]
+        if now > then * (1 + max_regression):
+            problems.append(f"{key} latency {now}ms > baseline {then}ms")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark log dedup against local stand-ins")
+    parser.add_argument("--mode", choices=["sync", "async", "batch"], default="sync")
+    parser.add_argument("--alerts", type=int, default=2000)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.6)
+    parser.add_argument("--exact-share", type=float, default=0.5, help="fraction of duplicates that are exact repeats")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--embed-latency-ms", type=float, default=15.0, help="per embed call")
+    parser.add_argument("--embed-batch-item-ms", type=float, default=1.0, help="extra per text in a batch call")
+    parser.add_argument("--store-latency-ms", type=float, default=0.0, help="simulated vector store round trip")
+    parser.add_argument("--db-latency-ms", type=float, default=0.0, help="simulated Postgres round trip")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--compare", help="baseline report (from --json) to check for regressions")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    report = benchmark(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            problems = compare(report, json.load(f), args.max_regression)
+        for problem in problems:
+            print(f"REGRESSION: {problem}")
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# Rebuild the Weaviate Incident class from the embeddings stored in cleaned_logs,
+# without calling Ollama for rows whose embedding is current:
+# python -m logs.scripts.rebuild_vectors [--reembed] [--all] [--append] [--batch-size 500]
+#
+# The class is dropped and recreated first, unless --append is given (objects are
+# written under the migration's deterministic ids, so appending only overwrites
+# objects a previous rebuild or migration wrote). Every object gets its timestamp
+# and partition from Postgres, which also fixes objects stored before those existed.
+# Only logs inside DEDUP_WINDOW_HOURS are loaded, unless --all.
+#
+# Rows without an embedding, or with one from another EMBEDDING_MODEL /
+# EMBEDDING_MODEL_VERSION, are skipped and counted; --reembed embeds them again,
+# writes the new embedding back to Postgres and loads it too.
+# Searches during the rebuild see a partial index; run it before starting the
+# service, or restart it afterwards when VECTOR_BACKEND=numpy.
+
+import argparse
+import time
+
+from logs.services.alert_service import build_alert_text
+from logs.services.embedding_cache import EMBEDDING_MODEL, EMBEDDING_MODEL_VERSION
+from logs.services.postgres_service import (
+    close_pool,
+    count_embeddings,
+    ensure_schema,
+    iter_stored_embeddings,
+    update_embeddings
+)
+from logs.services.vector_service import get_embeddings
+from logs.services.weaviate_client import (
+    create_schema,
+    delete_all_weaviate_data,
+    partition_key,
+    weaviate_store_many,
+    weaviate_uuid,
+    window_cutoff
+)
+
+BATCH_SIZE = 500
+
+
+def load_batch(batch):
+    """Import (incident_id, timestamp, alert, vector) items under deterministic object ids."""
+    if batch:
+        weaviate_store_many(
+            [
+                (vector, incident_id, build_alert_text(alert), timestamp, partition_key(alert))
+                for incident_id, timestamp, alert, vector in batch
+            ],
+            uuids=[weaviate_uuid(incident_id) for incident_id, _, _, _ in batch],
+        )
+
+
+def reembed_batch(batch):
+    """Embed (incident_id, timestamp, alert, None) items and store the embeddings; returns the loadable items."""
+    vectors = get_embeddings([build_alert_text(alert) for _, _, alert, _ in batch])
+    if not vectors:
+        raise RuntimeError("Embedding failed; re-run with --reembed to continue")
+    update_embeddings([(incident_id, vector) for (incident_id, _, _, _), vector in zip(batch, vectors)])
+    return [(incident_id, timestamp, alert, vector) for (incident_id, timestamp, alert, _), vector in zip(batch, vectors)]
+
+
+def rebuild(since=None, reembed=False, append=False, batch_size=BATCH_SIZE):
+    ensure_schema()
+    counts = count_embeddings(since)
+    print(
+        f"Logs to load: {counts['total']} | stored embeddings ({EMBEDDING_MODEL} v{EMBEDDING_MODEL_VERSION}): "
+        f"{counts['current']} | need re-embedding: {counts['stale']}"
+    )
+    if not append:
+        delete_all_weaviate_data()
+    create_schema()
+
+    started, loaded = time.monotonic(), 0
+    passes = [False, True] if reembed else [False]
+    for stale in passes:
+        batch = []
+        for item in iter_stored_embeddings(since, stale=stale, itersize=batch_size):
+            batch.append(item)
+            if len(batch) == batch_size:
+                load_batch(reembed_batch(batch) if stale else batch)
+                loaded += len(batch)
+                batch = []
+                print(f"Loaded {loaded} | {loaded / max(time.monotonic() - started, 1e-9):.1f} objects/s")
+        if batch:
+            load_batch(reembed_batch(batch) if stale else batch)
+            loaded += len(batch)
+
+    skipped = 0 if reembed else counts["stale"]
+    print(f"Rebuild completed: {loaded} objects loaded, {skipped} skipped (need re-embedding)")
+    close_pool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the vector store from embeddings stored in Postgres")
+    parser.add_argument("--reembed", action="store_true", help="embed rows with a missing or outdated embedding")
+    parser.add_argument("--all", action="store_true", help="load every log, not only the dedup window")
+    parser.add_argument("--append", action="store_true", help="keep the existing Incident class")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+    rebuild(
+        since=None if args.all else window_cutoff(),
+        reembed=args.reembed,
+        append=args.append,
+        batch_size=args.batch_size,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+# Rebuild log_counters from cleaned_logs/duplicate_log_aggregates.
+# Safe to run at any time, e.g. after bulk loads or manual edits to the base tables.
+# python -m logs.scripts.reconcile_counters
+
+from logs.services.postgres_service import close_pool, ensure_schema, reconcile_counters
+
+
+def main():
+    ensure_schema()
+    counts = reconcile_counters()
+    close_pool()
+    print(f"Counters reconciled: {counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,23 @@
 from datetime import datetime, timezone
-import uuid
-from logs.services.postgres_service import insert_cleaned_log, insert_duplicate_log
-from logs.services.vector_service import get_embedding, weaviate_search, weaviate_store
+from logs.services.fingerprint import compute_fingerprint, recent_fingerprints
+from logs.services.postgres_service import (
+    insert_cleaned_log, insert_duplicate_log, insert_log_batch,
+    fetch_incident_by_fingerprint, fetch_incidents_by_fingerprints,
+    new_incident_id as generate_incident_id
+)
+from logs.services.vector_service import (
+    get_embedding, index_search, index_store,
+    get_embeddings, index_search_many, index_store_many,
+    get_embedding_async, index_search_async, index_store_async,
+    partition_key
+)
+from logs.services import async_postgres_service as apg
+from logs.services.metrics import DEDUP_SIMILARITY, counts_outcomes, timed
+from logs.services.single_flight import single_flight
+from logs.services.thresholds import dedup_thresholds
 
-SIMILARITY_THRESHOLD = 0.85
-
-def process_alert(alert: dict):
-    alert_text = " | ".join([
+def build_alert_text(alert: dict) -> str:
+    return " | ".join([
         alert.get("appName", ""),
         alert.get("serviceName", ""),
         alert.get("job", ""),
@@ -16,46 +27,321 @@ def process_alert(alert: dict):
         str(alert.get("kubernetesDetails", ""))
     ])
 
-    vector = get_embedding(alert_text)
+def _embedding_failed_result(incident_id: str) -> dict:
+    return {
+        "status": "unique",
+        "message": "Alert stored in cleaned_logs (embedding failed).",
+        "incident_id": incident_id,
+        "decided_by": "embedding_failed"
+    }
+
+def _duplicate_result(original_incident_id: str, decided_by: str = "semantic") -> dict:
+    return {
+        "status": "Duplicate alert detected",
+        "message": "An alert with similar content already exists",
+        "incident_id": f"This alert matches an existing incident with ID: {original_incident_id}",
+        "decided_by": decided_by,
+    }
+
+def _new_alert_result(incident_id: str) -> dict:
+    return {
+        "status": "New alert created",
+        "message": "This is a new alert and has been stored successfully.",
+        "incident_id": f"New incident created with ID: {incident_id}",
+        "decided_by": "new"
+    }
+
+def _result_for(decided_by: str, incident_id: str) -> dict:
+    if decided_by == "new":
+        return _new_alert_result(incident_id)
+    if decided_by == "embedding_failed":
+        return _embedding_failed_result(incident_id)
+    return _duplicate_result(incident_id, decided_by)
+
+def _store_new_log(timestamp: datetime, alert: dict, fingerprint: str, vector: list | None = None) -> str:
+    """
+    Insert a new log (and its embedding, when given) into cleaned_logs under a
+    fresh generated id; returns the id.
+    A generated id that is already taken is retried with another one.
+    """
+    while True:
+        new_incident_id = generate_incident_id()
+        if insert_cleaned_log(incident_id=new_incident_id, timestamp=timestamp, fingerprint=fingerprint, vector=vector, **alert):
+            return new_incident_id
+
+async def _store_new_log_async(timestamp: datetime, alert: dict, fingerprint: str, vector: list | None = None) -> str:
+    """Async variant of _store_new_log."""
+    while True:
+        new_incident_id = generate_incident_id()
+        if await apg.insert_cleaned_log(new_incident_id, timestamp, alert, fingerprint, vector):
+            return new_incident_id
+
+@counts_outcomes
+@timed("pipeline")
+def process_alert(alert: dict):
     timestamp = datetime.now(timezone.utc)
+    fingerprint = compute_fingerprint(alert)
+
+    # Exact repeat → skip embedding and vector search entirely
+    original_incident_id, decided_by = recent_fingerprints.get(fingerprint), "fingerprint_cache"
+    if not original_incident_id:
+        original_incident_id, decided_by = fetch_incident_by_fingerprint(fingerprint), "fingerprint_db"
+    if original_incident_id:
+        insert_duplicate_log(
+            original_incident_id=original_incident_id,
+            timestamp=timestamp,
+            fingerprint=fingerprint,
+            **alert
+        )
+        recent_fingerprints.add(fingerprint, original_incident_id)
+        return _duplicate_result(original_incident_id, decided_by)
+
+    # Embed, search and store once per embedding text; concurrent copies
+    # wait for that and are recorded against the same incident
+    alert_text = build_alert_text(alert)
+    (result, original_incident_id), shared = single_flight.do(
+        alert_text, lambda: _resolve_semantic(alert, timestamp, fingerprint, alert_text)
+    )
+    if not shared:
+        return result
+    insert_duplicate_log(
+        original_incident_id=original_incident_id,
+        timestamp=timestamp,
+        fingerprint=fingerprint,
+        **alert
+    )
+    recent_fingerprints.add(fingerprint, original_incident_id)
+    return _duplicate_result(original_incident_id, "single_flight")
+
+def _resolve_semantic(alert: dict, timestamp: datetime, fingerprint: str, alert_text: str) -> tuple[dict, str]:
+    """
+    Embedding, vector search and storage part of process_alert.
+    Returns (result, incident the log was stored as or matched).
+    """
+    vector = get_embedding(alert_text)
 
     if not vector:
         # Embedding failed → treat as unique
-        new_incident_id = str(uuid.uuid4())[:8]
-        insert_cleaned_log(incident_id=new_incident_id, timestamp=timestamp, **alert)
-        return {
-            "status": "unique",
-            "message": "Alert stored in cleaned_logs (embedding failed).",
-            "incident_id": new_incident_id
-        }
-
-    # Search for duplicates
-    matches = weaviate_search(vector, limit=1)
+        new_incident_id = _store_new_log(timestamp, alert, fingerprint)
+        recent_fingerprints.add(fingerprint, new_incident_id)
+        return _embedding_failed_result(new_incident_id), new_incident_id
+
+    # Search for duplicates within the log's partition
+    partition = partition_key(alert)
+    matches = index_search(vector, limit=1, partition=partition)
     if matches:
         top_match = matches[0]
         similarity = top_match.get("similarity", 0)
         original_incident_id = top_match.get("incident_id")
+        DEDUP_SIMILARITY.observe(similarity)
 
-        if similarity >= SIMILARITY_THRESHOLD and original_incident_id:
+        if similarity >= dedup_thresholds.threshold_for(alert, partition) and original_incident_id:
             # Duplicate found → store in duplicate_logs
             insert_duplicate_log(
                 original_incident_id=original_incident_id,
                 timestamp=timestamp,
+                fingerprint=fingerprint,
                 **alert
             )
-            return {
-                "status": "Duplicate alert detected",
-                "message": "An alert with similar content already exists",
-                "incident_id": f"This alert matches an existing incident with ID: {original_incident_id}",
-            }
+            recent_fingerprints.add(fingerprint, original_incident_id)
+            return _duplicate_result(original_incident_id), original_incident_id
 
     # Unique alert → store in cleaned_logs & Weaviate
-    new_incident_id = str(uuid.uuid4())[:8]
-    insert_cleaned_log(incident_id=new_incident_id, timestamp=timestamp, **alert)
-    weaviate_store(vector, new_incident_id, alert_text, timestamp)
+    new_incident_id = _store_new_log(timestamp, alert, fingerprint, vector)
+    index_store(vector, new_incident_id, alert_text, timestamp, partition)
+    recent_fingerprints.add(fingerprint, new_incident_id)
 
-    return {
-            "status": "New alert created",
-            "message": "This is a new alert and has been stored successfully.",
-            "incident_id": f"New incident created with ID: {new_incident_id}"  
-        }
+    return _new_alert_result(new_incident_id), new_incident_id
+
+@counts_outcomes
+@timed("pipeline")
+async def process_alert_async(alert: dict):
+    """Same pipeline and response shape as process_alert, without blocking the event loop."""
+    timestamp = datetime.now(timezone.utc)
+    fingerprint = compute_fingerprint(alert)
+
+    # Exact repeat → skip embedding and vector search entirely
+    original_incident_id, decided_by = recent_fingerprints.get(fingerprint), "fingerprint_cache"
+    if not original_incident_id:
+        original_incident_id, decided_by = await apg.fetch_incident_by_fingerprint(fingerprint), "fingerprint_db"
+    if original_incident_id:
+        await apg.insert_duplicate_log(original_incident_id, timestamp, alert, fingerprint)
+        recent_fingerprints.add(fingerprint, original_incident_id)
+        return _duplicate_result(original_incident_id, decided_by)
+
+    # Single flight per embedding text, as in process_alert
+    alert_text = build_alert_text(alert)
+    (result, original_incident_id), shared = await single_flight.do_async(
+        alert_text, lambda: _resolve_semantic_async(alert, timestamp, fingerprint, alert_text)
+    )
+    if not shared:
+        return result
+    await apg.insert_duplicate_log(original_incident_id, timestamp, alert, fingerprint)
+    recent_fingerprints.add(fingerprint, original_incident_id)
+    return _duplicate_result(original_incident_id, "single_flight")
+
+async def _resolve_semantic_async(
+    alert: dict, timestamp: datetime, fingerprint: str, alert_text: str
+) -> tuple[dict, str]:
+    vector = await get_embedding_async(alert_text)
+
+    if not vector:
+        # Embedding failed → treat as unique
+        new_incident_id = await _store_new_log_async(timestamp, alert, fingerprint)
+        recent_fingerprints.add(fingerprint, new_incident_id)
+        return _embedding_failed_result(new_incident_id), new_incident_id
+
+    # Search for duplicates within the log's partition
+    partition = partition_key(alert)
+    matches = await index_search_async(vector, limit=1, partition=partition)
+    if matches:
+        top_match = matches[0]
+        similarity = top_match.get("similarity", 0)
+        original_incident_id = top_match.get("incident_id")
+        DEDUP_SIMILARITY.observe(similarity)
+
+        if similarity >= dedup_thresholds.threshold_for(alert, partition) and original_incident_id:
+            await apg.insert_duplicate_log(original_incident_id, timestamp, alert, fingerprint)
+            recent_fingerprints.add(fingerprint, original_incident_id)
+            return _duplicate_result(original_incident_id), original_incident_id
+
+    # Unique alert → store in cleaned_logs & vector store
+    new_incident_id = await _store_new_log_async(timestamp, alert, fingerprint, vector)
+    await index_store_async(vector, new_incident_id, alert_text, timestamp, partition)
+    recent_fingerprints.add(fingerprint, new_incident_id)
+
+    return _new_alert_result(new_incident_id), new_incident_id
+
+@counts_outcomes
+@timed("pipeline")
+def process_alerts_batch(alerts: list[dict]) -> list[dict]:
+    """
+    Deduplicate a batch of logs with one embed call, one search round trip and
+    multi-row inserts. Logs are resolved in input order, so a later log can be
+    a duplicate of an earlier one in the same batch. Results keep input order.
+    """
+    if not alerts:
+        return []
+
+    timestamp = datetime.now(timezone.utc)
+    fingerprints = [compute_fingerprint(alert) for alert in alerts]
+    results = [None] * len(alerts)
+    cleaned = []
+    duplicates = []
+
+    # Exact repeats: recent fingerprints, then Postgres, then earlier logs in the batch
+    cached = {fp: recent_fingerprints.get(fp) for fp in set(fingerprints)}
+    stored = fetch_incidents_by_fingerprints([fp for fp, incident_id in cached.items() if not incident_id])
+    leaders = {}  # fingerprint -> index of the pending log that carries it
+    followers = {}  # leader index -> exact repeats later in the batch
+    pending = []
+    for i, fingerprint in enumerate(fingerprints):
+        if fingerprint in leaders:
+            followers.setdefault(leaders[fingerprint], []).append(i)
+            continue
+        if cached[fingerprint]:
+            original_incident_id, decided_by = cached[fingerprint], "fingerprint_cache"
+        else:
+            original_incident_id, decided_by = stored.get(fingerprint), "fingerprint_db"
+        if original_incident_id:
+            duplicates.append((original_incident_id, timestamp, alerts[i], fingerprint))
+            results[i] = _duplicate_result(original_incident_id, decided_by)
+            cached[fingerprint] = original_incident_id
+        else:
+            leaders[fingerprint] = i
+            pending.append(i)
+
+    alert_texts = [build_alert_text(alerts[i]) for i in pending]
+    vectors = get_embeddings(alert_texts) if pending else []
+    originals = {}  # log index -> incident it was stored as or matched
+    generated = set()  # new ids handed out in this batch
+
+    if pending and not vectors:
+        # Embedding failed → treat all as unique
+        for i in pending:
+            new_incident_id = generate_incident_id(generated)
+            generated.add(new_incident_id)
+            cleaned.append((new_incident_id, timestamp, alerts[i], fingerprints[i]))
+            results[i] = _embedding_failed_result(new_incident_id)
+            originals[i] = new_incident_id
+        return _write_batch(alerts, fingerprints, timestamp, results, cleaned, duplicates, followers, originals, [])
+
+    # Search for duplicates in the store and among earlier new logs in the batch
+    import numpy as np
+
+    partitions = [partition_key(alerts[i]) for i in pending]
+    try:
+        store_matches = index_search_many(vectors, limit=1, partitions=partitions) if pending else []
+    except Exception as e:
+        print(f"Error searching vector store: {e}")
+        store_matches = []
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if pending:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms == 0, 1, norms)
+
+    new_rows = []  # positions in `pending` accepted as new incidents
+    new_incident_ids = []
+    new_vectors = []
+    for pos, i in enumerate(pending):
+        matches = store_matches[pos] if pos < len(store_matches) else []
+        top_match = matches[0] if matches else {}
+        similarity = top_match.get("similarity", 0)
+        original_incident_id = top_match.get("incident_id")
+
+        same_partition = [k for k, row in enumerate(new_rows) if partitions[row] == partitions[pos]]
+        if same_partition:
+            sims = matrix[[new_rows[k] for k in same_partition]] @ matrix[pos]
+            j = int(np.argmax(sims))
+            if float(sims[j]) > similarity:
+                similarity = float(sims[j])
+                original_incident_id = new_incident_ids[same_partition[j]]
+
+        if original_incident_id:
+            DEDUP_SIMILARITY.observe(similarity)
+        if similarity >= dedup_thresholds.threshold_for(alerts[i], partitions[pos]) and original_incident_id:
+            duplicates.append((original_incident_id, timestamp, alerts[i], fingerprints[i]))
+            results[i] = _duplicate_result(original_incident_id)
+            originals[i] = original_incident_id
+            continue
+
+        new_incident_id = generate_incident_id(generated)
+        generated.add(new_incident_id)
+        new_rows.append(pos)
+        new_incident_ids.append(new_incident_id)
+        cleaned.append((new_incident_id, timestamp, alerts[i], fingerprints[i]))
+        new_vectors.append((vectors[pos], new_incident_id, alert_texts[pos], timestamp, partitions[pos]))
+        results[i] = _new_alert_result(new_incident_id)
+        originals[i] = new_incident_id
+
+    return _write_batch(alerts, fingerprints, timestamp, results, cleaned, duplicates, followers, originals, new_vectors)
+
+def _write_batch(alerts, fingerprints, timestamp, results, cleaned, duplicates, followers, originals, new_vectors):
+    """Resolve in-batch exact repeats against their leader's outcome, then persist the batch."""
+    for leader, repeats in followers.items():
+        for i in repeats:
+            duplicates.append((originals[leader], timestamp, alerts[i], fingerprints[i]))
+            results[i] = _duplicate_result(originals[leader], "fingerprint_batch")
+
+    # Generated ids already taken in cleaned_logs were replaced by the write
+    renamed = insert_log_batch(cleaned, duplicates, {incident_id: vector for vector, incident_id, *_ in new_vectors})
+    if renamed:
+        for leader, repeats in followers.items():
+            for i in repeats:
+                originals[i] = originals[leader]
+        for i, incident_id in originals.items():
+            if incident_id in renamed:
+                results[i] = _result_for(results[i]["decided_by"], renamed[incident_id])
+        cleaned = [(renamed.get(incident_id, incident_id), *rest) for incident_id, *rest in cleaned]
+        duplicates = [(renamed.get(incident_id, incident_id), *rest) for incident_id, *rest in duplicates]
+        new_vectors = [(vector, renamed.get(incident_id, incident_id), *rest) for vector, incident_id, *rest in new_vectors]
+    if new_vectors:
+        try:
+            index_store_many(new_vectors)
+        except Exception as e:
+            print(f"Error storing vectors: {e}")
+    for original_incident_id, _, _, fingerprint in duplicates:
+        recent_fingerprints.add(fingerprint, original_incident_id)
+    for new_incident_id, _, _, fingerprint in cleaned:
+        recent_fingerprints.add(fingerprint, new_incident_id)
+    return results
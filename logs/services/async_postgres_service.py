@@ -0,0 +1,112 @@
+import asyncio
+import json
+import os
+import re
+
+import asyncpg
+from dotenv import load_dotenv
+
+from logs.services.metrics import timed
+from logs.services.postgres_service import (
+    CLEANED_LOG_WRITE,
+    DUPLICATE_LOG_WRITE,
+    log_write_params
+)
+
+load_dotenv()
+
+_pool = None
+_pool_lock = asyncio.Lock()
+
+
+async def _init_connection(conn):
+    # Match psycopg2's Json adapter: dicts in, dicts out
+    for type_name in ("json", "jsonb"):
+        await conn.set_type_codec(
+            type_name, encoder=lambda v: json.dumps(v, default=str), decoder=json.loads, schema="pg_catalog"
+        )
+
+
+async def get_async_pool():
+    """Return the process-wide asyncpg pool (sized by the same POSTGRES_POOL_* env vars)."""
+    global _pool
+    if _pool is None:
+        async with _pool_lock:
+            if _pool is None:
+                _pool = await asyncpg.create_pool(
+                    database=os.getenv("POSTGRES_DB"),
+                    user=os.getenv("POSTGRES_USER"),
+                    password=os.getenv("POSTGRES_PASSWORD"),
+                    host=os.getenv("POSTGRES_HOST"),
+                    port=int(os.getenv("POSTGRES_PORT") or 5432),
+                    min_size=int(os.getenv("POSTGRES_POOL_MIN_SIZE", "1")),
+                    max_size=int(os.getenv("POSTGRES_POOL_MAX_SIZE", "10")),
+                    max_inactive_connection_lifetime=float(os.getenv("POSTGRES_POOL_MAX_IDLE", "300")),
+                    init=_init_connection,
+                )
+    return _pool
+
+
+async def close_async_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+def _numbered(query):
+    """
+    Rewrite a psycopg2 query with %(name)s parameters into asyncpg's $n form;
+    returns the query and the parameter names in $n order.
+    """
+    names = []
+
+    def number(match):
+        if match.group(1) is None:
+            return "%"
+        if match.group(1) not in names:
+            names.append(match.group(1))
+        return f"${names.index(match.group(1)) + 1}"
+
+    return re.sub(r"%\((\w+)\)s|%%", number, query), names
+
+
+_CLEANED_LOG_WRITE, _CLEANED_LOG_NAMES = _numbered(CLEANED_LOG_WRITE)
+_DUPLICATE_LOG_WRITE, _DUPLICATE_LOG_NAMES = _numbered(DUPLICATE_LOG_WRITE)
+
+
+async def _write(query, names, params):
+    pool = await get_async_pool()
+    async with pool.acquire() as conn:
+        return await conn.fetchval(query, *(params[name] for name in names))
+
+
+@timed("postgres_async")
+async def insert_cleaned_log(incident_id, timestamp, alert, fingerprint=None, vector=None):
+    """Async variant of postgres_service.insert_cleaned_log."""
+    params = log_write_params(incident_id, timestamp, alert, fingerprint, vector=vector, json_adapter=lambda v: v)
+    return await _write(_CLEANED_LOG_WRITE, _CLEANED_LOG_NAMES, params)
+
+
+@timed("postgres_async")
+async def insert_duplicate_log(original_incident_id, timestamp, alert, fingerprint=None):
+    """Async variant of postgres_service.insert_duplicate_log."""
+    params = log_write_params(original_incident_id, timestamp, alert, fingerprint, duplicate=True, json_adapter=lambda v: v)
+    await _write(_DUPLICATE_LOG_WRITE, _DUPLICATE_LOG_NAMES, params)
+
+
+@timed("postgres_async")
+async def fetch_incident_by_fingerprint(fingerprint):
+    """Async variant of postgres_service.fetch_incident_by_fingerprint."""
+    pool = await get_async_pool()
+    return await pool.fetchval("""
+        SELECT incident_id FROM (
+            (SELECT id AS incident_id, 0 AS priority
+             FROM cleaned_logs WHERE fingerprint = $1 LIMIT 1)
+            UNION ALL
+            (SELECT incident_id, 1
+             FROM duplicate_logs WHERE fingerprint = $1 LIMIT 1)
+        ) m
+        ORDER BY priority
+        LIMIT 1
+    """, fingerprint)
@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CHAT_CACHE_ENABLED = os.getenv("CHAT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+def normalize_query(query: str) -> str:
+    """Case, whitespace and trailing punctuation do not change the answer."""
+    return re.sub(r"\s+", " ", query or "").strip().rstrip("?!. ").lower()
+
+
+def context_hash(row) -> str:
+    """sha256 of the canonical JSON of the incident row used as chat context."""
+    canonical = json.dumps(row, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def chat_cache_key(incident_id: str, query: str, context_digest: str, model: str, prompt_version: str) -> str:
+    parts = [incident_id or "", normalize_query(query), context_digest, model, prompt_version]
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+class ChatAnswerCache:
+    """Bounded LRU of cache key -> answer, in front of an optional durable lookup.
+
+    Keys include a hash of the incident row, so a changed row never matches an
+    old answer; entries of an incident are also dropped as soon as it is seen
+    with a different row hash. fallback(key, ttl_seconds) is consulted on a
+    memory miss (e.g. earlier answers stored in chat_messages).
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 0, fallback=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.fallback = fallback
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (answer, incident_id, stored_at)
+        self._context = {}  # incident_id -> last seen context hash
+        self._stats = {"hits": 0, "fallback_hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def observe(self, incident_id: str, context_digest: str) -> None:
+        """Record the incident's current row hash, dropping its answers if the row changed."""
+        with self._lock:
+            previous = self._context.get(incident_id)
+            self._context[incident_id] = context_digest
+            if previous is not None and previous != context_digest:
+                stale = [k for k, (_, owner, _) in self._entries.items() if owner == incident_id]
+                for key in stale:
+                    del self._entries[key]
+                self._stats["invalidations"] += len(stale)
+
+    def get(self, key: str, incident_id: str | None = None) -> str | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                answer, _, stored_at = entry
+                if self.ttl_seconds <= 0 or time.time() - stored_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return answer
+                del self._entries[key]
+
+        answer = None
+        if self.fallback is not None:
+            try:
+                answer = self.fallback(key, self.ttl_seconds)
+            except Exception as e:
+                print(f"Error reading chat cache: {e}")
+        with self._lock:
+            if answer is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+            self._stats["fallback_hits"] += 1
+        self.put(key, answer, incident_id)
+        return answer
+
+    def put(self, key: str, answer: str, incident_id: str) -> None:
+        with self._lock:
+            self._entries[key] = (answer, incident_id, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["max_entries"] = self.max_entries
+        stats["ttl_seconds"] = self.ttl_seconds
+        stats["enabled"] = CHAT_CACHE_ENABLED
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
@@ -0,0 +1,232 @@
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from collections import deque
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", "1024"))
+CONTEXT_MAX_VALUE_CHARS = int(os.getenv("CHAT_CONTEXT_MAX_VALUE_CHARS", "300"))
+CONTEXT_MAX_LIST_ITEMS = int(os.getenv("CHAT_CONTEXT_MAX_LIST_ITEMS", "5"))
+CONTEXT_INCLUDE_DUPLICATES = os.getenv("CHAT_CONTEXT_INCLUDE_DUPLICATES", "true").lower() in ("1", "true", "yes")
+CONTEXT_DUPLICATE_VARIANTS = int(os.getenv("CHAT_CONTEXT_DUPLICATE_VARIANTS", "3"))
+# Rough llama tokenizer ratio for English/JSON text; no tokenizer is loaded.
+CHARS_PER_TOKEN = float(os.getenv("CHAT_CONTEXT_CHARS_PER_TOKEN", "4"))
+
+# Top-level columns in the order they are kept when the budget runs out.
+# (unquoted camelCase columns come back lowercased from Postgres)
+FIELD_PRIORITY = [
+    "id", "level", "message", "appname", "servicename", "job", "label",
+    "date", "time", "kubernetesdetails",
+]
+# Always included, whatever the query asks about.
+PINNED_FIELDS = {"id", "level", "message"}
+# Internal columns that never help the model.
+EXCLUDED_FIELDS = {"fingerprint", "embedding", "embedding_model", "embedding_dim", "embedding_version"}
+
+STOPWORDS = {
+    "the", "and", "for", "was", "why", "what", "when", "where", "which", "who", "how",
+    "this", "that", "with", "from", "are", "is", "did", "does", "can", "you", "about",
+    "log", "logs", "incident", "tell", "show", "give", "please",
+}
+
+# Changes whenever the rendered context for the same row would change.
+CONTEXT_BUILDER_VERSION = hashlib.sha256(
+    json.dumps([
+        1, CONTEXT_TOKEN_BUDGET, CONTEXT_MAX_VALUE_CHARS, CONTEXT_MAX_LIST_ITEMS,
+        CONTEXT_INCLUDE_DUPLICATES, CONTEXT_DUPLICATE_VARIANTS, CHARS_PER_TOKEN, FIELD_PRIORITY,
+    ]).encode("utf-8")
+).hexdigest()[:12]
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text or "") / CHARS_PER_TOKEN)
+
+
+def query_terms(query: str) -> set[str]:
+    words = re.findall(r"[a-z0-9]+", (query or "").lower())
+    return {w for w in words if len(w) >= 3 and w not in STOPWORDS}
+
+
+def _path_words(path: str) -> set[str]:
+    spaced = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", path)
+    return set(re.findall(r"[a-z0-9]+", spaced.lower()))
+
+
+def _parse_json(value):
+    if isinstance(value, str) and value[:1] in ("{", "["):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _flatten(value, path: str):
+    """Yield (path, scalar) leaves of nested JSON; long lists are cut to CONTEXT_MAX_LIST_ITEMS."""
+    if isinstance(value, dict):
+        for key, child in value.items():
+            yield from _flatten(child, f"{path}.{key}")
+    elif isinstance(value, list):
+        for i, child in enumerate(value[:CONTEXT_MAX_LIST_ITEMS]):
+            yield from _flatten(child, f"{path}[{i}]")
+        if len(value) > CONTEXT_MAX_LIST_ITEMS:
+            yield path, f"... {len(value) - CONTEXT_MAX_LIST_ITEMS} more items"
+    elif value is not None and value != "":
+        yield path, value
+
+
+def _truncate(text: str, limit: int) -> tuple[str, bool]:
+    if len(text) <= limit:
+        return text, False
+    return text[: max(0, limit - 3)] + "...", True
+
+
+def _duplicates_line(duplicates: dict | None) -> str | None:
+    if not duplicates or not duplicates.get("count"):
+        return None
+    line = (
+        f"duplicates: {duplicates['count']} occurrences, "
+        f"first seen {duplicates['first_seen']}, last seen {duplicates['last_seen']}"
+    )
+    variants = [
+        f"\"{_truncate(str(text), 80)[0]}\" ({n})" for text, n in duplicates.get("variants") or [] if text
+    ]
+    if variants:
+        line += "; common messages: " + ", ".join(variants)
+    return line
+
+
+def build_context(row: dict | None, query: str, duplicates: dict | None = None, budget: int | None = None):
+    """Render the incident row as prompt context within a token budget.
+
+    Nested JSON is flattened to dotted paths and every value is cut to
+    CONTEXT_MAX_VALUE_CHARS. Lines are then kept in order of: pinned fields,
+    fields whose path mentions a query term, fields whose value mentions one,
+    and finally FIELD_PRIORITY order (shallow paths first). Returns
+    (context_text, info) where info describes what was kept and dropped.
+    """
+    budget = CONTEXT_TOKEN_BUDGET if budget is None else budget
+    if not row:
+        text = "No related incident found."
+        return text, {"tokens": estimate_tokens(text), "raw_tokens": 0, "budget": budget, "fields_total": 0,
+                      "fields_included": 0, "fields_truncated": 0, "fields_dropped": 0, "duplicates": False}
+
+    raw_tokens = estimate_tokens("\n".join(f"{key}: {value}" for key, value in row.items()))
+    terms = query_terms(query)
+    candidates = []
+    for key, value in row.items():
+        if key in EXCLUDED_FIELDS:
+            continue
+        base = FIELD_PRIORITY.index(key) if key in FIELD_PRIORITY else len(FIELD_PRIORITY)
+        for path, leaf in _flatten(_parse_json(value), key):
+            text = leaf.isoformat() if hasattr(leaf, "isoformat") else str(leaf)
+            if key in PINNED_FIELDS:
+                relevance = 3
+            elif terms & _path_words(path):
+                relevance = 2
+            elif any(term in text.lower() for term in terms):
+                relevance = 1
+            else:
+                relevance = 0
+            depth = path.count(".") + path.count("[")
+            line, truncated = _truncate(f"{path}: {text}", len(path) + 2 + CONTEXT_MAX_VALUE_CHARS)
+            candidates.append(((-relevance, base, depth, len(candidates)), line, truncated))
+    candidates.sort(key=lambda c: c[0])
+
+    lines, remaining = [], budget
+    dup_line = _duplicates_line(duplicates)
+    if dup_line:
+        dup_line = _truncate(dup_line, int(budget // 4 * CHARS_PER_TOKEN))[0]
+        remaining -= estimate_tokens(dup_line) + 1
+    if sum(estimate_tokens(line) + 1 for _, line, _ in candidates) > remaining:
+        remaining -= estimate_tokens("(9999 more fields omitted)") + 1
+
+    truncated_count = dropped = 0
+    for _, line, truncated in candidates:
+        cost = estimate_tokens(line) + 1
+        if cost > remaining:
+            # Keep a useful prefix of the line rather than dropping it outright
+            room = int((remaining - 1) * CHARS_PER_TOKEN)
+            if room < 40:
+                dropped += 1
+                continue
+            line, truncated = _truncate(line, room)[0], True
+            cost = estimate_tokens(line) + 1
+        lines.append(line)
+        remaining -= cost
+        truncated_count += truncated
+
+    if dup_line:
+        lines.append(dup_line)
+    if dropped:
+        lines.append(f"({dropped} more fields omitted)")
+    text = "\n".join(lines)
+    return text, {
+        "tokens": estimate_tokens(text),
+        "raw_tokens": raw_tokens,
+        "budget": budget,
+        "fields_total": len(candidates),
+        "fields_included": len(candidates) - dropped,
+        "fields_truncated": truncated_count,
+        "fields_dropped": dropped,
+        "duplicates": bool(dup_line),
+    }
+
+
+class ContextMetrics:
+    """Rolling prompt-size statistics over the last `window` chat requests."""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._context_tokens = deque(maxlen=window)
+        self._prompt_tokens = deque(maxlen=window)
+        self._stats = {
+            "requests": 0, "raw_tokens_total": 0, "context_tokens_total": 0,
+            "fields_truncated": 0, "fields_dropped": 0, "budget_limited": 0,
+        }
+
+    def record(self, info: dict, prompt_tokens: int) -> None:
+        with self._lock:
+            self._context_tokens.append(info["tokens"])
+            self._prompt_tokens.append(prompt_tokens)
+            self._stats["requests"] += 1
+            self._stats["raw_tokens_total"] += info["raw_tokens"]
+            self._stats["context_tokens_total"] += info["tokens"]
+            self._stats["fields_truncated"] += info["fields_truncated"]
+            self._stats["fields_dropped"] += info["fields_dropped"]
+            self._stats["budget_limited"] += bool(info["fields_truncated"] or info["fields_dropped"])
+
+    @staticmethod
+    def _summary(values) -> dict:
+        if not values:
+            return {"avg": 0, "p50": 0, "p95": 0, "max": 0}
+        ordered = sorted(values)
+        return {
+            "avg": round(sum(ordered) / len(ordered), 1),
+            "p50": ordered[len(ordered) // 2],
+            "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+            "max": ordered[-1],
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            context_tokens = list(self._context_tokens)
+            prompt_tokens = list(self._prompt_tokens)
+        raw = stats["raw_tokens_total"]
+        stats["tokens_saved_ratio"] = round(1 - stats["context_tokens_total"] / raw, 4) if raw else 0.0
+        stats["context_tokens"] = self._summary(context_tokens)
+        stats["prompt_tokens"] = self._summary(prompt_tokens)
+        stats["budget"] = CONTEXT_TOKEN_BUDGET
+        stats["include_duplicates"] = CONTEXT_INCLUDE_DUPLICATES
+        stats["builder_version"] = CONTEXT_BUILDER_VERSION
+        return stats
+
+
+context_metrics = ContextMetrics(window=int(os.getenv("CHAT_CONTEXT_METRICS_WINDOW", "1000")))
@@ -1,79 +1,192 @@
+import json
+import os
+import time
 from psycopg2.extras import RealDictCursor
-import ollama
 from logs.pydantic_files.chat_service import ChatRequest, ChatResponse
-from logs.services.postgres_service import get_pg_connection
-from logs.services.prompts import QUERY_PROMPT
+from logs.services.chat_cache import CHAT_CACHE_ENABLED, ChatAnswerCache, chat_cache_key, context_hash
+from logs.services.chat_context import (
+    CONTEXT_BUILDER_VERSION, CONTEXT_DUPLICATE_VARIANTS, CONTEXT_INCLUDE_DUPLICATES,
+    build_context, context_metrics, estimate_tokens,
+)
+from logs.services.metrics import STAGE_SECONDS, record_error, timed, track
+from logs.services.postgres_service import LOG_COLUMNS, fetch_duplicate_summary, pg_cursor
+from logs.services.prompts import QUERY_PROMPT, QUERY_PROMPT_VERSION
 
-def add_chat_message(chat_req: ChatRequest, model: str = "llama3:latest") -> ChatResponse:
+@timed("chat")
+def _fetch_context_row(incident_id: str) -> dict | None:
     # Fetch the row for the given id
-    conn = get_pg_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    cur.execute(
-        """
-        SELECT *
-        FROM cleaned_logs
-        WHERE id = %s
-        """,
-        (chat_req.incident_id,),
-    )
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
-
-    # Prepare context for LLM
-    if row:
-        context_text = "\n".join(f"{key}: {value}" for key, value in row.items())
-    else:
-        context_text = "No related incident found."
-
-    # Get LLM response
-    llama_response = ollama.chat(
-        model=model,
-        messages=[
-            {
-                "role": "user",
-                "content": QUERY_PROMPT.format(
-                    context_str=context_text,
-                    query_str=chat_req.query
-                )
-            }
-        ]
+    with pg_cursor(RealDictCursor) as cur:
+        cur.execute(
+            f"""
+            SELECT id, {LOG_COLUMNS}
+            FROM cleaned_logs
+            WHERE id = %s
+            """,
+            (incident_id,),
+        )
+        return cur.fetchone()
+
+@timed("chat")
+def _fetch_duplicates(incident_id: str, row: dict | None) -> dict | None:
+    # Compact duplicate summary for the context; chat still works without it
+    if not (row and CONTEXT_INCLUDE_DUPLICATES):
+        return None
+    try:
+        return fetch_duplicate_summary(incident_id, top=CONTEXT_DUPLICATE_VARIANTS)
+    except Exception as e:
+        print(f"Error fetching duplicate summary: {e}")
+        record_error("chat", "_fetch_duplicates")
+        return None
+
+def _build_messages(query: str, row: dict | None, duplicates: dict | None = None) -> list[dict]:
+    # Prepare context for LLM within the configured token budget
+    context_text, info = build_context(row, query, duplicates)
+    content = QUERY_PROMPT.format(
+        context_str=context_text,
+        query_str=query
     )
-    response_text = llama_response["message"]["content"]
+    context_metrics.record(info, estimate_tokens(content))
+
+    return [
+        {
+            "role": "user",
+            "content": content
+        }
+    ]
 
+@timed("chat")
+def _save_chat_message(
+    incident_id: str, query: str, response_text: str, cache_key: str | None = None, cached: bool = False
+) -> ChatResponse:
     # Save chat response to DB
-    conn = get_pg_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    cur.execute(
-        """
-        INSERT INTO chat_messages (incident_id, query, response)
-        VALUES (%s, %s, %s)
-        RETURNING id, incident_id, query, response, timestamp
-        """,
-        (chat_req.incident_id, chat_req.query, response_text),
-    )
-    saved_row = cur.fetchone()
-    conn.commit()
-    cur.close()
-    conn.close()
+    with pg_cursor(RealDictCursor) as cur:
+        cur.execute(
+            """
+            INSERT INTO chat_messages (incident_id, query, response, cache_key, cached)
+            VALUES (%s, %s, %s, %s, %s)
+            RETURNING id, incident_id, query, response, timestamp, cached
+            """,
+            (incident_id, query, response_text, cache_key, cached),
+        )
+        saved_row = cur.fetchone()
 
     return ChatResponse(**saved_row)
 
+@timed("chat")
+def _lookup_cached_answer(cache_key: str, ttl_seconds: float) -> str | None:
+    """Most recent answer stored under cache_key (optionally no older than ttl_seconds)."""
+    with pg_cursor() as cur:
+        cur.execute(
+            """
+            SELECT response FROM chat_messages
+            WHERE cache_key = %s
+              AND (%s <= 0 OR timestamp >= now() - make_interval(secs => %s))
+            ORDER BY id DESC
+            LIMIT 1
+            """,
+            (cache_key, ttl_seconds, ttl_seconds),
+        )
+        row = cur.fetchone()
+    return row[0] if row else None
+
+chat_answer_cache = ChatAnswerCache(
+    max_entries=int(os.getenv("CHAT_CACHE_SIZE", "1000")),
+    ttl_seconds=float(os.getenv("CHAT_CACHE_TTL", "0")),
+    fallback=_lookup_cached_answer,
+)
+
+def _cached_answer(
+    chat_req: ChatRequest, row: dict | None, duplicates: dict | None, model: str
+) -> tuple[str | None, str | None]:
+    """(cache_key, cached answer or None); (None, None) when the cache is disabled."""
+    if not CHAT_CACHE_ENABLED:
+        return None, None
+    # A new duplicate changes the rendered context, so it invalidates too
+    digest = context_hash({"row": row, "duplicates": duplicates})
+    chat_answer_cache.observe(chat_req.incident_id, digest)
+    key = chat_cache_key(
+        chat_req.incident_id, chat_req.query, digest, model, f"{QUERY_PROMPT_VERSION}:{CONTEXT_BUILDER_VERSION}"
+    )
+    return key, chat_answer_cache.get(key, chat_req.incident_id)
+
+@timed("chat")
+def add_chat_message(chat_req: ChatRequest, model: str = "llama3:latest") -> ChatResponse:
+    row = _fetch_context_row(chat_req.incident_id)
+    duplicates = _fetch_duplicates(chat_req.incident_id, row)
+
+    # Same question about an unchanged incident: reuse the earlier answer
+    cache_key, answer = _cached_answer(chat_req, row, duplicates, model)
+    if answer is not None:
+        return _save_chat_message(chat_req.incident_id, chat_req.query, answer, cache_key, cached=True)
+
+    # Get LLM response (ollama is imported on first use to keep startup fast)
+    import ollama
+    messages = _build_messages(chat_req.query, row, duplicates)
+    with track("chat", "llm"):
+        llama_response = ollama.chat(model=model, messages=messages)
+    response_text = llama_response["message"]["content"]
+
+    saved = _save_chat_message(chat_req.incident_id, chat_req.query, response_text, cache_key)
+    if cache_key:
+        chat_answer_cache.put(cache_key, response_text, chat_req.incident_id)
+    return saved
+
+def stream_chat_message(chat_req: ChatRequest, model: str = "llama3:latest"):
+    """Stream the LLM answer as NDJSON lines: {"token": ...} per chunk as it is
+    generated, then {"done": true, "message": <ChatResponse>} once the full
+    response has been saved. On failure a final {"error": ...} line is sent and
+    nothing is saved. The incident context is loaded before the first line;
+    a cached answer is sent as a single token line."""
+    row = _fetch_context_row(chat_req.incident_id)
+    duplicates = _fetch_duplicates(chat_req.incident_id, row)
+    cache_key, answer = _cached_answer(chat_req, row, duplicates, model)
+    if answer is not None:
+        return _stream_cached(chat_req, cache_key, answer)
+    return _stream_chat(chat_req, _build_messages(chat_req.query, row, duplicates), model, cache_key)
+
+def _stream_cached(chat_req: ChatRequest, cache_key: str, answer: str):
+    yield json.dumps({"token": answer}) + "\n"
+    saved = _save_chat_message(chat_req.incident_id, chat_req.query, answer, cache_key, cached=True)
+    yield json.dumps({"done": True, "message": saved.model_dump(mode="json")}) + "\n"
+
+def _stream_chat(chat_req: ChatRequest, messages: list[dict], model: str, cache_key: str | None = None):
+    import ollama
+
+    parts = []
+    start = time.perf_counter()
+    try:
+        for chunk in ollama.chat(model=model, messages=messages, stream=True):
+            token = chunk["message"]["content"]
+            if token:
+                if not parts:
+                    STAGE_SECONDS.observe(time.perf_counter() - start, "chat", "llm_first_token")
+                parts.append(token)
+                yield json.dumps({"token": token}) + "\n"
+        STAGE_SECONDS.observe(time.perf_counter() - start, "chat", "llm_stream")
+    except Exception as e:
+        print(f"Error streaming chat response: {e}")
+        record_error("chat", "llm_stream")
+        yield json.dumps({"error": str(e)}) + "\n"
+        return
+
+    response_text = "".join(parts)
+    saved = _save_chat_message(chat_req.incident_id, chat_req.query, response_text, cache_key)
+    if cache_key:
+        chat_answer_cache.put(cache_key, response_text, chat_req.incident_id)
+    yield json.dumps({"done": True, "message": saved.model_dump(mode="json")}) + "\n"
+
 def get_chat_messages(incident_id: str) -> list[ChatResponse]:
     """Fetch all chat history for an incident from Postgres chat_messages table"""
-    conn = get_pg_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    cur.execute(
-        """
-        SELECT id, incident_id, query, response, timestamp
-        FROM chat_messages
-        WHERE incident_id = %s
-        ORDER BY timestamp ASC
-        """,
-        (incident_id,),
-    )
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
+    with pg_cursor(RealDictCursor) as cur:
+        cur.execute(
+            """
+            SELECT id, incident_id, query, response, timestamp, cached
+            FROM chat_messages
+            WHERE incident_id = %s
+            ORDER BY timestamp ASC
+            """,
+            (incident_id,),
+        )
+        rows = cur.fetchall()
 
-    return [ChatResponse(**row) for row in rows]
\ No newline at end of file
+    return [ChatResponse(**row) for row in rows]
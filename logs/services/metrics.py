@@ -0,0 +1,207 @@
+import functools
+import inspect
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Seconds; dense below 100ms where Postgres lookups and cached embeddings land
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Cosine similarity of the best vector match; dense around the dedup threshold
+SIMILARITY_BUCKETS = (0.5, 0.6, 0.7, 0.75, 0.8, 0.825, 0.85, 0.875, 0.9, 0.925, 0.95, 0.975, 0.99, 1.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names, values, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with optional labels, in Prometheus text format."""
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._values = {}  # label values -> count
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self) -> list[str]:
+        with self._lock:
+            values = dict(self._values)
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    """Fixed-bucket histogram with optional labels; observe() is one bisect under a lock."""
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value: float, *labels) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def collect(self) -> list[str]:
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class StatsGauges:
+    """Exports the numeric values of an existing stats() dict as gauges, read at scrape time."""
+
+    def __init__(self, prefix: str, help_text: str, stats):
+        self.prefix = prefix
+        self.help = help_text
+        self.stats = stats
+
+    def collect(self) -> list[str]:
+        try:
+            stats = self.stats()
+        except Exception as e:
+            print(f"Error collecting {self.prefix} metrics: {e}")
+            return []
+        lines = []
+        for key, value in stats.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = f"{self.prefix}_{key}"
+            lines += [f"# HELP {name} {self.help} ({key})", f"# TYPE {name} gauge", f"{name} {_number(value)}"]
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "aiops_stage_duration_seconds", "Wall time of instrumented pipeline stages.", ("component", "stage")
+)
+STAGE_ERRORS = Counter(
+    "aiops_stage_errors_total", "Exceptions raised or swallowed by instrumented stages.", ("component", "stage")
+)
+DEDUP_OUTCOMES = Counter(
+    "aiops_dedup_outcomes_total", "Deduplication decisions by outcome and deciding tier.", ("outcome", "decided_by")
+)
+DEDUP_SIMILARITY = Histogram(
+    "aiops_dedup_similarity", "Best vector-match similarity seen by the semantic check.", (), SIMILARITY_BUCKETS
+)
+
+_collectors = [STAGE_SECONDS, STAGE_ERRORS, DEDUP_OUTCOMES, DEDUP_SIMILARITY]
+
+
+def register(collector) -> None:
+    _collectors.append(collector)
+
+
+def render() -> str:
+    """All registered metrics in Prometheus text exposition format 0.0.4."""
+    lines = []
+    for collector in list(_collectors):
+        lines.extend(collector.collect())
+    return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def track(component: str, stage: str):
+    """Time a block as one observation of (component, stage); exceptions are counted and re-raised."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(component, stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, component, stage)
+
+
+def timed(component: str, stage: str | None = None):
+    """Decorator form of track() for plain and async functions (stage defaults to the function name)."""
+    def decorator(fn):
+        name = stage or fn.__name__
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with track(component, name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with track(component, name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_error(component: str, stage: str) -> None:
+    """Count an error that the stage handled itself (logged and swallowed)."""
+    STAGE_ERRORS.inc(component, stage)
+
+
+_OUTCOMES = {
+    "semantic": "semantic_duplicate", "single_flight": "coalesced_duplicate",
+    "new": "new", "embedding_failed": "embedding_failed",
+}
+
+
+def record_outcome(result: dict) -> dict:
+    """Count one process_alert result; any other decided_by is an exact-duplicate tier."""
+    decided_by = result.get("decided_by", "")
+    DEDUP_OUTCOMES.inc(_OUTCOMES.get(decided_by, "exact_duplicate"), decided_by)
+    return result
+
+
+def counts_outcomes(fn):
+    """Decorator recording the outcome of every result a process_alert* function returns."""
+    def record(result):
+        for item in result if isinstance(result, list) else [result]:
+            record_outcome(item)
+        return result
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            return record(await fn(*args, **kwargs))
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return record(fn(*args, **kwargs))
+    return wrapper
@@ -0,0 +1,273 @@
+import math
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from dotenv import load_dotenv
+
+from logs.services.weaviate_client import (
+    PARTITION_PROPERTY, TIME_PROPERTY, weaviate_store, weaviate_store_many, weaviate_iter_objects, window_cutoff
+)
+from logs.services.write_behind import WRITE_BEHIND, buffered_store, buffered_store_many
+
+load_dotenv()
+
+WRITE_THROUGH = os.getenv("VECTOR_INDEX_WRITE_THROUGH", "true").lower() in ("1", "true", "yes")
+
+
+class NumpyVectorIndex:
+    """In-process exact nearest-neighbour index.
+
+    Vectors live in one contiguous float32 matrix whose rows are L2
+    normalized, so cosine similarity against every stored incident is a
+    single matrix-vector product. Capacity doubles when full, so appends are
+    amortized O(1). Each row also keeps its creation time (epoch seconds,
+    NaN if unknown) and partition key, so searches can be limited to a time
+    window and to rows of the same partition.
+    """
+
+    def __init__(self, dim: int | None = None, initial_capacity: int = 1024):
+        self._lock = threading.RLock()
+        self._dim = dim
+        self._initial_capacity = max(1, initial_capacity)
+        self._matrix = np.empty((0, dim or 0), dtype=np.float32)
+        self._times = np.empty(0, dtype=np.float64)
+        self._partitions = np.empty(0, dtype=object)
+        self._size = 0
+        self._props: list[dict] = []
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def dim(self) -> int | None:
+        return self._dim
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def _reserve(self, extra: int) -> None:
+        needed = self._size + extra
+        capacity = self._matrix.shape[0]
+        if needed <= capacity:
+            return
+        new_capacity = max(self._initial_capacity, capacity)
+        while new_capacity < needed:
+            new_capacity *= 2
+        grown = np.empty((new_capacity, self._dim), dtype=np.float32)
+        grown[: self._size] = self._matrix[: self._size]
+        self._matrix = grown
+        times = np.empty(new_capacity, dtype=np.float64)
+        times[: self._size] = self._times[: self._size]
+        self._times = times
+        partitions = np.empty(new_capacity, dtype=object)
+        partitions[: self._size] = self._partitions[: self._size]
+        self._partitions = partitions
+
+    def add_many(self, vectors, props: list[dict], times=None, partitions=None) -> None:
+        """Append vectors with their props; times (epoch seconds) default to now,
+        partitions (one key per vector) to None."""
+        if len(vectors) == 0:
+            return
+        batch = np.asarray(vectors, dtype=np.float32)
+        if batch.ndim == 1:
+            batch = batch[None, :]
+        with self._lock:
+            if self._dim is None:
+                self._dim = batch.shape[1]
+                self._matrix = np.empty((0, self._dim), dtype=np.float32)
+            if batch.shape[1] != self._dim:
+                raise ValueError(f"Vector dimension {batch.shape[1]} does not match index dimension {self._dim}")
+            self._reserve(len(batch))
+            self._matrix[self._size : self._size + len(batch)] = self._normalize(batch)
+            self._times[self._size : self._size + len(batch)] = time.time() if times is None else times
+            self._partitions[self._size : self._size + len(batch)] = partitions or [None] * len(batch)
+            self._size += len(batch)
+            self._props.extend(dict(p) for p in props)
+
+    def add(self, vector, props: dict, created_at: float | None = None, partition: str | None = None) -> None:
+        self.add_many([vector], [props], None if created_at is None else [created_at], [partition])
+
+    def search_many(
+        self, vectors, limit: int = 1, since: float | None = None, partitions: list | None = None
+    ) -> list[list[dict]]:
+        """Top `limit` matches per query; with since, only rows created at or after it;
+        with partitions, only rows whose partition equals the query's entry (None = any)."""
+        if len(vectors) == 0:
+            return []
+        queries = np.asarray(vectors, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+        with self._lock:
+            if self._size == 0 or queries.shape[1] != self._dim:
+                return [[] for _ in range(len(queries))]
+            sims = self._normalize(queries) @ self._matrix[: self._size].T
+            props = self._props
+            if since is not None:
+                # NaN (unknown) times compare False, so those rows are outside any window
+                sims[:, ~(self._times[: self._size] >= since)] = -np.inf
+            if partitions is not None:
+                row_partitions = self._partitions[: self._size]
+                for partition in set(partitions) - {None}:
+                    queries_in = [q for q, p in enumerate(partitions) if p == partition]
+                    sims[np.ix_(queries_in, row_partitions != partition)] = -np.inf
+
+        k = min(limit, sims.shape[1])
+        if k < sims.shape[1]:
+            top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(sims.shape[1]), (len(sims), k))
+        results = []
+        for row, candidates in zip(sims, top):
+            ordered = candidates[np.argsort(-row[candidates])]
+            matches = []
+            for idx in ordered:
+                similarity = float(row[idx])
+                if similarity == -np.inf:
+                    break
+                matches.append({
+                    **props[idx],
+                    "_additional": {"distance": 1.0 - similarity},
+                    "similarity": max(0.0, similarity),
+                })
+            results.append(matches)
+        return results
+
+    def search(self, vector, limit: int = 1, since: float | None = None, partition: str | None = None) -> list[dict]:
+        return self.search_many([vector], limit=limit, since=since, partitions=[partition])[0]
+
+    def expire(self, before: float) -> int:
+        """Drop rows created before `before` (epoch seconds); returns the number removed."""
+        with self._lock:
+            keep = ~(self._times[: self._size] < before)
+            removed = self._size - int(keep.sum())
+            if removed:
+                kept = int(self._size - removed)
+                self._matrix[:kept] = self._matrix[: self._size][keep]
+                self._times[:kept] = self._times[: self._size][keep]
+                self._partitions[:kept] = self._partitions[: self._size][keep]
+                self._props = [p for p, k in zip(self._props, keep) if k]
+                self._size = kept
+            return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._matrix = np.empty((0, self._dim or 0), dtype=np.float32)
+            self._times = np.empty(0, dtype=np.float64)
+            self._partitions = np.empty(0, dtype=object)
+            self._size = 0
+            self._props = []
+
+    def stats(self) -> dict:
+        with self._lock:
+            times = self._times[: self._size]
+            known = times[~np.isnan(times)]
+            return {
+                "size": self._size,
+                "oldest_age_seconds": round(time.time() - float(known.min()), 1) if len(known) else None,
+                "partitions": len(set(self._partitions[: self._size]) - {None}),
+                "capacity": int(self._matrix.shape[0]),
+                "dim": self._dim,
+                "memory_bytes": int(self._matrix.nbytes),
+            }
+
+
+index = NumpyVectorIndex(initial_capacity=int(os.getenv("VECTOR_INDEX_INITIAL_CAPACITY", "1024")))
+
+
+def _epoch(value) -> float:
+    """Epoch seconds of a datetime or ISO string; NaN when missing or unparseable."""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return math.nan
+    if isinstance(value, datetime):
+        return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp()
+    return math.nan
+
+
+def _partition(rest):
+    # Optional fifth element of a stored object tuple
+    return rest[0] if rest else None
+
+
+def _since() -> float | None:
+    cutoff = window_cutoff()
+    return cutoff.timestamp() if cutoff else None
+
+
+def index_store(vector, incident_id, alert_text, timestamp, partition=None):
+    """Same contract as weaviate_store; writes through to Weaviate when enabled."""
+    try:
+        index.add(
+            vector, {"incident_id": incident_id, "message": alert_text, PARTITION_PROPERTY: partition},
+            _epoch(timestamp), partition
+        )
+    except Exception as e:
+        print(f"Error storing vector in index: {e}")
+    if WRITE_THROUGH:
+        (buffered_store if WRITE_BEHIND else weaviate_store)(vector, incident_id, alert_text, timestamp, partition)
+
+
+def index_store_many(objects):
+    """Same contract as weaviate_store_many."""
+    objects = list(objects)
+    if not objects:
+        return
+    try:
+        index.add_many(
+            [vector for vector, *_ in objects],
+            [
+                {"incident_id": incident_id, "message": alert_text, PARTITION_PROPERTY: _partition(rest)}
+                for _, incident_id, alert_text, _, *rest in objects
+            ],
+            [_epoch(timestamp) for _, _, _, timestamp, *_ in objects],
+            [_partition(rest) for _, _, _, _, *rest in objects]
+        )
+    except Exception as e:
+        print(f"Error storing vectors in index: {e}")
+    if WRITE_THROUGH:
+        (buffered_store_many if WRITE_BEHIND else weaviate_store_many)(objects)
+
+
+def index_search(vector, limit=1, partition=None):
+    """Same contract as weaviate_search, including the dedup window."""
+    if not vector:
+        return []
+    return index.search(vector, limit=limit, since=_since(), partition=partition)
+
+
+def index_search_many(vectors, limit=1, partitions=None):
+    """Same contract as weaviate_search_many."""
+    return index.search_many(vectors, limit=limit, since=_since(), partitions=partitions)
+
+
+def expire_index(cutoff):
+    """Drop in-process rows whose timestamp is before cutoff; returns the number removed."""
+    return index.expire(cutoff.timestamp())
+
+
+def load_index_from_weaviate(batch_size: int = 1000) -> int:
+    """Populate the index from every Incident stored in Weaviate; returns the row count."""
+    index.clear()
+    vectors, props, times = [], [], []
+    for vector, properties in weaviate_iter_objects(batch_size=batch_size):
+        if not vector or not properties.get("incident_id"):
+            continue
+        vectors.append(vector)
+        props.append({
+            "incident_id": properties.get("incident_id"),
+            "message": properties.get("message"),
+            PARTITION_PROPERTY: properties.get(PARTITION_PROPERTY),
+        })
+        times.append(_epoch(properties.get(TIME_PROPERTY)))
+        if len(vectors) >= batch_size:
+            index.add_many(vectors, props, times, [p[PARTITION_PROPERTY] for p in props])
+            vectors, props, times = [], [], []
+    index.add_many(vectors, props, times, [p[PARTITION_PROPERTY] for p in props])
+    return len(index)
@@ -1,12 +1,39 @@
 import psycopg2
-from psycopg2.extras import Json, RealDictCursor
+from psycopg2.extras import Json, RealDictCursor, execute_values
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
+from logs.services.db_pool import PgPool
+from logs.services.embedding_cache import EMBEDDING_MODEL, EMBEDDING_MODEL_VERSION
+from logs.services.metrics import timed
+import base64
+import json
 import os
+import threading
+import uuid
 
 load_dotenv()
 
+# Which duplicates keep a full duplicate_logs row: "all" (every occurrence) or
+# "sampled" (only those selected by the DUPLICATE_SAMPLE_* policy below).
+# Every occurrence is counted in duplicate_log_aggregates either way.
+DUPLICATE_PAYLOADS = os.getenv("DUPLICATE_PAYLOADS", "all").lower()
+# Sampled mode: keep the first N occurrences of an incident per day...
+DUPLICATE_SAMPLE_FIRST = int(os.getenv("DUPLICATE_SAMPLE_FIRST", "1"))
+# ...every Nth occurrence after that (0 = off)...
+DUPLICATE_SAMPLE_EVERY = int(os.getenv("DUPLICATE_SAMPLE_EVERY", "0"))
+# ...and any occurrence whose fingerprint is not stored yet, so exact-match
+# lookups still find every distinct variant
+DUPLICATE_SAMPLE_NEW_FINGERPRINTS = os.getenv("DUPLICATE_SAMPLE_NEW_FINGERPRINTS", "true").lower() in ("1", "true", "yes")
+# Recent occurrences kept inline in each aggregate row (shown by /alerts/grouped)
+DUPLICATE_RING_SIZE = int(os.getenv("DUPLICATE_RING_SIZE", "20"))
+
+_pool = None
+_pool_lock = threading.Lock()
+
 def get_pg_connection():
-    """Create and return a new Postgres connection."""
+    """Create and return a new (unpooled) Postgres connection."""
     return psycopg2.connect(
         dbname=os.getenv("POSTGRES_DB"),
         user=os.getenv("POSTGRES_USER"),
@@ -15,158 +42,859 @@ def get_pg_connection():
         port=os.getenv("POSTGRES_PORT")
     )
 
-def insert_cleaned_log(incident_id, timestamp, appName, serviceName, job, label, level, message, kubernetesDetails=None):
-    """Insert a new cleaned log into cleaned_logs table."""
-    conn = get_pg_connection()
-    cur = conn.cursor()
+def get_pool() -> PgPool:
+    """Return the process-wide connection pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = PgPool(
+                    get_pg_connection,
+                    min_size=int(os.getenv("POSTGRES_POOL_MIN_SIZE", "1")),
+                    max_size=int(os.getenv("POSTGRES_POOL_MAX_SIZE", "10")),
+                    timeout=float(os.getenv("POSTGRES_POOL_TIMEOUT", "30")),
+                    max_lifetime=float(os.getenv("POSTGRES_POOL_MAX_LIFETIME", "1800")),
+                    max_idle=float(os.getenv("POSTGRES_POOL_MAX_IDLE", "300")),
+                    healthcheck_after=float(os.getenv("POSTGRES_POOL_HEALTHCHECK_AFTER", "30")),
+                )
+    return _pool
+
+@contextmanager
+def pg_connection():
+    """Borrow a pooled connection for one transaction."""
+    with get_pool().connection() as conn:
+        yield conn
+
+@contextmanager
+def pg_cursor(cursor_factory=None):
+    """Borrow a pooled connection and yield a cursor; commits on success."""
+    with get_pool().connection() as conn:
+        cur = conn.cursor(cursor_factory=cursor_factory)
+        try:
+            yield cur
+        finally:
+            cur.close()
+
+def get_pool_stats() -> dict:
+    """Connection pool utilization for monitoring."""
+    return get_pool().stats()
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+def ensure_schema():
+    """Add the columns/indexes the service relies on to the existing tables (idempotent)."""
+    with pg_cursor() as cur:
+        cur.execute("SELECT to_regclass('log_counters') IS NULL")
+        counters_created = cur.fetchone()[0]
+        cur.execute("""
+            ALTER TABLE cleaned_logs ADD COLUMN IF NOT EXISTS fingerprint TEXT;
+            ALTER TABLE cleaned_logs ADD COLUMN IF NOT EXISTS embedding BYTEA;
+            ALTER TABLE cleaned_logs ADD COLUMN IF NOT EXISTS embedding_model TEXT;
+            ALTER TABLE cleaned_logs ADD COLUMN IF NOT EXISTS embedding_dim INTEGER;
+            ALTER TABLE cleaned_logs ADD COLUMN IF NOT EXISTS embedding_version TEXT;
+            ALTER TABLE chat_messages ADD COLUMN IF NOT EXISTS cache_key TEXT;
+            ALTER TABLE chat_messages ADD COLUMN IF NOT EXISTS cached BOOLEAN NOT NULL DEFAULT FALSE;
+            CREATE INDEX IF NOT EXISTS idx_chat_messages_cache_key ON chat_messages (cache_key);
+            ALTER TABLE duplicate_logs ADD COLUMN IF NOT EXISTS fingerprint TEXT;
+            CREATE INDEX IF NOT EXISTS idx_cleaned_logs_fingerprint ON cleaned_logs (fingerprint);
+            CREATE INDEX IF NOT EXISTS idx_duplicate_logs_fingerprint ON duplicate_logs (fingerprint);
+            CREATE INDEX IF NOT EXISTS idx_cleaned_logs_date_time_id
+                ON cleaned_logs (date DESC, time DESC, id DESC);
+            CREATE INDEX IF NOT EXISTS idx_duplicate_logs_incident_id_date_time
+                ON duplicate_logs (incident_id, date DESC, time DESC);
+            CREATE TABLE IF NOT EXISTS log_counters (
+                metric TEXT NOT NULL,
+                dimension TEXT NOT NULL DEFAULT '',
+                bucket TEXT NOT NULL,
+                count BIGINT NOT NULL DEFAULT 0,
+                PRIMARY KEY (metric, dimension, bucket)
+            );
+            CREATE TABLE IF NOT EXISTS log_dedup_thresholds (
+                scope TEXT NOT NULL,
+                value TEXT NOT NULL,
+                threshold DOUBLE PRECISION NOT NULL,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                PRIMARY KEY (scope, value)
+            );
+        """)
+        cur.execute("SELECT to_regclass('duplicate_log_aggregates') IS NULL")
+        created = cur.fetchone()[0]
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS duplicate_log_aggregates (
+                incident_id TEXT NOT NULL,
+                day DATE NOT NULL,
+                occurrence_count BIGINT NOT NULL,
+                first_seen TIMESTAMP NOT NULL,
+                last_seen TIMESTAMP NOT NULL,
+                samples JSONB NOT NULL DEFAULT '[]',
+                PRIMARY KEY (incident_id, day)
+            );
+        """)
+        if created:
+            # One-off backfill from the duplicate rows written before the aggregate existed
+            cur.execute(f"""
+                INSERT INTO duplicate_log_aggregates
+                    (incident_id, day, occurrence_count, first_seen, last_seen, samples)
+                SELECT incident_id, date, COUNT(*), min(date + time), max(date + time),
+                       to_jsonb((array_agg(jsonb_build_object(
+                           'source', 'duplicate', 'message', message, 'level', lower(level),
+                           'appName', appName, 'timestamp', date::text || ' ' || time::text
+                       ) ORDER BY time DESC))[1:{DUPLICATE_RING_SIZE}])
+                FROM duplicate_logs
+                GROUP BY incident_id, date
+                ON CONFLICT (incident_id, day) DO NOTHING
+            """)
+        if counters_created:
+            # Seed the running totals from the rows that predate the counter table
+            _rebuild_counters(cur)
+
+# log_counters holds running totals maintained in the same transaction as the
+# inserts: metric is "cleaned", "duplicate" or "level" (cleaned rows only,
+# dimension = level), bucket is COUNTER_TOTAL or the log's date (YYYY-MM-DD).
+# Duplicates are rebuilt from duplicate_log_aggregates, which counts every
+# occurrence even when its full row was not kept.
+COUNTER_TOTAL = "all"
+
+COUNTER_UPSERT = """
+    INSERT INTO log_counters (metric, dimension, bucket, count) VALUES %s
+    ON CONFLICT (metric, dimension, bucket)
+    DO UPDATE SET count = log_counters.count + EXCLUDED.count
+"""
+
+def counter_deltas(cleaned, duplicates):
+    """
+    Counter rows (metric, dimension, bucket, delta) for a set of inserts.
+    cleaned is a list of (level, timestamp), duplicates a list of timestamps.
+    Sorted so concurrent writers always lock counter rows in the same order.
+    """
+    deltas = Counter()
+    for level, timestamp in cleaned:
+        for bucket in (COUNTER_TOTAL, timestamp.date().isoformat()):
+            deltas[("cleaned", "", bucket)] += 1
+            deltas[("level", level or "", bucket)] += 1
+    for timestamp in duplicates:
+        for bucket in (COUNTER_TOTAL, timestamp.date().isoformat()):
+            deltas[("duplicate", "", bucket)] += 1
+    return sorted((*key, delta) for key, delta in deltas.items())
+
+def _bump_counters(cur, cleaned, duplicates):
+    rows = counter_deltas(cleaned, duplicates)
+    if rows:
+        execute_values(cur, COUNTER_UPSERT, rows)
+
+@timed("postgres")
+def reconcile_counters():
+    """
+    Rebuild log_counters from cleaned_logs/duplicate_log_aggregates; returns the new totals.
+    The counter table is locked for the duration, so inserts that race with
+    the rebuild wait and are applied on top of the recomputed values.
+    """
+    with pg_cursor() as cur:
+        _rebuild_counters(cur)
+    return get_alert_counts()
+
+def _rebuild_counters(cur):
     cur.execute("""
-        INSERT INTO cleaned_logs (
-            id, date, time, appName, serviceName, job, label, level, message, kubernetesDetails
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-    """, (
+        LOCK TABLE log_counters IN EXCLUSIVE MODE;
+        DELETE FROM log_counters;
+        INSERT INTO log_counters (metric, dimension, bucket, count)
+        SELECT metric, dimension, bucket, SUM(n) FROM (
+            SELECT 'cleaned' AS metric, '' AS dimension, date, 1 AS n FROM cleaned_logs
+            UNION ALL
+            SELECT 'level', COALESCE(level, ''), date, 1 FROM cleaned_logs
+            UNION ALL
+            SELECT 'duplicate', '', day, occurrence_count FROM duplicate_log_aggregates
+        ) r
+        CROSS JOIN LATERAL (VALUES (%s), (to_char(date, 'YYYY-MM-DD'))) b (bucket)
+        GROUP BY metric, dimension, bucket;
+    """, (COUNTER_TOTAL,))
+
+LOG_COLUMNS = "date, time, appName, serviceName, job, label, level, message, kubernetesDetails, fingerprint"
+
+def _log_row(incident_id, timestamp, alert, fingerprint=None):
+    kubernetesDetails = alert.get("kubernetesDetails")
+    return (
         incident_id,
         timestamp.date(),
         timestamp.time(),
-        appName,
-        serviceName,
-        job,
-        label,
-        level,
-        message,
-        Json(kubernetesDetails) if kubernetesDetails else None
-    ))
-    conn.commit()
-    cur.close()
-    conn.close()
-
-def insert_duplicate_log(original_incident_id, timestamp, appName, serviceName, job, label, level, message, kubernetesDetails=None):
-    """Insert a duplicate alert into duplicate_logs table referencing the original incident_id."""
-    conn = get_pg_connection()
-    cur = conn.cursor()
+        alert.get("appName"),
+        alert.get("serviceName"),
+        alert.get("job"),
+        alert.get("label"),
+        alert.get("level"),
+        alert.get("message"),
+        Json(kubernetesDetails) if kubernetesDetails else None,
+        fingerprint
+    )
+
+# Each cleaned log keeps the embedding it was deduplicated with (little-endian
+# float32 bytes) with the model, dimension and model version that produced
+# it, so the vector store can be rebuilt from Postgres
+# (scripts/rebuild_vectors.py) without calling Ollama again. Rows without an
+# embedding (embedding failed) or from another EMBEDDING_MODEL /
+# EMBEDDING_MODEL_VERSION are the ones that need re-embedding.
+EMBEDDING_COLUMNS = "embedding, embedding_model, embedding_dim, embedding_version"
+
+STALE_EMBEDDING = """(
+    embedding IS NULL
+    OR embedding_model IS DISTINCT FROM %(embedding_model)s
+    OR embedding_version IS DISTINCT FROM %(embedding_version)s
+)"""
+
+def encode_embedding(vector):
+    import numpy as np
+
+    return np.asarray(vector, dtype="<f4").tobytes()
+
+def decode_embedding(data):
+    import numpy as np
+
+    return np.frombuffer(data, dtype="<f4").tolist()
+
+def embedding_values(vector):
+    """Values for EMBEDDING_COLUMNS (all NULL when there is no vector)."""
+    if not vector:
+        return None, None, None, None
+    return encode_embedding(vector), EMBEDDING_MODEL, len(vector), EMBEDDING_MODEL_VERSION
+
+def _stale_params():
+    return {"embedding_model": EMBEDDING_MODEL, "embedding_version": EMBEDDING_MODEL_VERSION}
+
+@timed("postgres")
+def count_embeddings(since=None):
+    """Cleaned logs (at or after since, a UTC datetime, when given) by embedding state."""
+    with pg_cursor() as cur:
+        cur.execute(f"""
+            SELECT COUNT(*), COUNT(*) FILTER (WHERE {STALE_EMBEDDING})
+            FROM cleaned_logs
+            WHERE %(since)s::timestamp IS NULL OR (date + time) >= %(since)s::timestamp
+        """, {**_stale_params(), "since": seen_at(since) if since else None})
+        total, stale = cur.fetchone()
+    return {"total": total, "current": total - stale, "stale": stale}
+
+def iter_stored_embeddings(since=None, stale=False, itersize=1000, until=None):
+    """
+    Yield (incident_id, timestamp, alert, vector) for cleaned logs at or after
+    since (and before until), oldest first, through a server-side cursor. With stale=False only
+    rows with a current embedding are read; with stale=True only the rows that
+    need re-embedding (vector is then None). timestamp is UTC.
+    """
+    condition = STALE_EMBEDDING if stale else f"NOT {STALE_EMBEDDING}"
+    with pg_connection() as conn:
+        with conn.cursor(name="stored_embeddings") as cur:
+            cur.itersize = itersize
+            cur.execute(f"""
+                SELECT id, {LOG_COLUMNS}, embedding
+                FROM cleaned_logs
+                WHERE {condition}
+                  AND (%(since)s::timestamp IS NULL OR (date + time) >= %(since)s::timestamp)
+                  AND (%(until)s::timestamp IS NULL OR (date + time) < %(until)s::timestamp)
+                ORDER BY date, time, id
+            """, {
+                **_stale_params(),
+                "since": seen_at(since) if since else None,
+                "until": seen_at(until) if until else None,
+            })
+            names = [name.strip() for name in LOG_COLUMNS.split(",")][2:-1]
+            for row in cur:
+                timestamp = datetime.combine(row[1], row[2]).replace(tzinfo=timezone.utc)
+                vector = None if stale else decode_embedding(bytes(row[-1]))
+                yield row[0], timestamp, dict(zip(names, row[3:-2])), vector
+
+@timed("postgres")
+def update_embeddings(items):
+    """Store new (incident_id, vector) embeddings under the current model and version."""
+    if not items:
+        return
+    with pg_cursor() as cur:
+        execute_values(cur, """
+            UPDATE cleaned_logs c SET
+                embedding = v.embedding, embedding_model = v.embedding_model,
+                embedding_dim = v.embedding_dim, embedding_version = v.embedding_version
+            FROM (VALUES %s) v (id, embedding, embedding_model, embedding_dim, embedding_version)
+            WHERE c.id = v.id
+        """, [(incident_id, *embedding_values(vector)) for incident_id, vector in items])
+
+# log_dedup_thresholds overrides the semantic similarity threshold for one
+# partition (scope "partition", value = a partition_key()) or one service
+# (scope "service", value = the log's DEDUP_THRESHOLD_SERVICE_KEY field).
+# services/thresholds.py re-reads it periodically, so a change applies to
+# running workers without a redeploy.
+THRESHOLD_SCOPES = ("partition", "service")
+
+@timed("postgres")
+def fetch_thresholds():
+    """
+    All threshold overrides as {scope, value, threshold, updated_at} dicts.
+    """
+    with pg_cursor(RealDictCursor) as cur:
+        cur.execute("SELECT scope, value, threshold, updated_at FROM log_dedup_thresholds ORDER BY scope, value")
+        return cur.fetchall()
+
+@timed("postgres")
+def set_threshold(scope, value, threshold):
+    """
+    Create or replace the threshold override of one partition or service.
+    """
+    if scope not in THRESHOLD_SCOPES:
+        raise ValueError(f"scope must be one of {THRESHOLD_SCOPES}, got {scope!r}")
+    if not 0.0 <= threshold <= 1.0:
+        raise ValueError(f"threshold must be between 0 and 1, got {threshold}")
+    with pg_cursor() as cur:
+        cur.execute("""
+            INSERT INTO log_dedup_thresholds (scope, value, threshold) VALUES (%s, %s, %s)
+            ON CONFLICT (scope, value) DO UPDATE SET threshold = EXCLUDED.threshold, updated_at = NOW()
+        """, (scope, value, threshold))
+
+@timed("postgres")
+def delete_threshold(scope, value):
+    """
+    Remove an override (the default threshold applies again).
+    Returns False when there was none.
+    """
+    with pg_cursor() as cur:
+        cur.execute("DELETE FROM log_dedup_thresholds WHERE scope = %s AND value = %s", (scope, value))
+        return cur.rowcount > 0
+
+# Every duplicate occurrence is upserted into duplicate_log_aggregates (one
+# row per original incident and day: occurrence_count, first/last seen and a
+# ring of the DUPLICATE_RING_SIZE most recent occurrences). A full
+# duplicate_logs row is only written when keeps_payload() selects it.
+DUPLICATE_AGGREGATE_CONFLICT = f"""
+    ON CONFLICT (incident_id, day) DO UPDATE SET
+        occurrence_count = a.occurrence_count + EXCLUDED.occurrence_count,
+        first_seen = LEAST(a.first_seen, EXCLUDED.first_seen),
+        last_seen = GREATEST(a.last_seen, EXCLUDED.last_seen),
+        samples = (
+            SELECT jsonb_agg(s ORDER BY n) FROM (
+                SELECT s, n FROM jsonb_array_elements(EXCLUDED.samples || a.samples) WITH ORDINALITY e (s, n)
+                ORDER BY n
+                LIMIT {DUPLICATE_RING_SIZE}
+            ) ring
+        )
+    RETURNING incident_id, day, occurrence_count
+"""
+
+DUPLICATE_AGGREGATE_UPSERT = f"""
+    INSERT INTO duplicate_log_aggregates AS a
+        (incident_id, day, occurrence_count, first_seen, last_seen, samples)
+    VALUES %s
+    {DUPLICATE_AGGREGATE_CONFLICT}
+"""
+
+def keeps_payload(occurrence):
+    """
+    Whether the occurrence-th duplicate of an incident's day keeps its full row
+    (the new-fingerprint rule is applied on top of this by the writers).
+    """
+    if DUPLICATE_PAYLOADS != "sampled":
+        return True
+    return occurrence <= DUPLICATE_SAMPLE_FIRST or (
+        DUPLICATE_SAMPLE_EVERY > 0 and occurrence % DUPLICATE_SAMPLE_EVERY == 0
+    )
+
+def seen_at(timestamp):
+    """A log's timestamp as the UTC wall-clock value stored in date/time columns."""
+    return datetime.combine(timestamp.date(), timestamp.time())
+
+# SQL form of keeps_payload() plus the new-fingerprint rule, for the
+# single-statement writers below (agg is the upserted aggregate row)
+KEEPS_PAYLOAD_SQL = """
+    %(keep_all)s::bool
+    OR agg.occurrence_count <= %(sample_first)s::int
+    OR (%(sample_every)s::int > 0 AND agg.occurrence_count %% %(sample_every)s::int = 0)
+    OR (%(new_fingerprints)s::bool AND %(fingerprint)s::text IS NOT NULL
+        AND NOT EXISTS (SELECT 1 FROM cleaned_logs WHERE fingerprint = %(fingerprint)s::text)
+        AND NOT EXISTS (SELECT 1 FROM duplicate_logs WHERE fingerprint = %(fingerprint)s::text))
+"""
+
+def duplicate_sample(alert, timestamp):
+    """Ring entry for one occurrence, in the shape /alerts/grouped returns duplicates."""
+    level = alert.get("level")
+    return {
+        "source": "duplicate",
+        "message": alert.get("message"),
+        "level": level.lower() if level else level,
+        "appName": alert.get("appName"),
+        "timestamp": f"{timestamp.date().isoformat()} {timestamp.time().isoformat()}",
+    }
+
+def _stored_fingerprints(cur, fingerprints):
+    if not fingerprints:
+        return set()
     cur.execute("""
-        INSERT INTO duplicate_logs (
-            incident_id, date, time, appName, serviceName, job, label, level, message, kubernetesDetails
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-    """, (
-        original_incident_id,
-        timestamp.date(),
-        timestamp.time(),
-        appName,
-        serviceName,
-        job,
-        label,
-        level,
-        message,
-        Json(kubernetesDetails) if kubernetesDetails else None
-    ))
-    conn.commit()
-    cur.close()
-    conn.close()
+        SELECT fingerprint FROM cleaned_logs WHERE fingerprint = ANY(%(fps)s)
+        UNION
+        SELECT fingerprint FROM duplicate_logs WHERE fingerprint = ANY(%(fps)s)
+    """, {"fps": list(fingerprints)})
+    return {row[0] for row in cur.fetchall()}
+
+def write_duplicates(cur, duplicates):
+    """
+    Record (original_incident_id, timestamp, alert, fingerprint) occurrences on cur.
+    Upserts the aggregates (sorted, so concurrent writers lock rows in the
+    same order) and inserts the full rows the sampling policy keeps; returns
+    the number of full rows written.
+    """
+    if not duplicates:
+        return 0
+    groups = {}
+    for pos, (incident_id, timestamp, _, _) in enumerate(duplicates):
+        groups.setdefault((incident_id, timestamp.date()), []).append(pos)
+
+    rows = []
+    for (incident_id, day), positions in sorted(groups.items()):
+        times = [seen_at(duplicates[pos][1]) for pos in positions]
+        # Newest first, matching the ring order
+        samples = [duplicate_sample(duplicates[pos][2], duplicates[pos][1]) for pos in reversed(positions)]
+        rows.append((incident_id, day, len(positions), min(times), max(times), Json(samples[:DUPLICATE_RING_SIZE])))
+    totals = {(row[0], row[1]): row[2] for row in execute_values(cur, DUPLICATE_AGGREGATE_UPSERT, rows, fetch=True)}
+
+    keep = [False] * len(duplicates)
+    for key, positions in groups.items():
+        first = totals[key] - len(positions) + 1
+        for n, pos in enumerate(positions):
+            keep[pos] = keeps_payload(first + n)
+    if DUPLICATE_SAMPLE_NEW_FINGERPRINTS:
+        kept_fps = {fp for (_, _, _, fp), kept in zip(duplicates, keep) if kept}
+        candidates = {fp for _, _, _, fp in duplicates if fp} - kept_fps
+        new = candidates - _stored_fingerprints(cur, candidates)
+        for pos, (_, _, _, fp) in enumerate(duplicates):
+            if fp in new and not keep[pos]:
+                keep[pos] = True
+                new.discard(fp)  # one row per new variant is enough
+
+    kept = [_log_row(*item) for item, k in zip(duplicates, keep) if k]
+    if kept:
+        execute_values(cur, f"""
+            INSERT INTO duplicate_logs (incident_id, {LOG_COLUMNS}) VALUES %s
+        """, kept)
+    return len(kept)
+
+def new_incident_id(taken=()):
+    """
+    Generate the id of a new cleaned log (8 hex characters), avoiding the given ids.
+    Ids this short can collide with stored ones; the writers below never
+    overwrite or fail on a taken id but report it (or replace it, for batches).
+    """
+    while True:
+        incident_id = str(uuid.uuid4())[:8]
+        if incident_id not in taken:
+            return incident_id
+
+# ---------------------------------------------------------------------- #
+# Single-statement writes
+#
+# One log is written with one statement built from data-modifying CTEs: the
+# row insert (ON CONFLICT DO NOTHING for cleaned logs, so a generated id that
+# is already taken is reported instead of raising), the duplicate aggregate
+# upsert + sampled full row, and the counter bumps. Each statement is atomic
+# and takes one round trip. Parameters come from log_write_params();
+# async_postgres_service runs the same statements through asyncpg.
+# ---------------------------------------------------------------------- #
+_VALUE_NAMES = [
+    "date", "time", "appName", "serviceName", "job", "label", "level", "message",
+    "kubernetesDetails", "fingerprint",
+]
+
+_LOG_VALUES = ", ".join(f"%({name})s" for name in _VALUE_NAMES)
+
+_COUNTERS_CTE = """
+    counters AS (
+        INSERT INTO log_counters (metric, dimension, bucket, count)
+        SELECT metric, dimension, bucket, count
+        FROM unnest(%(counter_metrics)s::text[], %(counter_dimensions)s::text[], %(counter_buckets)s::text[],
+                    %(counter_counts)s::bigint[]) c (metric, dimension, bucket, count)
+        WHERE {when}
+        ORDER BY metric, dimension, bucket
+        ON CONFLICT (metric, dimension, bucket)
+        DO UPDATE SET count = log_counters.count + EXCLUDED.count
+    )"""
+
+# Returns one row (inserted): false when the id is already taken and nothing was written
+CLEANED_LOG_WRITE = f"""
+    WITH ins AS (
+        INSERT INTO cleaned_logs (id, {LOG_COLUMNS}, {EMBEDDING_COLUMNS})
+        VALUES (%(incident_id)s, {_LOG_VALUES},
+                %(embedding)s::bytea, %(embedding_model)s::text, %(embedding_dim)s::int, %(embedding_version)s::text)
+        ON CONFLICT DO NOTHING
+        RETURNING id
+    ),
+    {_COUNTERS_CTE.format(when="EXISTS (SELECT 1 FROM ins)").strip()}
+    SELECT EXISTS (SELECT 1 FROM ins) AS inserted
+"""
+
+# Returns one row (occurrence_count) for the recorded duplicate
+DUPLICATE_LOG_WRITE = f"""
+    WITH agg AS (
+        INSERT INTO duplicate_log_aggregates AS a
+            (incident_id, day, occurrence_count, first_seen, last_seen, samples)
+        VALUES (%(incident_id)s::text, %(date)s::date, 1, %(seen_at)s::timestamp, %(seen_at)s::timestamp,
+                %(sample)s::jsonb)
+        {DUPLICATE_AGGREGATE_CONFLICT}
+    ),
+    dup AS (
+        INSERT INTO duplicate_logs (incident_id, {LOG_COLUMNS})
+        SELECT agg.incident_id, {_LOG_VALUES} FROM agg
+        WHERE {KEEPS_PAYLOAD_SQL}
+    ),
+    {_COUNTERS_CTE.format(when="TRUE").strip()}
+    SELECT occurrence_count FROM agg
+"""
+
+def log_write_params(incident_id, timestamp, alert, fingerprint=None, duplicate=False, vector=None, json_adapter=Json):
+    """
+    Parameters of CLEANED_LOG_WRITE (which also stores vector), or of
+    DUPLICATE_LOG_WRITE when duplicate is set (incident_id is then the
+    original incident).
+    """
+    kubernetesDetails = alert.get("kubernetesDetails")
+    if duplicate:
+        counters = counter_deltas([], [timestamp])
+    else:
+        counters = counter_deltas([(alert.get("level"), timestamp)], [])
+    metrics, dimensions, buckets, counts = (list(column) for column in zip(*counters))
+    embedding, embedding_model, embedding_dim, embedding_version = embedding_values(vector)
+    return {
+        **{name: alert.get(name) for name in _VALUE_NAMES},
+        "incident_id": incident_id,
+        "date": timestamp.date(),
+        "time": timestamp.time(),
+        "kubernetesDetails": json_adapter(kubernetesDetails) if kubernetesDetails else None,
+        "fingerprint": fingerprint,
+        "seen_at": seen_at(timestamp),
+        "sample": json_adapter([duplicate_sample(alert, timestamp)]),
+        "keep_all": DUPLICATE_PAYLOADS != "sampled",
+        "sample_first": DUPLICATE_SAMPLE_FIRST,
+        "sample_every": DUPLICATE_SAMPLE_EVERY,
+        "new_fingerprints": DUPLICATE_SAMPLE_NEW_FINGERPRINTS,
+        "counter_metrics": metrics,
+        "counter_dimensions": dimensions,
+        "counter_buckets": buckets,
+        "counter_counts": counts,
+        "embedding": embedding,
+        "embedding_model": embedding_model,
+        "embedding_dim": embedding_dim,
+        "embedding_version": embedding_version,
+    }
+
+@timed("postgres")
+def insert_cleaned_log(incident_id, timestamp, appName, serviceName, job, label, level, message, kubernetesDetails=None, fingerprint=None, vector=None):
+    """
+    Insert a new cleaned log (with its embedding, when given) into cleaned_logs
+    table in one atomic round trip.
+    Returns False, writing nothing, when incident_id is already taken.
+    """
+    alert = dict(appName=appName, serviceName=serviceName, job=job, label=label,
+                 level=level, message=message, kubernetesDetails=kubernetesDetails)
+    with pg_cursor() as cur:
+        cur.execute(CLEANED_LOG_WRITE, log_write_params(incident_id, timestamp, alert, fingerprint, vector=vector))
+        return cur.fetchone()[0]
+
+@timed("postgres")
+def insert_duplicate_log(original_incident_id, timestamp, appName, serviceName, job, label, level, message, kubernetesDetails=None, fingerprint=None):
+    """
+    Record a duplicate of the original incident_id (aggregate, plus the full
+    duplicate_logs row when the sampling policy keeps it) in one round trip.
+    """
+    alert = dict(appName=appName, serviceName=serviceName, job=job, label=label,
+                 level=level, message=message, kubernetesDetails=kubernetesDetails)
+    with pg_cursor() as cur:
+        cur.execute(DUPLICATE_LOG_WRITE, log_write_params(original_incident_id, timestamp, alert, fingerprint, duplicate=True))
+
+@timed("postgres")
+def insert_log_batch(cleaned, duplicates, vectors=None):
+    """
+    Multi-row insert of new logs and duplicates in one transaction.
+    Both arguments are lists of (incident_id, timestamp, alert, fingerprint)
+    tuples; for duplicates the incident_id is the original incident. vectors
+    maps new incident ids to the embeddings stored with them. The cleaned ids
+    must be unique within the batch. Ids already taken in cleaned_logs are
+    replaced with fresh ones (duplicates follow them); returns
+    {generated id: id the log was stored under} for those.
+    """
+    renamed = {}
+    vectors = vectors or {}
+    with pg_cursor() as cur:
+        pending = [(item, vectors.get(item[0])) for item in cleaned]
+        taken = {incident_id for incident_id, _, _, _ in cleaned}
+        while pending:
+            inserted = {row[0] for row in execute_values(cur, f"""
+                INSERT INTO cleaned_logs (id, {LOG_COLUMNS}, {EMBEDDING_COLUMNS}) VALUES %s
+                ON CONFLICT DO NOTHING
+                RETURNING id
+            """, [(*_log_row(*item), *embedding_values(vector)) for item, vector in pending], fetch=True)}
+            retry = []
+            for (incident_id, timestamp, alert, fingerprint), vector in pending:
+                if incident_id not in inserted:
+                    fresh = new_incident_id(taken)
+                    taken.add(fresh)
+                    generated = next((k for k, v in renamed.items() if v == incident_id), incident_id)
+                    renamed[generated] = fresh
+                    retry.append(((fresh, timestamp, alert, fingerprint), vector))
+            pending = retry
+        if renamed:
+            duplicates = [(renamed.get(incident_id, incident_id), *rest) for incident_id, *rest in duplicates]
+        write_duplicates(cur, duplicates)
+        _bump_counters(
+            cur,
+            [(alert.get("level"), timestamp) for _, timestamp, alert, _ in cleaned],
+            [timestamp for _, timestamp, _, _ in duplicates],
+        )
+    return renamed
+
+@timed("postgres")
+def fetch_incident_by_fingerprint(fingerprint):
+    """Return the incident id an identical log was stored under, or None."""
+    with pg_cursor() as cur:
+        cur.execute("""
+            SELECT incident_id FROM (
+                (SELECT id AS incident_id, 0 AS priority
+                 FROM cleaned_logs WHERE fingerprint = %(fingerprint)s LIMIT 1)
+                UNION ALL
+                (SELECT incident_id, 1
+                 FROM duplicate_logs WHERE fingerprint = %(fingerprint)s LIMIT 1)
+            ) m
+            ORDER BY priority
+            LIMIT 1
+        """, {"fingerprint": fingerprint})
+        row = cur.fetchone()
+    return row[0] if row else None
+
+@timed("postgres")
+def fetch_incidents_by_fingerprints(fingerprints):
+    """Batch variant of fetch_incident_by_fingerprint: {fingerprint: incident id}."""
+    if not fingerprints:
+        return {}
+    with pg_cursor() as cur:
+        cur.execute("""
+            SELECT DISTINCT ON (fingerprint) fingerprint, incident_id FROM (
+                SELECT fingerprint, id AS incident_id, 0 AS priority
+                FROM cleaned_logs WHERE fingerprint = ANY(%(fps)s)
+                UNION ALL
+                SELECT fingerprint, incident_id, 1
+                FROM duplicate_logs WHERE fingerprint = ANY(%(fps)s)
+            ) m
+            ORDER BY fingerprint, priority
+        """, {"fps": list(fingerprints)})
+        return {row[0]: row[1] for row in cur.fetchall()}
     
-def fetch_alerts():
-    """Fetch list of alerts with pagination."""
-    conn = get_pg_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    cur.execute("""
-        SELECT id as incident_id, appName, serviceName, job, label, level, message,
-               kubernetesDetails, date, time
-        FROM cleaned_logs
-        ORDER BY date DESC, time DESC
-    """)
-    alerts = cur.fetchall()
-    cur.close()
-    conn.close()
-    return alerts
+def encode_cursor(values):
+    """Opaque, URL-safe token for a keyset position."""
+    raw = json.dumps([v.isoformat() if hasattr(v, "isoformat") else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(token, size):
+    """Inverse of encode_cursor; raises ValueError for malformed tokens."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    return values
 
-def fetch_grouped_alerts():
+@timed("postgres")
+def fetch_alerts(limit=100, cursor=None, level=None, appName=None, since=None, until=None, include_payload=True):
     """
-    Fetch alerts from cleaned_logs and duplicate_logs and group them by incident_id.
+    Fetch one page of alerts (latest first) using keyset pagination over
+    (date, time, id). Returns (rows, next_cursor); next_cursor is None on the last page.
     """
-    conn = get_pg_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    conditions, params = [], []
+    if cursor:
+        conditions.append("(date, time, id) < (%s, %s, %s)")
+        params.extend(decode_cursor(cursor, 3))
+    if level:
+        conditions.append("level = %s")
+        params.append(level)
+    if appName:
+        conditions.append("appName = %s")
+        params.append(appName)
+    # date/time columns hold UTC wall-clock values
+    since = since.astimezone(timezone.utc) if since and since.tzinfo else since
+    until = until.astimezone(timezone.utc) if until and until.tzinfo else until
+    if since:
+        conditions.append("(date, time) >= (%s, %s)")
+        params.extend([since.date(), since.time()])
+    if until:
+        conditions.append("(date, time) < (%s, %s)")
+        params.extend([until.date(), until.time()])
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    payload = "kubernetesDetails, " if include_payload else ""
 
-    # Fetch all cleaned logs
-    cur.execute("""
-        SELECT id as incident_id, appName, level, message, kubernetesDetails, date, time
-        FROM cleaned_logs
-        ORDER BY date DESC, time DESC
-    """)
-    cleaned_logs = cur.fetchall()
+    with pg_cursor(RealDictCursor) as cur:
+        cur.execute(f"""
+            SELECT id as incident_id, appName, serviceName, job, label, level, message,
+                   {payload}date, time
+            FROM cleaned_logs
+            {where}
+            ORDER BY date DESC, time DESC, id DESC
+            LIMIT %s
+        """, (*params, limit + 1))
+        alerts = cur.fetchall()
 
-    # Fetch all duplicate logs
-    cur.execute("""
-        SELECT incident_id as original_incident_id, appName, level, message, kubernetesDetails, date, time
-        FROM duplicate_logs
-        ORDER BY date DESC, time DESC
-    """)
-    duplicate_logs = cur.fetchall()
-
-    cur.close()
-    conn.close()
-
-    grouped = {}
-
-    # Group cleaned logs by their incident_id
-    for log in cleaned_logs:
-        incident_id = log["incident_id"]
-        if incident_id not in grouped:
-            grouped[incident_id] = []
-
-        grouped[incident_id].append({
-            "source": "cleaned",
-            "message": log["message"],
-            "level": log["level"].lower(),
-            "appName": log.get("appName"),
-            "timestamp": f"{log['date']} {log['time']}"
-        })
-
-    # Include duplicates under their original incident_id
-    for dup in duplicate_logs:
-        incident_id = dup["original_incident_id"]
-        if incident_id not in grouped:
-            grouped[incident_id] = []
-
-        grouped[incident_id].append({
-            "source": "duplicate",
-            "message": dup["message"],
-            "level": dup["level"].lower(),
-            "appName": dup.get("appName"),
-            "timestamp": f"{dup['date']} {dup['time']}"
-        })
-
-    return grouped
+    next_cursor = None
+    if len(alerts) > limit:
+        alerts = alerts[:limit]
+        last = alerts[-1]
+        next_cursor = encode_cursor([last["date"], last["time"], last["incident_id"]])
+    return alerts, next_cursor
 
-def get_alert_counts():
-    """Fetch summary counts from cleaned_logs."""
-    conn = get_pg_connection()
-    cur = conn.cursor()
+def iter_grouped_alerts(limit=None, cursor=None, max_duplicates=None, itersize=500):
+    """
+    Yield (incident_id, date, time, entries_json, duplicate_count, first_seen, last_seen)
+    per cleaned log, latest first. Grouping is done in Postgres from
+    duplicate_log_aggregates and rows are read through a server-side cursor,
+    so memory stays flat regardless of table size. entries_json is the JSON
+    text of the group's entries (cleaned first, then up to max_duplicates of
+    the recent occurrences kept in the aggregates, newest first);
+    duplicate_count, first_seen and last_seen cover every occurrence.
+    """
+    conditions, params = [], {"max_duplicates": max_duplicates}
+    if cursor:
+        date, time, incident_id = decode_cursor(cursor, 3)
+        conditions.append("(c.date, c.time, c.id) < (%(date)s, %(time)s, %(incident_id)s)")
+        params.update(date=date, time=time, incident_id=incident_id)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    page = ""
+    if limit is not None:
+        page = "LIMIT %(limit)s"
+        params["limit"] = limit
 
-    # Total alerts
-    cur.execute("SELECT COUNT(*) FROM cleaned_logs")
-    total_alerts = cur.fetchone()[0]
+    with pg_connection() as conn:
+        with conn.cursor(name="grouped_logs") as cur:
+            cur.itersize = itersize
+            cur.execute(f"""
+                SELECT c.id, c.date, c.time, g.entries::text, agg.total, agg.first_seen, agg.last_seen
+                FROM cleaned_logs c
+                CROSS JOIN LATERAL (
+                    SELECT jsonb_agg(e ORDER BY ord, day DESC, n) AS entries FROM (
+                        SELECT 0 AS ord, NULL::date AS day, 0::bigint AS n, jsonb_build_object(
+                            'source', 'cleaned', 'message', c.message, 'level', lower(c.level),
+                            'appName', c.appName, 'timestamp', c.date::text || ' ' || c.time::text
+                        ) AS e
+                        UNION ALL
+                        (SELECT 1, a.day, s.n, s.e
+                        FROM duplicate_log_aggregates a
+                        CROSS JOIN LATERAL jsonb_array_elements(a.samples) WITH ORDINALITY s (e, n)
+                        WHERE a.incident_id = c.id
+                        ORDER BY a.day DESC, s.n
+                        LIMIT %(max_duplicates)s)
+                    ) x
+                ) g
+                CROSS JOIN LATERAL (
+                    SELECT COALESCE(SUM(occurrence_count), 0)::bigint AS total,
+                           min(first_seen) AS first_seen, max(last_seen) AS last_seen
+                    FROM duplicate_log_aggregates a WHERE a.incident_id = c.id
+                ) agg
+                {where}
+                ORDER BY c.date DESC, c.time DESC, c.id DESC
+                {page}
+            """, params)
+            for row in cur:
+                yield row
 
-    # Total deduplicated alerts (difference between all_logs and cleaned_logs)
-    cur.execute("SELECT (SELECT COUNT(*) FROM all_logs) - (SELECT COUNT(*) FROM cleaned_logs)")
-    total_deduplicated = cur.fetchone()[0]
+def _json_time(value):
+    return json.dumps(value.isoformat() if value else None)
 
-    # Count by severity/level
-    cur.execute("""
-        SELECT level, COUNT(*) 
-        FROM cleaned_logs
-        GROUP BY level
-    """)
-    severity_counts_rows = cur.fetchall()
-    severity_counts = {row[0]: row[1] for row in severity_counts_rows}
+def stream_grouped_alerts(fmt="json", limit=None, cursor=None, max_duplicates=None):
+    """
+    Stream grouped logs as text chunks.
+
+    fmt="json" produces the legacy {incident_id: [entries]} object.
+    fmt="ndjson" produces one {"incident_id", "duplicate_count", "first_seen",
+    "last_seen", "entries"} line per group and, when more groups remain, a final {"next_cursor"} line.
+    """
+    fetch_limit = limit + 1 if limit is not None else None
+    rows = iter_grouped_alerts(limit=fetch_limit, cursor=cursor, max_duplicates=max_duplicates)
+
+    if fmt == "ndjson":
+        last = None
+        for n, (incident_id, date, time, entries, total, first_seen, last_seen) in enumerate(rows):
+            if limit is not None and n == limit:
+                yield json.dumps({"next_cursor": encode_cursor(last)}) + "\n"
+                break
+            yield (
+                f'{{"incident_id": {json.dumps(incident_id)}, "duplicate_count": {total}, '
+                f'"first_seen": {_json_time(first_seen)}, "last_seen": {_json_time(last_seen)}, '
+                f'"entries": {entries}}}\n'
+            )
+            last = [date, time, incident_id]
+        return
+
+    yield "{"
+    for n, (incident_id, _, _, entries, *_) in enumerate(rows):
+        if limit is not None and n == limit:
+            break
+        yield ("," if n else "") + json.dumps(incident_id) + ":" + entries
+    yield "}"
+
+@timed("postgres")
+def fetch_grouped_alerts(max_duplicates=None):
+    """
+    Fetch alerts from cleaned_logs and duplicate_log_aggregates and group them by incident_id.
+    """
+    return {
+        incident_id: json.loads(entries)
+        for incident_id, _, _, entries, *_ in iter_grouped_alerts(max_duplicates=max_duplicates)
+    }
 
-    cur.close()
-    conn.close()
+@timed("postgres")
+def get_alert_counts():
+    """Fetch summary counts from log_counters."""
+    with pg_cursor() as cur:
+        cur.execute("""
+            SELECT metric, dimension, count FROM log_counters WHERE bucket = %s
+        """, (COUNTER_TOTAL,))
+        rows = cur.fetchall()
+
+    totals = {"cleaned": 0, "duplicate": 0}
+    severity_counts = {}
+    for metric, dimension, count in rows:
+        if metric == "level":
+            if count:
+                severity_counts[dimension or None] = count
+        else:
+            totals[metric] = count
 
+    # Every ingested log lands in cleaned_logs or duplicate_logs, so the
+    # deduplicated count (all_logs minus cleaned_logs) is the duplicate total.
     return {
-        "totalAlertsCount": total_alerts,
-        "totalDeduplicatedCount": total_deduplicated,
+        "totalAlertsCount": totals["cleaned"],
+        "totalDeduplicatedCount": totals["duplicate"],
         "severityCounts": severity_counts
     }
-    
+
+@timed("postgres")
+def get_daily_counts(days=30):
+    """Per-day cleaned/duplicate counts and level breakdown, newest day first."""
+    since = (datetime.now(timezone.utc).date() - timedelta(days=days - 1)).isoformat()
+    with pg_cursor() as cur:
+        cur.execute("""
+            SELECT bucket, metric, dimension, count FROM log_counters
+            WHERE bucket <> %s AND bucket >= %s
+            ORDER BY bucket DESC
+        """, (COUNTER_TOTAL, since))
+        rows = cur.fetchall()
+
+    daily = {}
+    for bucket, metric, dimension, count in rows:
+        day = daily.setdefault(bucket, {"date": bucket, "alerts": 0, "deduplicated": 0, "severityCounts": {}})
+        if metric == "cleaned":
+            day["alerts"] = count
+        elif metric == "duplicate":
+            day["deduplicated"] = count
+        elif count:
+            day["severityCounts"][dimension or None] = count
+    return list(daily.values())
+
+@timed("postgres")
 def get_alert_summary():
     """Fetch summary for dashboard/health endpoint."""
     counts = get_alert_counts()  # reuse existing function
@@ -182,17 +910,38 @@ def get_alert_summary():
         "severityCounts": counts["severityCounts"]
     }
     
+@timed("postgres")
 def fetch_alert_by_id(incident_id: str):
     """Fetch single alert by incident_id."""
-    conn = get_pg_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    cur.execute("""
-        SELECT id as incident_id, appName, serviceName, job, label, level, message,
-               kubernetesDetails, date, time
-        FROM cleaned_logs
-        WHERE id = %s
-    """, (incident_id,))
-    alert = cur.fetchone()
-    cur.close()
-    conn.close()
-    return alert
\ No newline at end of file
+    with pg_cursor(RealDictCursor) as cur:
+        cur.execute("""
+            SELECT id as incident_id, appName, serviceName, job, label, level, message,
+                   kubernetesDetails, date, time
+            FROM cleaned_logs
+            WHERE id = %s
+        """, (incident_id,))
+        return cur.fetchone()
+
+@timed("postgres")
+def fetch_duplicate_summary(incident_id: str, top: int = 3) -> dict:
+    """
+    Occurrence count, first/last seen and the most common messages of a log's duplicates
+    (counts from the aggregates; variants from the full rows that were kept).
+    """
+    with pg_cursor() as cur:
+        cur.execute("""
+            SELECT COALESCE(SUM(occurrence_count), 0)::bigint, min(first_seen), max(last_seen)
+            FROM duplicate_log_aggregates WHERE incident_id = %s
+        """, (incident_id,))
+        count, first_seen, last_seen = cur.fetchone()
+        variants = []
+        if count and top > 0:
+            cur.execute("""
+                SELECT message, count(*) AS n FROM duplicate_logs
+                WHERE incident_id = %s
+                GROUP BY message
+                ORDER BY n DESC, message
+                LIMIT %s
+            """, (incident_id, top))
+            variants = cur.fetchall()
+    return {"count": count, "first_seen": first_seen, "last_seen": last_seen, "variants": variants}
@@ -1,4 +1,16 @@
-from llama_index.core import PromptTemplate
+import hashlib
+
+
+class PromptTemplate:
+    """Just the part of llama_index's PromptTemplate used here: {name} slots filled by format().
+    Importing llama_index.core for it cost seconds of startup time."""
+
+    def __init__(self, template: str):
+        self.template = template
+
+    def format(self, **kwargs) -> str:
+        return self.template.format(**kwargs)
+
 
 QUERY_PROMPT = PromptTemplate(
     "You are a helpful assistant. "
@@ -11,3 +23,6 @@ QUERY_PROMPT = PromptTemplate(
     "Query: {query_str}\n\n"
     "Answer:"
 )
+
+# Part of the chat answer cache key, so editing the template invalidates cached answers
+QUERY_PROMPT_VERSION = hashlib.sha256(QUERY_PROMPT.template.encode("utf-8")).hexdigest()[:12]
@@ -1,44 +1,159 @@
 from datetime import datetime, timezone
-from logs.services.weaviate_client import weaviate_store, weaviate_search
-import ollama
+import asyncio
+import os
+from dotenv import load_dotenv
+from logs.services.embedding_cache import EMBEDDING_MODEL, get_embedding_cache
+from logs.services.metrics import record_error, timed, track
+from logs.services.weaviate_client import DEDUP_WINDOW_HOURS, partition_key, weaviate_expire, window_cutoff
+from logs.services.write_behind import WRITE_BEHIND
 
-import ollama
+load_dotenv()
 
+# Seconds between background expiry runs (only when DEDUP_WINDOW_HOURS is set)
+VECTOR_EXPIRY_INTERVAL = float(os.getenv("VECTOR_EXPIRY_INTERVAL", "300"))
+
+# "weaviate" (default) or "numpy" for the in-process index that writes through to Weaviate
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "weaviate").lower()
+
+if VECTOR_BACKEND == "numpy":
+    from logs.services.numpy_index import (
+        index_store, index_search, index_store_many, index_search_many
+    )
+elif WRITE_BEHIND:
+    from logs.services.write_behind import (
+        buffered_store as index_store,
+        buffered_search as index_search,
+        buffered_store_many as index_store_many,
+        buffered_search_many as index_search_many,
+    )
+else:
+    from logs.services.weaviate_client import (
+        weaviate_store as index_store,
+        weaviate_search as index_search,
+        weaviate_store_many as index_store_many,
+        weaviate_search_many as index_search_many,
+    )
+
+# Time whichever backend is active under stable stage names
+index_store = timed("vector", "index_store")(index_store)
+index_search = timed("vector", "index_search")(index_search)
+index_store_many = timed("vector", "index_store_many")(index_store_many)
+index_search_many = timed("vector", "index_search_many")(index_search_many)
+
+@timed("vector")
 def get_embedding(text: str) -> list[float]:
+    """Return the embedding for text, using the embedding cache when possible."""
+    return get_embedding_cache().get_or_compute(text, _embed)
+
+@timed("ollama", "embed")
+def _embed(text: str) -> list[float]:
+    import ollama
+
     try:
         response = ollama.embed(
-            model='nomic-embed-text',
+            model=EMBEDDING_MODEL,
             input=text
         )
-        vector = response.get('embeddings', [])
-        if not vector:
-            print("Warning: embedding returned empty vector")
-            return []
-        flat_vector = []
-        for item in vector:
-            if isinstance(item, list):
-                for sub_item in item:
-                    flat_vector.append(float(sub_item))
-            else:
-                flat_vector.append(float(item))
+        return _flatten(response.get('embeddings', []))
+
+    except Exception as e:
+        print(f"Error getting embedding: {e}")
+        record_error("ollama", "embed")
+        return []
 
-        return flat_vector
+def _flatten(vector) -> list[float]:
+    if not vector:
+        print("Warning: embedding returned empty vector")
+        return []
+    flat_vector = []
+    for item in vector:
+        if isinstance(item, list):
+            for sub_item in item:
+                flat_vector.append(float(sub_item))
+        else:
+            flat_vector.append(float(item))
+
+    return flat_vector
+
+_async_ollama = None
+
+def _async_client():
+    global _async_ollama
+    if _async_ollama is None:
+        import ollama
+        _async_ollama = ollama.AsyncClient()
+    return _async_ollama
+
+@timed("vector")
+async def get_embedding_async(text: str) -> list[float]:
+    """Non-blocking get_embedding using the async Ollama client."""
+    cache = get_embedding_cache()
+    vector = cache.get(text)
+    if vector is not None:
+        return vector
+    vector = await _embed_async(text)
+    cache.put(text, vector)
+    return vector
+
+@timed("ollama", "embed_async")
+async def _embed_async(text: str) -> list[float]:
+    try:
+        response = await _async_client().embed(
+            model=EMBEDDING_MODEL,
+            input=text
+        )
+        return _flatten(response.get('embeddings', []))
 
     except Exception as e:
         print(f"Error getting embedding: {e}")
+        record_error("ollama", "embed_async")
+        return []
+
+@timed("vector")
+def get_embeddings(texts: list[str]) -> list[list[float]]:
+    """Embed a batch of texts; cache misses are sent to Ollama in a single call."""
+    if not texts:
         return []
+    cache = get_embedding_cache()
+    vectors = [cache.get(text) for text in texts]
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    if not missing:
+        return vectors
+    import ollama
+
+    with track("ollama", "embed_batch"):
+        try:
+            response = ollama.embed(
+                model=EMBEDDING_MODEL,
+                input=[texts[i] for i in missing]
+            )
+            embedded = response.get('embeddings', [])
+            if len(embedded) != len(missing):
+                print(f"Warning: expected {len(missing)} embeddings, got {len(embedded)}")
+                record_error("ollama", "embed_batch")
+                return []
+
+        except Exception as e:
+            print(f"Error getting embeddings: {e}")
+            record_error("ollama", "embed_batch")
+            return []
+
+    for i, vector in zip(missing, embedded):
+        vectors[i] = [float(x) for x in vector]
+        cache.put(texts[i], vectors[i])
+    return vectors
 
 def store_vector(vector: list[float], incident_id: str, alert_text: str) -> None:
     try:
         current_time = datetime.now(timezone.utc)
-        weaviate_store(vector, incident_id, alert_text, current_time)
+        index_store(vector, incident_id, alert_text, current_time)
     except Exception as e:
         print(f"Error storing vector: {e}")
 
 
 def search_vector_store(vector: list[float], limit: int = 1) -> dict | None:
     try:
-        matches = weaviate_search(vector, limit=limit)
+        matches = index_search(vector, limit=limit)
         if matches:
             match = matches[0]
             if "similarity" not in match:
@@ -46,4 +161,73 @@ def search_vector_store(vector: list[float], limit: int = 1) -> dict | None:
             return match
     except Exception as e:
         print(f"Error searching vector store: {e}")
-    return None
\ No newline at end of file
+    return None
+
+
+
+async def index_search_async(vector: list[float], limit: int = 1, partition: str | None = None) -> list[dict]:
+    """index_search without blocking the event loop (in-process index runs inline)."""
+    if VECTOR_BACKEND == "numpy":
+        return index_search(vector, limit=limit, partition=partition)
+    return await asyncio.to_thread(index_search, vector, limit, partition)
+
+
+async def index_store_async(
+    vector: list[float], incident_id: str, alert_text: str, timestamp, partition: str | None = None
+) -> None:
+    """index_store off the event loop (the Weaviate client is synchronous)."""
+    await asyncio.to_thread(index_store, vector, incident_id, alert_text, timestamp, partition)
+
+
+def warm_vector_index() -> int:
+    """Load the in-process index from Weaviate when VECTOR_BACKEND=numpy; returns rows loaded."""
+    if VECTOR_BACKEND != "numpy":
+        return 0
+    from logs.services.numpy_index import load_index_from_weaviate
+    return load_index_from_weaviate()
+
+
+def warm_embedding_model() -> int:
+    """Embed a probe text so Ollama has the model loaded before the first alert; returns its dimension."""
+    vector = _embed("warm-up")
+    if not vector:
+        raise RuntimeError("Embedding model returned no vector")
+    return len(vector)
+
+
+_expiry_stats = {"runs": 0, "failures": 0, "expired_store": 0, "expired_index": 0, "last_run": None, "last_error": None}
+
+
+@timed("vector")
+def expire_vectors() -> int:
+    """Remove vectors older than the dedup window from the vector store (and the
+    in-process index) so the searched set stays bounded; returns the number deleted."""
+    cutoff = window_cutoff()
+    if cutoff is None:
+        return 0
+    if VECTOR_BACKEND == "numpy":
+        from logs.services.numpy_index import expire_index
+        _expiry_stats["expired_index"] += expire_index(cutoff)
+    expired = weaviate_expire(cutoff)
+    _expiry_stats["expired_store"] += expired
+    return expired
+
+
+async def run_vector_expiry(interval: float = VECTOR_EXPIRY_INTERVAL) -> None:
+    """Background loop calling expire_vectors every interval seconds."""
+    while True:
+        try:
+            await asyncio.to_thread(expire_vectors)
+            _expiry_stats["last_error"] = None
+        except Exception as e:
+            print(f"Error expiring vectors: {e}")
+            _expiry_stats["failures"] += 1
+            _expiry_stats["last_error"] = str(e)
+        _expiry_stats["runs"] += 1
+        _expiry_stats["last_run"] = datetime.now(timezone.utc).isoformat()
+        await asyncio.sleep(interval)
+
+
+def get_vector_expiry_stats() -> dict:
+    """Dedup window settings and expiry counters."""
+    return {**_expiry_stats, "window_hours": DEDUP_WINDOW_HOURS, "interval": VECTOR_EXPIRY_INTERVAL}
@@ -1,6 +1,84 @@
-import weaviate
+import json
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
 
-client = weaviate.Client(url="http://localhost:8080")
+from dotenv import load_dotenv
+
+load_dotenv()
+
+WEAVIATE_URL = os.getenv("WEAVIATE_URL", "http://localhost:8080")
+# Only incidents stored within the last DEDUP_WINDOW_HOURS are dedup candidates (0 = no limit)
+DEDUP_WINDOW_HOURS = float(os.getenv("DEDUP_WINDOW_HOURS", "0"))
+# Date property the window is applied to
+TIME_PROPERTY = "timestamp"
+# Log fields that bound the dedup search: a log is only compared with
+# incidents sharing all of these values (empty = search everything)
+PARTITION_KEYS = [k.strip() for k in os.getenv("DEDUP_PARTITION_KEYS", "").split(",") if k.strip()]
+# Filterable property holding the partition key of each stored incident
+PARTITION_PROPERTY = "partition"
+# Whole-value tokenization so Equal matches the exact key, indexed for pre-filtering
+PARTITION_SCHEMA = {
+    "name": PARTITION_PROPERTY, "dataType": ["string"], "tokenization": "field", "indexFilterable": True,
+}
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Process-wide Weaviate client, created (and the weaviate package imported) on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import weaviate
+                _client = weaviate.Client(url=WEAVIATE_URL)
+    return _client
+
+
+def window_cutoff() -> datetime | None:
+    """
+    Oldest timestamp still inside the dedup window, or None when the window is off.
+    """
+    if DEDUP_WINDOW_HOURS <= 0:
+        return None
+    return datetime.now(timezone.utc) - timedelta(hours=DEDUP_WINDOW_HOURS)
+
+
+def partition_key(alert):
+    """
+    Partition of a log (JSON of its PARTITION_KEYS values), or None when partitioning is off.
+    """
+    if not PARTITION_KEYS:
+        return None
+    return json.dumps([alert.get(key) for key in PARTITION_KEYS], default=str)
+
+
+def _time_filter(operator, cutoff):
+    return {"path": [TIME_PROPERTY], "operator": operator, "valueDate": cutoff.isoformat()}
+
+
+def _partition_filter(partition):
+    return {"path": [PARTITION_PROPERTY], "operator": "Equal", "valueString": partition}
+
+
+def _near_vector_query(vector, limit, partition=None):
+    query = (
+        get_client().query
+        .get("Incident", ["incident_id", "message", TIME_PROPERTY, PARTITION_PROPERTY])
+        .with_near_vector({"vector": vector})
+        .with_additional(["distance"])
+        .with_limit(limit)
+    )
+    cutoff = window_cutoff()
+    filters = [_time_filter("GreaterThanEqual", cutoff)] if cutoff else []
+    if partition is not None:
+        filters.append(_partition_filter(partition))
+    if len(filters) > 1:
+        return query.with_where({"operator": "And", "operands": filters})
+    return query.with_where(filters[0]) if filters else query
 
 
 def create_schema():
@@ -18,22 +96,33 @@ def create_schema():
             {"name": "message", "dataType": ["string"]},
             {"name": "kubernetesDetails", "dataType": ["text"]},
             {"name": "timestamp", "dataType": ["date"]},
+            PARTITION_SCHEMA,
         ]
     }
-    existing_classes = client.schema.get().get("classes", [])
-    if not any(c.get("class") == "Incident" for c in existing_classes):
+    client = get_client()
+    existing = next((c for c in client.schema.get().get("classes", []) if c.get("class") == "Incident"), None)
+    if existing is None:
         client.schema.create_class(schema)
+    elif not any(p.get("name") == PARTITION_PROPERTY for p in existing.get("properties", [])):
+        # Objects stored before this property existed have no partition and
+        # fall outside every partition until they are re-imported
+        client.schema.property.create("Incident", PARTITION_SCHEMA)
 
 
-def weaviate_store(vector, incident_id, alert_text, timestamp):
-    """Store a unique log into Weaviate."""
+def weaviate_uuid(incident_id):
+    """Deterministic object id, so re-importing an incident overwrites instead of duplicating."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"logs/Incident/{incident_id}"))
+
+def weaviate_store(vector, incident_id, alert_text, timestamp, partition=None):
+    """Store a unique log into Weaviate (partition: its partition_key)."""
     try:
         properties = {
             "incident_id": incident_id,
             "message": alert_text,
-            "timestamp": timestamp.isoformat()
+            "timestamp": timestamp.isoformat(),
+            PARTITION_PROPERTY: partition
         }
-        client.data_object.create(
+        get_client().data_object.create(
             data_object=properties,
             class_name="Incident",
             vector=vector
@@ -42,42 +131,113 @@ def weaviate_store(vector, incident_id, alert_text, timestamp):
         print(f"Error storing vector in Weaviate: {e}")
 
 
-def weaviate_search(vector, limit=1):
-    """Search for similar vectors in Weaviate."""
+def weaviate_store_many(objects, uuids=None):
+    """
+    Store several (vector, incident_id, alert_text, timestamp[, partition]) tuples with one batch import.
+    Pass uuids (one per object) to make re-imports overwrite instead of duplicate.
+    Raises when the import fails, so the write-behind buffer and the migration can retry.
+    """
+    uuids = uuids or [None] * len(objects)
+    with get_client().batch as batch:
+        for (vector, incident_id, alert_text, timestamp, *partition), object_uuid in zip(objects, uuids):
+            batch.add_data_object(
+                data_object={
+                    "incident_id": incident_id,
+                    "message": alert_text,
+                    "timestamp": timestamp.isoformat(),
+                    PARTITION_PROPERTY: partition[0] if partition else None
+                },
+                class_name="Incident",
+                vector=vector,
+                uuid=object_uuid
+            )
+
+
+def _safe_matches(incidents):
+    safe_matches = []
+    for match in incidents:
+        distance = match.get("_additional", {}).get("distance", 1.0)
+        similarity = max(0.0, 1 - distance)
+        match["similarity"] = similarity
+        if match.get("incident_id"):
+            safe_matches.append(match)
+    return safe_matches
+
+
+def weaviate_search(vector, limit=1, partition=None):
+    """Search for similar vectors in Weaviate, only within `partition` when one is given."""
     try:
         if not vector:
             return []
 
-        result = (
-            client.query
-            .get("Incident", ["incident_id", "message"])
-            .with_near_vector({"vector": vector})
-            .with_additional(["distance"])
-            .with_limit(limit)
-            .do()
-        )
+        result = _near_vector_query(vector, limit, partition).do()
 
         incidents = result.get("data", {}).get("Get", {}).get("Incident", [])
-        safe_matches = []
-
-        for match in incidents:
-            distance = match.get("_additional", {}).get("distance", 1.0)
-            similarity = max(0.0, 1 - distance)
-            match["similarity"] = similarity
-            if match.get("incident_id"):
-                safe_matches.append(match)
-
-        return safe_matches
+        return _safe_matches(incidents)
 
     except Exception as e:
         print(f"Error searching vector store: {e}")
         return []
 
+
+def weaviate_search_many(vectors, limit=1, partitions=None):
+    """
+    Search several vectors in a single GraphQL request (one result list per vector),
+    each within its entry of `partitions` when given. Raises when the search fails:
+    an empty result would read as "no duplicate" to the caller.
+    """
+    if not vectors:
+        return []
+
+    client = get_client()
+    partitions = partitions or [None] * len(vectors)
+    queries = [
+        _near_vector_query(vector, limit, partition).with_alias(f"q{i}")
+        for i, (vector, partition) in enumerate(zip(vectors, partitions))
+    ]
+    result = client.query.multi_get(queries).do()
+    data = result.get("data", {}).get("Get", {})
+    return [_safe_matches(data.get(f"q{i}") or []) for i in range(len(vectors))]
+
+def weaviate_iter_objects(batch_size=500):
+    """Yield (vector, properties) for every stored Incident using cursor pagination."""
+    after = None
+    while True:
+        page = get_client().data_object.get(
+            class_name="Incident", with_vector=True, limit=batch_size, after=after
+        )
+        objects = (page or {}).get("objects", [])
+        if not objects:
+            return
+        for obj in objects:
+            yield obj.get("vector") or [], obj.get("properties", {})
+        after = objects[-1]["id"]
+
+
+def weaviate_expire(cutoff):
+    """
+    Delete Incidents whose timestamp is before cutoff; returns the number deleted.
+    Postgres keeps every log, so nothing is lost but the vector.
+    """
+    deleted = 0
+    while True:
+        result = get_client().batch.delete_objects(
+            class_name="Incident", where=_time_filter("LessThan", cutoff)
+        )
+        # A single call deletes at most the server's query limit; repeat until none are left
+        successful = (result or {}).get("results", {}).get("successful", 0)
+        if not successful:
+            return deleted
+        deleted += successful
+
+
 def delete_all_weaviate_data():
     """Delete the entire Incident class in Weaviate to start fresh."""
+    import weaviate
+
     print("Deleting the entire 'Incident' class in Weaviate...")
     try:
-        client.schema.delete_class("Incident")
+        get_client().schema.delete_class("Incident")
         print("Incident class deleted successfully.")
     except weaviate.exceptions.UnexpectedStatusCodeException as e:
         print(f"Error deleting class: {e}")
@@ -0,0 +1,45 @@
+from alerts.services.fingerprint import compute_fingerprint
+
+
+def alert(**overrides):
+    base = {
+        "incident_id": "0.123",
+        "observed_value": "97.5",
+        "policy_name": "checkout-latency",
+        "condition_name": "p99 > 2s",
+        "subject": "checkout",
+        "display_name": "Checkout latency",
+        "severity": "high",
+        "summary": "p99 latency above threshold",
+        "log_data": {"pod": "checkout-7f9", "timestamp": "2024-05-01T12:00:00Z", "labels": {"zone": "a"}},
+    }
+    return {**base, **overrides}
+
+
+def test_occurrence_fields_do_not_change_the_fingerprint():
+    first = alert()
+    second = alert(
+        incident_id="0.456",
+        created_at="2024-05-01T12:05:00Z",
+        log_data={"labels": {"zone": "a", "updated_at": "x"}, "timestamp": "2024-05-01T12:05:00Z", "pod": "checkout-7f9"},
+    )
+    assert compute_fingerprint(first) == compute_fingerprint(second)
+
+
+def test_volatile_keys_are_stripped_inside_lists():
+    first = alert(log_data={"events": [{"msg": "timeout", "event_time": 1}]})
+    second = alert(log_data={"events": [{"msg": "timeout", "event_time": 2}]})
+    assert compute_fingerprint(first) == compute_fingerprint(second)
+
+
+def test_dedup_relevant_fields_change_the_fingerprint():
+    base = compute_fingerprint(alert())
+    assert compute_fingerprint(alert(severity="low")) != base
+    assert compute_fingerprint(alert(log_data={"pod": "checkout-abc"})) != base
+    assert compute_fingerprint(alert(summary=None)) != base
+
+
+def test_missing_and_none_fields_are_equivalent():
+    first = alert()
+    del first["observed_value"]
+    assert compute_fingerprint(first) == compute_fingerprint(alert(observed_value=None))
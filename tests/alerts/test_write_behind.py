@@ -0,0 +1,64 @@
+from datetime import datetime
+
+import pytest
+
+from alerts.services import weaviate_client, write_behind
+from alerts.services.write_behind import WriteBehindBuffer
+
+
+class UnreachableWeaviate:
+    """Client whose batch import fails when it is sent, as when Weaviate is down."""
+
+    @property
+    def batch(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def add_data_object(self, **kwargs):
+        pass
+
+    def __exit__(self, *exc):
+        raise ConnectionError("weaviate unavailable")
+
+
+class Store:
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, objects):
+        self.batches.append(list(objects))
+
+
+def make_buffer(store, **kwargs):
+    # A long interval keeps the background flusher out of the way; tests flush explicitly
+    return WriteBehindBuffer(store, interval=60, **kwargs)
+
+
+def test_buffered_store_stamps_created_at_when_buffered(monkeypatch):
+    store = Store()
+    monkeypatch.setattr(write_behind, "write_buffer", make_buffer(store))
+    before = datetime.now().astimezone()
+    write_behind.buffered_store([1.0, 0.0], "a", severity="high")
+    write_behind.buffered_store([1.0, 0.0], "b", created_at="2024-05-01T00:00:00+00:00")
+    write_behind.write_buffer.flush()
+
+    (_, _, first), (_, _, second) = store.batches[0]
+    assert datetime.fromisoformat(first["created_at"]) >= before
+    assert first["severity"] == "high"
+    assert second["created_at"] == "2024-05-01T00:00:00+00:00"
+
+
+def test_flush_requeues_when_weaviate_store_many_fails(monkeypatch):
+    monkeypatch.setattr(weaviate_client, "get_client", UnreachableWeaviate)
+    obj = ([1.0, 0.0], "a", {"severity": "high"})
+    with pytest.raises(ConnectionError):
+        weaviate_client.weaviate_store_many([obj])
+
+    buffer = make_buffer(weaviate_client.weaviate_store_many)
+    buffer.add_many([obj], [[1.0, 0.0]], [{"incident_id": "a"}])
+    assert buffer.flush() == 0
+    stats = buffer.stats()
+    assert stats["flush_failures"] == 1
+    assert stats["pending"] == 1
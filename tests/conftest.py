@@ -0,0 +1,9 @@
+import pytest
+
+# The alerts and logs services share their building blocks; shared tests run once per app
+APPS = ("alerts", "logs")
+
+
+@pytest.fixture(params=APPS)
+def app(request):
+    return request.param
@@ -0,0 +1,45 @@
+from logs.services.fingerprint import compute_fingerprint
+
+
+def log(**overrides):
+    base = {
+        "appName": "checkout",
+        "serviceName": "checkout-api",
+        "job": "checkout/api",
+        "label": "prod",
+        "level": "error",
+        "message": "upstream request timeout",
+        "kubernetesDetails": {"pod": "checkout-7f9", "timestamp": "2024-05-01T12:00:00Z", "labels": {"zone": "a"}},
+        "date": "2024-05-01",
+        "time": "12:00:00",
+    }
+    return {**base, **overrides}
+
+
+def test_occurrence_fields_do_not_change_the_fingerprint():
+    first = log()
+    second = log(
+        date="2024-05-02",
+        time="08:30:00",
+        kubernetesDetails={"labels": {"zone": "a", "updated_at": "x"}, "timestamp": "2024-05-02T08:30:00Z", "pod": "checkout-7f9"},
+    )
+    assert compute_fingerprint(first) == compute_fingerprint(second)
+
+
+def test_volatile_keys_are_stripped_inside_lists():
+    first = log(kubernetesDetails={"events": [{"reason": "OOMKilled", "event_time": 1}]})
+    second = log(kubernetesDetails={"events": [{"reason": "OOMKilled", "event_time": 2}]})
+    assert compute_fingerprint(first) == compute_fingerprint(second)
+
+
+def test_dedup_relevant_fields_change_the_fingerprint():
+    base = compute_fingerprint(log())
+    assert compute_fingerprint(log(level="warn")) != base
+    assert compute_fingerprint(log(kubernetesDetails={"pod": "checkout-abc"})) != base
+    assert compute_fingerprint(log(message=None)) != base
+
+
+def test_missing_and_none_fields_are_equivalent():
+    first = log()
+    del first["label"]
+    assert compute_fingerprint(first) == compute_fingerprint(log(label=None))
@@ -0,0 +1,62 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from logs.services import weaviate_client, write_behind
+from logs.services.write_behind import WriteBehindBuffer
+
+
+class UnreachableWeaviate:
+    """Client whose batch import fails when it is sent, as when Weaviate is down."""
+
+    @property
+    def batch(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def add_data_object(self, **kwargs):
+        pass
+
+    def __exit__(self, *exc):
+        raise ConnectionError("weaviate unavailable")
+
+
+class Store:
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, objects):
+        self.batches.append(list(objects))
+
+
+def make_buffer(store, **kwargs):
+    # A long interval keeps the background flusher out of the way; tests flush explicitly
+    return WriteBehindBuffer(store, interval=60, **kwargs)
+
+
+def test_buffered_store_keeps_the_log_timestamp_and_partition(monkeypatch):
+    store = Store()
+    monkeypatch.setattr(write_behind, "write_buffer", make_buffer(store))
+    timestamp = datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc)
+    write_behind.buffered_store([1.0, 0.0], "a", "checkout | error", timestamp, "p1")
+
+    assert [m["incident_id"] for m in write_behind.write_buffer.search_many([[1.0, 0.0]], 1, ["p1"])[0]] == ["a"]
+    assert write_behind.write_buffer.search_many([[1.0, 0.0]], 1, ["p2"]) == [[]]
+    write_behind.write_buffer.flush()
+    assert store.batches == [[([1.0, 0.0], "a", "checkout | error", timestamp, "p1")]]
+
+
+def test_flush_requeues_when_weaviate_store_many_fails(monkeypatch):
+    monkeypatch.setattr(weaviate_client, "get_client", UnreachableWeaviate)
+    obj = ([1.0, 0.0], "a", "checkout | error", datetime(2024, 5, 1, tzinfo=timezone.utc), "p1")
+    with pytest.raises(ConnectionError):
+        weaviate_client.weaviate_store_many([obj])
+
+    buffer = make_buffer(weaviate_client.weaviate_store_many)
+    buffer.add_many([obj], [[1.0, 0.0]], [{"incident_id": "a"}])
+    assert buffer.flush() == 0
+    stats = buffer.stats()
+    assert stats["flush_failures"] == 1
+    assert stats["pending"] == 1
@@ -0,0 +1,113 @@
+import importlib
+
+import psycopg2
+import pytest
+from psycopg2 import extensions
+
+
+class FakeConnection:
+    def __init__(self, n):
+        self.n = n
+        self.closed = 0
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+        self.commits = 0
+        self.rollbacks = 0
+
+    def get_transaction_status(self):
+        return self.status
+
+    def commit(self):
+        self.commits += 1
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def db_pool(app):
+    return importlib.import_module(f"{app}.services.db_pool")
+
+
+@pytest.fixture
+def make_pool(db_pool):
+    def make(**kwargs):
+        opened = []
+
+        def connect():
+            opened.append(FakeConnection(len(opened)))
+            return opened[-1]
+
+        return db_pool.PgPool(connect, **kwargs), opened
+
+    return make
+
+
+def test_returned_connection_is_reused_lifo(make_pool):
+    pool, opened = make_pool(max_size=3)
+    first, second = pool.acquire(), pool.acquire()
+    pool.release(first)
+    pool.release(second)
+
+    assert pool.acquire() is second
+    assert pool.acquire() is first
+    assert len(opened) == 2
+    assert pool.stats()["in_use"] == 2
+
+
+def test_acquire_times_out_when_exhausted(make_pool, db_pool):
+    pool, _ = make_pool(max_size=1, timeout=0.05)
+    conn = pool.acquire()
+    with pytest.raises(db_pool.PoolTimeout):
+        pool.acquire()
+    assert pool.stats()["timeouts"] == 1
+
+    pool.release(conn)
+    assert pool.acquire() is conn
+
+
+def test_release_rolls_back_open_transaction(make_pool):
+    pool, _ = make_pool()
+    conn = pool.acquire()
+    conn.status = extensions.TRANSACTION_STATUS_INTRANS
+    pool.release(conn)
+
+    assert conn.rollbacks == 1
+    assert pool.stats()["idle"] == 1
+
+
+def test_connection_context_commits_or_discards(make_pool):
+    pool, opened = make_pool()
+    with pool.connection() as conn:
+        pass
+    assert conn.commits == 1 and not conn.closed
+
+    with pytest.raises(psycopg2.OperationalError):
+        with pool.connection() as conn:
+            raise psycopg2.OperationalError("server closed the connection")
+    assert conn.closed
+    assert pool.stats()["idle"] == 0
+    assert pool.acquire() is not conn
+    assert len(opened) == 2
+
+
+def test_expired_connection_is_recycled_on_checkout(make_pool):
+    pool, opened = make_pool(max_lifetime=0)
+    conn = pool.acquire()
+    pool.release(conn)
+
+    assert conn.closed
+    assert pool.acquire() is opened[1]
+    assert pool.stats()["connections_recycled"] == 1
+
+
+def test_closed_pool_refuses_checkout(make_pool, db_pool):
+    pool, _ = make_pool()
+    pool.release(pool.acquire())
+    pool.close()
+    with pytest.raises(db_pool.PoolTimeout):
+        pool.acquire()
@@ -0,0 +1,26 @@
+import importlib
+
+import pytest
+
+
+@pytest.fixture
+def embedding_cache(app):
+    return importlib.import_module(f"{app}.services.embedding_cache")
+
+
+def test_disk_tier_survives_a_restart(embedding_cache, tmp_path):
+    path = str(tmp_path / "embeddings.db")
+    embedding_cache.EmbeddingCache(path=path).put("disk full", [0.5, 0.25])
+    cache = embedding_cache.EmbeddingCache(path=path)
+    assert cache.get("disk full") == [0.5, 0.25]
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_version_bump_misses_stored_embeddings(embedding_cache, tmp_path, monkeypatch):
+    path = str(tmp_path / "embeddings.db")
+    embedding_cache.EmbeddingCache(path=path).put("disk full", [0.5, 0.25])
+    monkeypatch.setattr(embedding_cache, "EMBEDDING_MODEL_VERSION", "2")
+    cache = embedding_cache.EmbeddingCache(path=path)
+    assert cache.get("disk full") is None
+    cache.put("disk full", [1.0, 0.0])
+    assert cache.get("disk full") == [1.0, 0.0]
@@ -0,0 +1,30 @@
+import importlib
+import time
+
+import pytest
+
+
+@pytest.fixture
+def fingerprint(app):
+    return importlib.import_module(f"{app}.services.fingerprint")
+
+
+def test_recent_fingerprints_evicts_least_recently_used(fingerprint):
+    cache = fingerprint.RecentFingerprints(max_entries=2)
+    cache.add("f1", "a")
+    cache.add("f2", "b")
+    assert cache.get("f1") == "a"
+    cache.add("f3", "c")
+
+    assert cache.get("f2") is None
+    assert cache.get("f1") == "a"
+    assert cache.get("f3") == "c"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_recent_fingerprints_expire_after_ttl(fingerprint):
+    cache = fingerprint.RecentFingerprints(ttl_seconds=0.01)
+    cache.add("f1", "a")
+    time.sleep(0.02)
+    assert cache.get("f1") is None
+    assert cache.stats()["size"] == 0
@@ -0,0 +1,84 @@
+import importlib
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def NumpyVectorIndex(app):
+    return importlib.import_module(f"{app}.services.numpy_index").NumpyVectorIndex
+
+
+def unit(angle):
+    return [float(np.cos(angle)), float(np.sin(angle))]
+
+
+def ids(matches):
+    return [match["incident_id"] for match in matches]
+
+
+def test_top_k_in_similarity_order(NumpyVectorIndex):
+    index = NumpyVectorIndex(initial_capacity=2)
+    index.add_many([unit(0.0), unit(0.5), unit(0.1), unit(1.5)], [{"incident_id": i} for i in "abcd"])
+
+    matches = index.search(unit(0.05), limit=3)
+    assert ids(matches) == ["a", "c", "b"]
+    assert matches[0]["similarity"] == pytest.approx(np.cos(0.05), abs=1e-6)
+    assert matches[0]["_additional"]["distance"] == pytest.approx(1 - np.cos(0.05), abs=1e-6)
+    assert len(index) == 4
+
+
+def test_vectors_are_compared_by_cosine(NumpyVectorIndex):
+    index = NumpyVectorIndex()
+    index.add([10.0, 0.0], {"incident_id": "a"})
+    assert index.search([0.5, 0.0])[0]["similarity"] == pytest.approx(1.0)
+
+
+def test_search_many_filters_each_query_by_its_partition(NumpyVectorIndex):
+    index = NumpyVectorIndex()
+    index.add_many(
+        [unit(0.0), unit(0.2), unit(0.4)],
+        [{"incident_id": i} for i in "abc"],
+        partitions=["p1", "p2", "p2"],
+    )
+
+    results = index.search_many([unit(0.0), unit(0.0), unit(0.0)], limit=3, partitions=["p2", "p1", None])
+    assert ids(results[0]) == ["b", "c"]
+    assert ids(results[1]) == ["a"]
+    assert ids(results[2]) == ["a", "b", "c"]
+    assert index.search(unit(0.0), partition="p3") == []
+
+
+def test_since_limits_search_to_the_window(NumpyVectorIndex):
+    index = NumpyVectorIndex()
+    index.add_many(
+        [unit(0.0), unit(0.1), unit(0.2)],
+        [{"incident_id": i} for i in "abc"],
+        times=[100.0, 200.0, float("nan")],
+    )
+
+    assert ids(index.search(unit(0.0), limit=3, since=150.0)) == ["b"]
+    assert ids(index.search(unit(0.0), limit=3)) == ["a", "b", "c"]
+
+
+def test_expire_drops_old_rows_and_keeps_order(NumpyVectorIndex):
+    index = NumpyVectorIndex()
+    index.add_many(
+        [unit(0.0), unit(0.1), unit(0.2)],
+        [{"incident_id": i} for i in "abc"],
+        times=[100.0, 300.0, 200.0],
+        partitions=["p1", "p2", "p1"],
+    )
+
+    assert index.expire(before=250.0) == 2
+    assert ids(index.search(unit(0.0), limit=3)) == ["b"]
+    assert ids(index.search(unit(0.0), partition="p2")) == ["b"]
+
+
+def test_dimension_mismatch(NumpyVectorIndex):
+    index = NumpyVectorIndex()
+    assert index.search([1.0, 0.0]) == []
+    index.add([1.0, 0.0], {"incident_id": "a"})
+    with pytest.raises(ValueError):
+        index.add([1.0, 0.0, 0.0], {"incident_id": "b"})
+    assert index.search([1.0, 0.0, 0.0]) == []
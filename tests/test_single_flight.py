@@ -0,0 +1,137 @@
+import asyncio
+import importlib
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def SingleFlight(app):
+    return importlib.import_module(f"{app}.services.single_flight").SingleFlight
+
+
+def run_threads(n, target):
+    threads = [threading.Thread(target=target) for _ in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_concurrent_calls_share_one_execution(SingleFlight):
+    flight = SingleFlight()
+    calls, results = [], []
+    release = threading.Event()
+
+    def work():
+        calls.append(1)
+        release.wait()
+        return "incident-1"
+
+    def caller():
+        results.append(flight.do("fp", work))
+
+    threads = [threading.Thread(target=caller) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    while "fp" not in flight._flights or flight._flights["fp"].followers < 4:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert {result for result, _ in results} == {"incident-1"}
+    assert flight.stats()["coalesced"] == 4
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_different_keys_do_not_coalesce(SingleFlight):
+    flight = SingleFlight()
+    assert flight.do("a", lambda: 1) == (1, False)
+    assert flight.do("b", lambda: 2) == (2, False)
+    assert flight.stats()["leaders"] == 2
+
+
+def test_leader_error_is_raised_and_followers_retry(SingleFlight):
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    attempts, outcomes = [], []
+
+    def work():
+        attempts.append(1)
+        if len(attempts) == 1:
+            started.set()
+            release.wait()
+            raise RuntimeError("postgres down")
+        return "recovered"
+
+    def leader():
+        with pytest.raises(RuntimeError):
+            flight.do("fp", work)
+        outcomes.append("raised")
+
+    def follower():
+        outcomes.append(flight.do("fp", work))
+
+    lead = threading.Thread(target=leader)
+    lead.start()
+    started.wait()
+    follow = threading.Thread(target=follower)
+    follow.start()
+    while flight._flights["fp"].followers == 0:
+        time.sleep(0.001)
+    release.set()
+    lead.join()
+    follow.join()
+
+    assert "raised" in outcomes
+    assert ("recovered", False) in outcomes
+    assert len(attempts) == 2
+    assert flight.stats()["fallbacks"] == 1
+
+
+def test_disabled_runs_every_call(SingleFlight):
+    flight = SingleFlight(enabled=False)
+    calls = []
+    run_threads(3, lambda: flight.do("fp", lambda: calls.append(1)))
+    assert len(calls) == 3
+
+
+def test_async_calls_share_one_execution(SingleFlight):
+    flight = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "incident-1"
+
+    async def main():
+        return await asyncio.gather(*(flight.do_async("fp", work) for _ in range(4)))
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert [shared for _, shared in results] == [False, True, True, True]
+
+
+def test_async_leader_error_propagates_and_followers_retry(SingleFlight):
+    flight = SingleFlight()
+    attempts = []
+
+    async def work():
+        attempts.append(1)
+        await asyncio.sleep(0.01)
+        if len(attempts) == 1:
+            raise RuntimeError("ollama down")
+        return "recovered"
+
+    async def main():
+        return await asyncio.gather(flight.do_async("fp", work), flight.do_async("fp", work), return_exceptions=True)
+
+    leader, follower = asyncio.run(main())
+    assert isinstance(leader, RuntimeError)
+    assert follower == ("recovered", False)
+    assert flight.stats()["fallbacks"] == 1
@@ -0,0 +1,103 @@
+import importlib
+
+import numpy as np
+import pytest
+
+# summarize() counts the replayed rows under the app's own noun
+COUNT_KEYS = {"alerts": "incidents", "logs": "logs"}
+
+
+@pytest.fixture
+def tune(app):
+    return importlib.import_module(f"{app}.scripts.tune_threshold")
+
+
+def make_data(n=120, dim=8, seed=7):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(6, dim))
+    matrix = centers[rng.integers(0, len(centers), n)] + rng.normal(scale=0.35, size=(n, dim))
+    matrix = (matrix / np.linalg.norm(matrix, axis=1, keepdims=True)).astype(np.float32)
+    return {
+        "ids": [f"i{k}" for k in range(n)],
+        "texts": [f"alert {k}" for k in range(n)],
+        "times": np.sort(rng.uniform(0, 10000, n)),
+        "partitions": [["p1", "p2", None][k % 3] for k in range(n)],
+        "services": ["svc"] * n,
+        "matrix": matrix,
+    }
+
+
+def reference(data, thresholds, window=0.0):
+    """Row-at-a-time greedy dedup, as alert_service does it."""
+    matrix, times, partitions = data["matrix"], data["times"], data["partitions"]
+    kept = np.zeros(len(matrix), dtype=bool)
+    for i in range(len(matrix)):
+        best = -np.inf
+        for j in range(i):
+            if not kept[j] or partitions[j] != partitions[i]:
+                continue
+            if window > 0 and times[i] - times[j] > window:
+                continue
+            best = max(best, float(matrix[i] @ matrix[j]))
+        kept[i] = not best >= thresholds[i]
+    return kept
+
+
+def test_parse_thresholds(tune):
+    assert tune.parse_thresholds("0.8,0.85, 0.9") == [0.8, 0.85, 0.9]
+    assert tune.parse_thresholds("0.8:0.9:0.05") == [0.8, 0.85, 0.9]
+    assert all(type(value) is float for value in tune.parse_thresholds("0.75:0.97:0.01"))
+
+
+@pytest.mark.parametrize("window", [0.0, 1500.0])
+def test_replay_matches_row_at_a_time_dedup(tune, window):
+    data = make_data()
+    n = len(data["ids"])
+    candidates = [0.7, 0.8, 0.9, 0.95]
+    thresholds = np.repeat(np.asarray(candidates, dtype=np.float32)[:, None], n, axis=1)
+
+    result = tune.replay(data, thresholds, window=window, block_size=16)
+
+    for t in range(len(candidates)):
+        expected = reference(data, thresholds[t], window)
+        np.testing.assert_array_equal(result["kept"][t], expected)
+    # A lower threshold never keeps more incidents
+    assert list(result["kept"].sum(axis=1)) == sorted(result["kept"].sum(axis=1))
+    assert 0 < result["kept"][0].sum() < n
+
+
+def test_replay_with_per_incident_thresholds(tune):
+    data = make_data(seed=11)
+    n = len(data["ids"])
+    per_incident = np.where(np.asarray([p == "p1" for p in data["partitions"]]), 0.95, 0.75).astype(np.float32)
+
+    result = tune.replay(data, per_incident[None, :], block_size=32)
+    np.testing.assert_array_equal(result["kept"][0], reference(data, per_incident))
+
+
+def test_duplicates_point_at_a_kept_match_in_their_partition(tune):
+    data = make_data()
+    thresholds = np.full((1, len(data["ids"])), 0.8, dtype=np.float32)
+    result = tune.replay(data, thresholds, block_size=16)
+
+    kept, best, match = result["kept"][0], result["best"][0], result["match"][0]
+    for i in np.flatnonzero(~kept):
+        j = match[i]
+        assert j < i and kept[j]
+        assert data["partitions"][j] == data["partitions"][i]
+        assert best[i] == pytest.approx(float(data["matrix"][i] @ data["matrix"][j]), abs=1e-5)
+
+
+def test_summarize_counts_clusters(tune, app):
+    data = make_data()
+    n = len(data["ids"])
+    thresholds = np.full((1, n), 0.8, dtype=np.float32)
+    result = tune.replay(data, thresholds)
+
+    (summary,) = tune.summarize(data, result, [0.8], thresholds, borderline=3)
+    assert summary[COUNT_KEYS[app]] == n
+    assert summary["clusters"] == int(result["kept"][0].sum())
+    assert summary["duplicates"] == n - summary["clusters"]
+    assert len(summary["borderline_pairs"]) <= 3
+    for pair in summary["borderline_pairs"]:
+        assert abs(pair["similarity"] - 0.8) <= 0.02 + 1e-6
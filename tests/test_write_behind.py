@@ -0,0 +1,92 @@
+import importlib
+
+import pytest
+
+
+class Store:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.batches = []
+
+    def __call__(self, objects):
+        if self.fail:
+            raise RuntimeError("weaviate unavailable")
+        self.batches.append(list(objects))
+
+
+@pytest.fixture
+def make_buffer(app):
+    buffer_class = importlib.import_module(f"{app}.services.write_behind").WriteBehindBuffer
+
+    def make(store, **kwargs):
+        # A long interval keeps the background flusher out of the way; tests flush explicitly
+        return buffer_class(store, interval=60, **kwargs)
+
+    return make
+
+
+def add(buffer, *names, vector=(1.0, 0.0), partition=None):
+    buffer.add_many(list(names), [list(vector)] * len(names), [{"incident_id": n, "partition": partition} for n in names])
+
+
+def test_flush_writes_pending_objects_in_one_batch(make_buffer):
+    store = Store()
+    buffer = make_buffer(store)
+    add(buffer, "a", "b")
+
+    assert buffer.flush() == 2
+    assert store.batches == [["a", "b"]]
+    assert buffer.flush() == 0
+    assert buffer.stats()["pending"] == 0
+
+
+def test_failed_flush_requeues_at_the_front(make_buffer):
+    store = Store(fail=True)
+    buffer = make_buffer(store)
+    add(buffer, "a", "b")
+
+    assert buffer.flush() == 0
+    add(buffer, "c")
+    store.fail = False
+    assert buffer.flush() == 3
+    assert store.batches == [["a", "b", "c"]]
+    assert buffer.stats()["flush_failures"] == 1
+
+
+def test_pending_vectors_are_searchable_until_flushed(make_buffer):
+    store = Store()
+    buffer = make_buffer(store)
+    add(buffer, "a", vector=(1.0, 0.0), partition="p1")
+    add(buffer, "b", vector=(0.0, 1.0), partition="p2")
+
+    matches = buffer.search_many([[2.0, 0.1]], limit=2)[0]
+    assert [m["incident_id"] for m in matches] == ["a", "b"]
+    assert matches[0]["similarity"] > 0.99
+    assert [m["incident_id"] for m in buffer.search_many([[1.0, 0.0]], 2, ["p2"])[0]] == ["b"]
+
+    buffer.flush()
+    assert buffer.search_many([[1.0, 0.0]]) == [[]]
+
+
+def test_writer_over_the_cap_flushes_synchronously(make_buffer):
+    store = Store()
+    buffer = make_buffer(store, max_batch=4, max_pending=4)
+    add(buffer, "a", "b", "c")
+    assert store.batches == []
+
+    add(buffer, "d", "e")
+    assert store.batches == [["a", "b", "c", "d", "e"]]
+    assert buffer.stats()["pending"] == 0
+
+
+def test_cap_drops_oldest_when_the_store_keeps_failing(make_buffer):
+    store = Store(fail=True)
+    buffer = make_buffer(store, max_batch=2, max_pending=4)
+    add(buffer, "a", "b", "c", "d", "e", "f")
+
+    stats = buffer.stats()
+    assert stats["pending"] == 4
+    assert stats["dropped"] == 2
+    store.fail = False
+    buffer.flush()
+    assert store.batches == [["c", "d", "e", "f"]]